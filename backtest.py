@@ -0,0 +1,219 @@
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from indicators import build_panel, compute_indicators, shift, rolling_max, rolling_min, roc
+
+# ==========================================
+# ⚙️ 回測參數 (與 analyze_chose / health_check_logic 同步)
+# ==========================================
+BACKTEST_BARS = 750     # 模擬過去 3 年
+MIN_BARS = 300
+STOP_PCT = 0.07         # 初始停損
+MIN_PRICE = 20
+MIN_VOLUME = 800000
+RS_PERIOD = 20
+HTF_RALLY_PCT = 0.80    # 高窄旗型：前波漲幅
+GAP_UP_PCT = 0.08       # 跳空缺口
+NEAR_HIGH_PCT = 0.15    # VCP：距 52 週高點
+# DRIVE 門檻 (同 StockSystem.analyze_drive，optimize.drive_features 共用)
+DRIVE_MIN_VOLUME = 1000000
+DRIVE_RS_PERIOD = 60
+DRIVE_NEAR_HIGH_PCT = 0.25  # 距 52 週高點
+DRIVE_MIN_RS = 5            # RS 強度 (百分點)
+DRIVE_VOL_SPIKE = 1.3       # 突破量：20 日均量倍數
+MVP_UP_DAYS = 9             # MVP：15 天內收紅天數
+MVP_VOL_INC = 1.2           # MVP：量能放大倍數
+
+# ==========================================
+# 進出場訊號 (日期 × 標的，一次算完)
+# ==========================================
+def _prev_window(a, w, fn):
+    """昨日以前 w 天的極值 (等同 iloc[i-w:i])，不足 w 天為 NaN"""
+    out = shift(fn(a, w), 1)
+    out[:w] = np.nan
+    return out
+
+
+def align_bench(bench_roc_series, dates):
+    """把大盤 ROC (dict 或 Series) 對齊成陣列，缺日期補 0，與 dict.get(dt, 0) 相同"""
+    s = bench_roc_series if isinstance(bench_roc_series, pd.Series) else pd.Series(bench_roc_series, dtype=float)
+    return s.reindex(dates, fill_value=0).to_numpy(dtype=float)
+
+
+def rank_feature(ind):
+    """RS 排名 (ind.values['rs_rank'])，沒有算排名時全為 NaN"""
+    rank = ind.values.get('rs_rank')
+    return rank if rank is not None else np.full(ind.panel.close.shape, np.nan)
+
+
+def _chose_windows(h, c):
+    """單檔時間軸上的回看窗口 (由 Panel.per_ticker 逐檔套用)"""
+    return {
+        'roc': roc(c, RS_PERIOD),
+        'y_high': _prev_window(h, 250, rolling_max),
+        'p20_high': _prev_window(h, 21, rolling_max),
+        'high60': _prev_window(h, 60, rolling_max),
+        'low60': _prev_window(c, 60, rolling_min),
+    }
+
+
+def chose_features(ind, bench_roc):
+    """CHOSE 進場中與型態門檻無關的部分 (參數掃描時只算一次)"""
+    p = ind.panel
+    c, h, o = p.close, p.high, p.open
+    prev_c = ind['prev_close']
+    b = bench_roc.reshape(-1, 1) if bench_roc.ndim == 1 else bench_roc
+    w = p.per_ticker(_chose_windows, h, c)
+
+    base = ~((c < MIN_PRICE) | (ind['vol20'] < MIN_VOLUME))
+    stage2 = (c > ind['ma50']) & (ind['ma50'] > ind['ma200'])
+    rs_ok = ~((w['roc'] - b) < 0)
+
+    y_high, p20_high, low60 = w['y_high'], w['p20_high'], w['low60']
+    return {
+        'gate': base & stage2 & rs_ok,
+        'is_break': (c > p20_high) & (prev_c < p20_high),
+        'rally': (w['high60'] - low60) / low60,
+        'dist': (y_high - c) / y_high,
+        'gap': (o - prev_c) / prev_c,
+        'rank': rank_feature(ind),
+    }
+
+
+def chose_entry(f, rally_pct=HTF_RALLY_PCT, gap_pct=GAP_UP_PCT, near_high_pct=NEAR_HIGH_PCT, min_rank=0):
+    """依型態門檻組出 CHOSE 進場矩陣 (f 為 chose_features 的結果)；min_rank > 0 時另需 RS 排名達門檻"""
+    with np.errstate(invalid='ignore'):
+        is_flag = (f['rally'] > rally_pct) & (f['dist'] < 0.25) & f['is_break']
+        is_gap = f['gap'] > gap_pct
+        is_vcp = f['is_break'] & (f['dist'] < near_high_pct)
+        gate = f['gate'] & (f['rank'] >= min_rank) if min_rank else f['gate']
+    return gate & (is_flag | is_gap | is_vcp)
+
+
+def ma_exits(ind):
+    """health_check_logic 的均線防守 (初始停損依進場價，在狀態機處理)"""
+    check_ma = np.where(ind['super35'] == 1, ind['ma10'], ind['ma20'])
+    return ind.panel.close < check_ma
+
+
+def signals(ind, bench_roc, **params):
+    """回傳 (entry, ma_exit) 兩個布林矩陣；bench_roc 為對齊日期的一維陣列，params 為 chose_entry 的門檻"""
+    # --- 進場：analyze_chose 邏輯 / 出場：均線防守 ---
+    return chose_entry(chose_features(ind, bench_roc), **params), ma_exits(ind)
+
+
+def iter_trades(close, entry, ma_exit, start=0, stop_pct=STOP_PCT):
+    """單檔狀態機：只在進出場事件之間跳躍，逐筆產出 (出場位置, 報酬)"""
+    entries = np.flatnonzero(entry)
+    i, n = start, len(close)
+    while True:
+        k = np.searchsorted(entries, i)
+        if k == len(entries): break
+        e = entries[k]
+        entry_p = close[e]
+        nxt = e + 1
+        # 2R 保本條件 (r>=2 且跌破成本) 在數學上不可能同時成立，出場只看停損與均線
+        hit = ma_exit[nxt:] | (close[nxt:] < entry_p * (1 - stop_pct))
+        if not hit.any(): break
+        x = nxt + int(np.argmax(hit))
+        yield x, (close[x] - entry_p) / entry_p
+        i = x + 1
+
+
+def run_trades(close, entry, ma_exit, start=0, stop_pct=STOP_PCT):
+    """回傳每筆交易報酬"""
+    return [r for _, r in iter_trades(close, entry, ma_exit, start, stop_pct)]
+
+
+def summarize(trades):
+    """勝率 / 複利總報酬 (%)"""
+    if not trades: return 0, 0
+    wr = len([t for t in trades if t > 0]) / len(trades) * 100
+    tr = (np.prod([1 + t for t in trades]) - 1) * 100
+    return round(wr, 1), round(tr, 1)
+
+
+def backtest_frame(df, bench_roc_series, bars=BACKTEST_BARS, rank=None, min_rank=0):
+    """
+    單檔 3 年回測，結果與 backtest_reference 相同
+    rank 為該檔的 RS 排名序列 (ranking.RankHistory.series 或全市場面板)，min_rank > 0 時只在排名達門檻的日子進場
+    """
+    if df is None or df.empty or len(df) < MIN_BARS: return 0, 0
+    ind = compute_indicators(build_panel({'_': df}), (RS_PERIOD,))
+    if rank is not None: ind.values['rs_rank'] = rank.reindex(ind.panel.dates).to_numpy(dtype=float).reshape(-1, 1)
+    entry, ma_exit = signals(ind, align_bench(bench_roc_series, ind.panel.dates), min_rank=min_rank)
+    close = ind.panel.close[:, 0]
+    return summarize(run_trades(close, entry[:, 0], ma_exit[:, 0], max(len(close) - bars, 0)))
+
+def run_backtests(frames, bench_roc_series, workers=None, ranks=None, min_rank=0):
+    """多檔平行回測 (process pool)，回傳依代號排序的 {ticker: (勝率, 總報酬)}；ranks 為日期 × 代號的 RS 排名表"""
+    tickers = sorted(frames)
+    rank = [ranks[t] if ranks is not None and t in ranks else None for t in tickers]
+    if workers == 1 or len(tickers) <= 1:
+        results = [backtest_frame(frames[t], bench_roc_series, BACKTEST_BARS, r, min_rank) for t, r in zip(tickers, rank)]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            results = list(ex.map(backtest_frame, [frames[t] for t in tickers], repeat(bench_roc_series), repeat(BACKTEST_BARS), rank, repeat(min_rank)))
+    return dict(zip(tickers, results))
+
+# ==========================================
+# 逐根 K 棒的原始版本 (保留作為結果比對基準)
+# ==========================================
+def backtest_reference(df, bench_roc_series):
+    if df.empty or len(df) < MIN_BARS: return 0, 0
+
+    c_series = df['Close'].iloc[:, 0] if isinstance(df['Close'], pd.DataFrame) else df['Close']
+    h_series = df['High'].iloc[:, 0] if isinstance(df['High'], pd.DataFrame) else df['High']
+    o_series = df['Open'].iloc[:, 0] if isinstance(df['Open'], pd.DataFrame) else df['Open']
+    v_series = df['Volume'].iloc[:, 0] if isinstance(df['Volume'], pd.DataFrame) else df['Volume']
+
+    ma10 = c_series.rolling(10).mean()
+    ma20 = c_series.rolling(20).mean()
+    ma50 = c_series.rolling(50).mean()
+    ma200 = c_series.rolling(200).mean()
+    avg_vol_20 = v_series.rolling(20).mean()
+
+    trades = []
+    in_pos = False
+    entry_p = 0
+
+    for i in range(max(len(df) - BACKTEST_BARS, 0), len(df)):
+        curr_c = float(c_series.iloc[i])
+        dt = df.index[i]
+
+        if not in_pos:
+            if curr_c < MIN_PRICE or avg_vol_20.iloc[i] < MIN_VOLUME: continue
+            if not (curr_c > ma50.iloc[i] > ma200.iloc[i]): continue
+
+            s_roc = float(c_series.iloc[i] / c_series.iloc[i-RS_PERIOD] - 1)
+            if (s_roc - bench_roc_series.get(dt, 0)) < 0: continue
+
+            y_high = float(h_series.iloc[i-250:i].max())
+            p20_high = float(h_series.iloc[i-21:i].max())
+            is_break = (curr_c > p20_high) and (c_series.iloc[i-1] < p20_high)
+
+            rally = (h_series.iloc[i-60:i].max() - c_series.iloc[i-60:i].min()) / c_series.iloc[i-60:i].min()
+            is_flag = rally > 0.8 and (y_high - curr_c)/y_high < 0.25 and is_break
+            is_gap = (o_series.iloc[i] - c_series.iloc[i-1])/c_series.iloc[i-1] > 0.08
+            is_vcp = is_break and (y_high - curr_c)/y_high < 0.15
+
+            if is_flag or is_gap or is_vcp:
+                entry_p = curr_c
+                in_pos = True
+
+        elif in_pos:
+            r_mult = (curr_c - entry_p) / (entry_p * STOP_PCT)
+            is_super = (c_series.iloc[i-34:i+1] > ma10.iloc[i-34:i+1]).all()
+            check_ma = ma10.iloc[i] if is_super else ma20.iloc[i]
+
+            exit_now = False
+            if curr_c < entry_p * (1 - STOP_PCT): exit_now = True
+            elif r_mult >= 2 and curr_c < entry_p: exit_now = True
+            elif curr_c < check_ma: exit_now = True
+
+            if exit_now:
+                trades.append((curr_c - entry_p) / entry_p)
+                in_pos = False
+
+    return summarize(trades)
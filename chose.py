@@ -1,11 +1,13 @@
 
 
-import yfinance as yf
 import pandas as pd
-import twstock
-from tqdm import tqdm
 from tabulate import tabulate
 import numpy as np
+from market import get_benchmark
+from prices import PriceBars, tail_mean, nanmax, nanmin, pct_change
+from scanner import register, run_scan
+from universe import Prefilter
+from metrics import reject
 
 # ==========================================
 # ⚙️ 嚴格篩選參數 (依據書中標準)
@@ -26,6 +28,7 @@ NEAR_HIGH_PCT = 0.15    # 股價要在 52週高點的 15% 範圍內
 # ==========================================
 def get_stock_list():
     """獲取上市+上櫃所有普通股代號"""
+    import twstock
     print("📋 正在建立全台股清單...")
     codes = twstock.codes
     stock_list = []
@@ -42,57 +45,41 @@ def get_stock_list():
 
 def get_benchmark_roc():
     """計算大盤動能"""
-    try:
-        bench = yf.download(BENCHMARK, period='6mo', progress=False, auto_adjust=True)
-        close = bench['Close']
-        if isinstance(close, pd.DataFrame): close = close.iloc[:, 0]
-        return float(close.pct_change(RS_PERIOD).iloc[-1])
-    except:
-        return 0
+    return get_benchmark(ticker=BENCHMARK).roc(RS_PERIOD)
 
 # ==========================================
 # 核心策略邏輯
 # ==========================================
 def analyze_stock(ticker, df, bench_roc):
-    # 資料清洗 (降維處理，避免 MultiIndex 問題)
+    # 資料清洗 (DataFrame 轉成陣列容器，避免 MultiIndex 問題)
     try:
-        close = df['Close']
-        if isinstance(close, pd.DataFrame): close = close.iloc[:, 0]
-
-        open_p = df['Open']
-        if isinstance(open_p, pd.DataFrame): open_p = open_p.iloc[:, 0]
-
-        high = df['High']
-        if isinstance(high, pd.DataFrame): high = high.iloc[:, 0]
-
-        low = df['Low']
-        if isinstance(low, pd.DataFrame): low = low.iloc[:, 0]
-
-        volume = df['Volume']
-        if isinstance(volume, pd.DataFrame): volume = volume.iloc[:, 0]
-    except:
-        return None
+        bars = PriceBars.of(df)
+        close, open_p, high, volume = bars.close, bars.open, bars.high, bars.volume
+    except Exception:
+        return reject('chose', 'error')
 
     # 1. 基礎濾網
-    current_price = float(close.iloc[-1])
-    current_vol = float(volume.iloc[-1])
-    avg_vol = float(volume.rolling(20).mean().iloc[-1])
+    current_price = float(close[-1])
+    current_vol = float(volume[-1])
+    avg_vol = tail_mean(volume, 20)
 
-    if current_price < MIN_PRICE or avg_vol < MIN_VOLUME:
-        return None
+    if current_price < MIN_PRICE:
+        return reject('chose', 'price')
+    if avg_vol < MIN_VOLUME:
+        return reject('chose', 'volume')
 
     # 2. 趨勢濾網 (Stage 2: 價格 > 50MA > 200MA)
-    ma50 = float(close.rolling(50).mean().iloc[-1])
-    ma200 = float(close.rolling(200).mean().iloc[-1])
+    ma50 = tail_mean(close, 50)
+    ma200 = tail_mean(close, 200)
 
     if not (current_price > ma50 > ma200):
-        return None
+        return reject('chose', 'stage2')
 
     # 3. RS 強度濾網 (強於大盤)
-    stock_roc = float(close.pct_change(RS_PERIOD).iloc[-1])
+    stock_roc = pct_change(close, RS_PERIOD)
     rs_rating = stock_roc - bench_roc
     if rs_rating < 0: # 剔除落後股
-        return None
+        return reject('chose', 'rs')
 
     # 4. 型態辨識 (Pattern Recognition)
     buy_signal = False
@@ -102,25 +89,25 @@ def analyze_stock(ticker, df, bench_roc):
 
     # --- A. 高窄旗型 (High Tight Flag) ---
     # 邏輯：過去 60 天內最低點到最高點漲幅 > 80%，且近期 15 天回檔 < 25%
-    price_60d_ago = float(close.iloc[-60:].min())
-    recent_high = float(high.iloc[-60:].max())
+    price_60d_ago = nanmin(close[-60:])
+    recent_high = nanmax(high[-60:])
 
     rally_magnitude = (recent_high - price_60d_ago) / price_60d_ago
     pullback_depth = (recent_high - current_price) / recent_high
 
     # --- B. 買進跳空 (Buyable Gap Up) ---
     # 邏輯：今日開盤跳空 > 8%，且爆量
-    prev_close = float(close.iloc[-2])
-    today_open = float(open_p.iloc[-1])
+    prev_close = float(close[-2])
+    today_open = float(open_p[-1])
     gap_pct = (today_open - prev_close) / prev_close
 
     # --- C. VCP / 箱型突破 (Pivot Breakout) ---
     # 邏輯：接近 52 週新高 + 帶量突破 20 日高點 + 波動收縮
-    year_high = float(high.iloc[-250:].max())
+    year_high = nanmax(high[-250:])
     dist_to_year_high = (year_high - current_price) / year_high
 
-    prev_20_high = float(high.iloc[-21:-1].max()) # 昨日以前的 20 日高
-    is_breakout = (current_price > prev_20_high) and (close.iloc[-2] < prev_20_high) # 確保是"第一天"突破
+    prev_20_high = nanmax(high[-21:-1]) # 昨日以前的 20 日高
+    is_breakout = (current_price > prev_20_high) and (close[-2] < prev_20_high) # 確保是"第一天"突破
     is_vol_spike = (current_vol > avg_vol * 1.5) # 量增 50%
 
     # 判斷優先順序 (Power Play 最優先)
@@ -160,49 +147,59 @@ def analyze_stock(ticker, df, bench_roc):
             "買入原因": reason,
             "成交量": int(current_vol)
         }
-    return None
+    return reject('chose', 'pattern')
 
 # ==========================================
 # 主程式執行
 # ==========================================
-def run_screening():
-    tickers, names_map = get_stock_list()
-    bench_roc = get_benchmark_roc()
-
-    results = []
-    print(f"\n🚀 開始掃描全市場 {len(tickers)} 檔股票...")
+@register('chose', min_bars=100, prefilter=Prefilter(MIN_PRICE, MIN_VOLUME, stage2=True))
+def scan_plugin(info, df, ctx):
+    """統一掃描外掛：抓取 1 年資料 (計算 52週高 與 HTF) 由掃描引擎提供"""
+    res = analyze_stock(info['ticker'], df, ctx.bench_roc(RS_PERIOD))
+    if res:
+        res['代號'] = info['ticker'].replace('.TW', '').replace('.TWO', '')
+        res['名稱'] = info['name']
+    return res
+
+
+def screen(store=None):
+    """全市場掃描，回傳符合型態的結果 list"""
     print("🔍 尋找：高窄旗型、跳空缺口、VCP、箱型突破...\n")
+    return run_scan(['chose'], store=store, prefilter=True)['chose']
 
-    for ticker in tqdm(tickers):
-        try:
-            # 抓取 1 年資料 (計算 52週高 與 HTF)
-            df = yf.download(ticker, period='1y', progress=False, auto_adjust=True)
-            if df.empty or len(df) < 100: continue
 
-            res = analyze_stock(ticker, df, bench_roc)
-            if res:
-                res['代號'] = ticker.replace('.TW', '').replace('.TWO', '')
-                res['名稱'] = names_map.get(ticker, ticker)
-                results.append(res)
-        except:
-            continue
+TIPS = [
+    "1. [🚀 高窄旗型] 是勝率最高的 Power Play，若出現請優先關注。",
+    "2. [買入點(Pivot)] 是突破的關鍵價位，若目前股價離此太遠 (>3%)，請勿追高。",
+    "3. 進場後請嚴格執行 7% 停損 (表中已計算)。",
+]
+EMPTY = "⚠️ 今日市場無符合嚴格型態的買入訊號 (可能大盤處於盤整或下跌)。"
 
+
+def report_table(results):
+    """依 RS 排序並挑選報告欄位"""
+    cols = ['代號', '名稱', '現價', '型態', 'RS強度', '買入點(Pivot)', '建議停損(7%)', '買入原因', '成交量']
+    return pd.DataFrame(results)[cols].sort_values(by=['RS強度'], ascending=False)
+
+
+def print_report(results):
     if results:
-        df_res = pd.DataFrame(results)
-        # 欄位排序
-        cols = ['代號', '名稱', '現價', '型態', 'RS強度', '買入點(Pivot)', '建議停損(7%)', '買入原因', '成交量']
-        df_res = df_res[cols].sort_values(by=['RS強度'], ascending=False)
+        df_res = report_table(results)
 
         print("\n" + "="*80)
         print("📊 【書中買入法則】全台股黃金買點掃描報告")
         print("="*80)
         print(tabulate(df_res, headers='keys', tablefmt='fancy_grid', showindex=False))
         print("\n💡 戰略指導：")
-        print("1. [🚀 高窄旗型] 是勝率最高的 Power Play，若出現請優先關注。")
-        print("2. [買入點(Pivot)] 是突破的關鍵價位，若目前股價離此太遠 (>3%)，請勿追高。")
-        print("3. 進場後請嚴格執行 7% 停損 (表中已計算)。")
+        for tip in TIPS: print(tip)
     else:
-        print("⚠️ 今日市場無符合嚴格型態的買入訊號 (可能大盤處於盤整或下跌)。")
+        print(EMPTY)
+
+
+def run_screening():
+    """指令列入口：掃描並印出報告"""
+    print_report(screen())
 
 # 執行
-run_screening()
+if __name__ == "__main__":
+    run_screening()
@@ -1,12 +1,14 @@
 # 1. 安裝必要套件
 # !pip install yfinance twstock pandas tqdm tabulate
 
-import yfinance as yf
 import pandas as pd
-import twstock
-from tqdm import tqdm
 from tabulate import tabulate
 import numpy as np
+from market import get_benchmark
+from prices import PriceBars, tail_mean, nanmax, nanmin, nanmean, pct_change
+from scanner import register, run_scan
+from universe import Prefilter
+from metrics import reject
 
 # ==========================================
 # ⚙️ DRIVE 終極選股參數
@@ -26,6 +28,7 @@ MVP_VOL_INC = 1.2       # 期間均量比過去放大 20%
 # ==========================================
 def get_stock_list_with_industry():
     """獲取全台股代號與產業別"""
+    import twstock
     print("📋 正在抓取全台股清單與產業分類...")
     codes = twstock.codes
     stock_info = []
@@ -43,13 +46,7 @@ def get_stock_list_with_industry():
 
 def get_benchmark_roc():
     """獲取大盤數據"""
-    try:
-        bench = yf.download(BENCHMARK, period='6mo', progress=False, auto_adjust=True)
-        close = bench['Close']
-        if isinstance(close, pd.DataFrame): close = close.iloc[:, 0]
-        return float(close.pct_change(RS_PERIOD).iloc[-1])
-    except:
-        return 0
+    return get_benchmark(ticker=BENCHMARK).roc(RS_PERIOD)
 
 # ==========================================
 # 核心 DRIVE 分析邏輯
@@ -60,63 +57,60 @@ def analyze_drive_full(info, df, bench_roc):
 
     try:
         # 資料清洗
-        close = df['Close']
-        if isinstance(close, pd.DataFrame): close = close.iloc[:, 0]
-        volume = df['Volume']
-        if isinstance(volume, pd.DataFrame): volume = volume.iloc[:, 0]
-        high = df['High']
-        if isinstance(high, pd.DataFrame): high = high.iloc[:, 0]
+        bars = PriceBars.of(df)
+        close, volume, high = bars.close, bars.volume, bars.high
 
         # 1. 基礎濾網
-        current_price = float(close.iloc[-1])
-        avg_vol = float(volume.rolling(20).mean().iloc[-1])
+        current_price = float(close[-1])
+        avg_vol = tail_mean(volume, 20)
 
-        if current_price < MIN_PRICE or avg_vol < MIN_VOLUME: return None
+        if current_price < MIN_PRICE: return reject('drive', 'price')
+        if avg_vol < MIN_VOLUME: return reject('drive', 'volume')
 
         # 2. D = Direction (趨勢 Stage 2)
-        ma50 = float(close.rolling(50).mean().iloc[-1])
-        ma200 = float(close.rolling(200).mean().iloc[-1])
-        year_high = float(high.iloc[-250:].max())
-        year_low = float(high.iloc[-250:].min())
+        ma50 = tail_mean(close, 50)
+        ma200 = tail_mean(close, 200)
+        year_high = nanmax(high[-250:])
+        year_low = nanmin(high[-250:])
 
         # 條件：多頭排列 + 接近新高 + 脫離底部
         cond_stage2 = (current_price > ma50 > ma200)
         cond_near_high = (year_high - current_price) / year_high < 0.25
         cond_off_low = (current_price - year_low) / year_low > 0.30
 
-        if not (cond_stage2 and cond_near_high and cond_off_low): return None
+        if not (cond_stage2 and cond_near_high and cond_off_low): return reject('drive', 'stage2')
 
         # 3. R = Relative Strength (RS 強度)
-        stock_roc = float(close.pct_change(RS_PERIOD).iloc[-1])
+        stock_roc = pct_change(close, RS_PERIOD)
         rs_rating = (stock_roc - bench_roc) * 100
 
-        if rs_rating < 5: return None # 至少要比大盤強
+        if rs_rating < 5: return reject('drive', 'rs') # 至少要比大盤強
 
         # 4. V = Volume & MVP (大戶吸籌)
         # 檢查過去 15 天的 K 線與成交量
-        recent_close = close.iloc[-(MVP_WINDOW+1):-1] # 不含今天，看前15天
-        recent_vol = volume.iloc[-(MVP_WINDOW+1):-1]
-        prev_vol = volume.iloc[-(MVP_WINDOW*2+1):-(MVP_WINDOW+1)] # 再前15天
+        recent_close = close[-(MVP_WINDOW+1):-1] # 不含今天，看前15天
+        recent_vol = volume[-(MVP_WINDOW+1):-1]
+        prev_vol = volume[-(MVP_WINDOW*2+1):-(MVP_WINDOW+1)] # 再前15天
 
         # 計算上漲天數
-        up_days = (recent_close.diff() > 0).sum()
+        up_days = int((np.diff(recent_close) > 0).sum())
         # 計算量能放大
-        vol_ratio = recent_vol.mean() / prev_vol.mean() if prev_vol.mean() > 0 else 1
+        vol_ratio = nanmean(recent_vol) / nanmean(prev_vol) if nanmean(prev_vol) > 0 else 1
 
         is_mvp = (up_days >= MVP_UP_DAYS) and (vol_ratio >= MVP_VOL_INC)
 
         # 判斷今日爆量
-        current_vol = float(volume.iloc[-1])
+        current_vol = float(volume[-1])
         is_vol_spike = current_vol > (avg_vol * 1.3)
 
         # 5. 買點觸發 (Pivot Breakout)
-        prev_20_high = float(close.iloc[-21:-1].max())
-        is_breakout = (current_price > prev_20_high) and (close.iloc[-2] < prev_20_high)
+        prev_20_high = nanmax(close[-21:-1])
+        is_breakout = (current_price > prev_20_high) and (close[-2] < prev_20_high)
 
         # 6. E = Earnings (以技術面反應做代理)
         # 如果是 Gap Up (跳空 > 8%)
-        prev_close = float(close.iloc[-2])
-        open_price = float(df['Open'].iloc[-1])
+        prev_close = float(close[-2])
+        open_price = float(bars.open[-1])
         is_gap_up = (open_price - prev_close) / prev_close > 0.08
 
         # 評分與標記
@@ -150,66 +144,76 @@ def analyze_drive_full(info, df, bench_roc):
                 "型態": "DRIVE 訊號",
                 "評分": score,
                 "原因": " + ".join(reasons),
-                "成交量": int(volume.iloc[-1])
+                "成交量": int(volume[-1])
             }
 
-    except:
-        return None
-    return None
+    except Exception:
+        return reject('drive', 'error')
+    return reject('drive', 'pattern')
 
 # ==========================================
 # 主程式執行
 # ==========================================
-def run_drive_full_scan():
-    stock_infos = get_stock_list_with_industry()
-    bench_roc = get_benchmark_roc()
+@register('drive', min_bars=200, prefilter=Prefilter(MIN_PRICE, MIN_VOLUME, stage2=True))
+def scan_plugin(info, df, ctx):
+    """統一掃描外掛：1 年資料由掃描引擎提供"""
+    return analyze_drive_full(info, df, ctx.bench_roc(RS_PERIOD))
 
-    results = []
-    print(f"\n🚀 開始執行 DRIVE 終極掃描 ({len(stock_infos)} 檔)...")
+
+def scan_drive(store=None):
+    """全市場 DRIVE 掃描，回傳評分達標的結果 list"""
     print("🔍 邏輯：Stage 2 + MVP動能 + 板塊共振 + 買點偵測...\n")
+    return run_scan(['drive'], store=store, prefilter=True)['drive']
 
-    for info in tqdm(stock_infos):
-        try:
-            # 下載 1 年資料
-            df = yf.download(info['ticker'], period='1y', progress=False, auto_adjust=True)
-            if df.empty or len(df) < 200: continue
 
-            res = analyze_drive_full(info, df, bench_roc)
-            if res:
-                results.append(res)
-        except:
-            continue
+TIPS = [
+    "1. [🔥MVP大戶吸籌]: 過去15天出現密集買盤(Ants)，是強烈的波段訊號。",
+    "2. [👑 領頭羊]: 該股票屬於目前最強勢的板塊，勝率通常最高。",
+    "3. [帶量突破樞紐]: 標準買點，請確認風險報酬比後進場。",
+    "4. [🕳️跳空缺口]: 可能是財報利多，若不回補缺口可視為強勢訊號。",
+]
+EMPTY = "⚠️ 今日市場無符合 DRIVE 條件的股票 (可能大盤偏弱)。"
 
-    if results:
-        df_res = pd.DataFrame(results)
 
-        # --- I 部分：計算最強板塊 (Top Down) ---
-        # 統計各產業入選的股票數量
-        industry_counts = df_res['產業'].value_counts()
-        top_industries = industry_counts.head(3).index.tolist()
+def report_table(results):
+    """回傳 (報告表格, 最強三大板塊)：標記領頭羊後依評分 > RS 排序"""
+    df_res = pd.DataFrame(results)
 
-        print(f"\n🔥 資金流向最強的三大板塊：{', '.join(top_industries)}")
-        print("-" * 60)
+    # --- I 部分：計算最強板塊 (Top Down) ---
+    # 統計各產業入選的股票數量
+    top_industries = df_res['產業'].value_counts().head(3).index.tolist()
 
-        # 標記領頭羊 (屬於強勢板塊的股票加分)
-        df_res['領頭羊'] = df_res.apply(lambda x: '👑' if x['產業'] in top_industries else '', axis=1)
+    # 標記領頭羊 (屬於強勢板塊的股票加分)
+    df_res['領頭羊'] = df_res['產業'].isin(top_industries).map({True: '👑', False: ''})
 
-        # 排序：評分 > RS > 產業
-        df_res = df_res.sort_values(by=['評分', 'RS強度'], ascending=False)
+    # 排序：評分 > RS > 產業
+    df_res = df_res.sort_values(by=['評分', 'RS強度'], ascending=False)
 
-        cols = ['領頭羊', '代號', '名稱', '產業', '現價', 'RS強度', '評分', '原因']
+    cols = ['領頭羊', '代號', '名稱', '產業', '現價', 'RS強度', '評分', '原因']
+    return df_res[cols], top_industries
+
+
+def print_report(results):
+    if results:
+        df_res, top_industries = report_table(results)
+
+        print(f"\n🔥 資金流向最強的三大板塊：{', '.join(top_industries)}")
+        print("-" * 60)
 
         print("\n📊 【DRIVE 終極模型】全台股選股報告")
-        print(tabulate(df_res[cols], headers='keys', tablefmt='fancy_grid', showindex=False))
+        print(tabulate(df_res, headers='keys', tablefmt='fancy_grid', showindex=False))
 
         print("\n💡 訊號解讀：")
-        print("1. [🔥MVP大戶吸籌]: 過去15天出現密集買盤(Ants)，是強烈的波段訊號。")
-        print("2. [👑 領頭羊]: 該股票屬於目前最強勢的板塊，勝率通常最高。")
-        print("3. [帶量突破樞紐]: 標準買點，請確認風險報酬比後進場。")
-        print("4. [🕳️跳空缺口]: 可能是財報利多，若不回補缺口可視為強勢訊號。")
+        for tip in TIPS: print(tip)
 
     else:
-        print("⚠️ 今日市場無符合 DRIVE 條件的股票 (可能大盤偏弱)。")
+        print(EMPTY)
+
+
+def run_drive_full_scan():
+    """指令列入口：掃描並印出報告"""
+    print_report(scan_drive())
 
 # 執行
-run_drive_full_scan()
+if __name__ == "__main__":
+    run_drive_full_scan()
@@ -0,0 +1,224 @@
+import os
+import queue
+import asyncio
+import threading
+from functools import partial
+import pandas as pd
+
+# ==========================================
+# ⚙️ 下載參數
+# ==========================================
+CHUNK_SIZE = 100        # 每次批次下載的檔數
+CONCURRENCY = 4         # 同時進行的批次數上限 (provider 的 concurrency 屬性可再下修)
+TIMEOUT = 30            # 逾時秒數：交給 provider 的網路請求，逾時就真正中止呼叫
+RETRIES = 3             # 失敗重試次數
+BACKOFF = 2.0           # 指數退避基準秒數 (2, 4, 8...)
+FIELDS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+# ==========================================
+# 全市場清單
+# ==========================================
+def get_universe():
+    """上市 + 上櫃所有普通股：[{'ticker', 'name', 'industry'}]"""
+    import twstock  # 延遲載入：import 本模組不需付出讀取代號表的成本
+    codes = twstock.codes
+    return [{'ticker': c+('.TW' if r.market=='上市' else '.TWO'), 'name': r.name, 'industry': r.group} for c,r in codes.items() if r.type=='股票']
+
+# ==========================================
+# 全市場當日行情快照 (交易所 OpenAPI，一次請求取得整個市場)
+# ==========================================
+SNAPSHOT_SOURCES = {
+    '.TW': ('https://openapi.twse.com.tw/v1/exchangeReport/STOCK_DAY_ALL', 'Code', 'ClosingPrice', 'TradeVolume'),
+    '.TWO': ('https://www.tpex.org.tw/openapi/v1/tpex_mainboard_daily_close_quotes', 'SecuritiesCompanyCode', 'Close', 'TradingShares'),
+}
+
+def _number(x):
+    try: return float(str(x).replace(',', ''))
+    except: return float('nan')
+
+
+def get_snapshot(timeout=30):
+    """上市 + 上櫃最新收盤價與成交量 (股)：{ticker: (close, volume)}，取不到的市場略過"""
+    import json
+    import urllib.request
+    snap = {}
+    for suffix, (url, code, close, volume) in SNAPSHOT_SOURCES.items():
+        try:
+            with urllib.request.urlopen(url, timeout=timeout) as r:
+                rows = json.load(r)
+            for row in rows:
+                c = _number(row.get(close))
+                if c == c and c > 0: snap[str(row.get(code)).strip() + suffix] = (c, _number(row.get(volume)))
+        except Exception as e:
+            print(f"⚠️ 無法取得 {suffix} 行情快照: {e}")
+    return snap
+
+# ==========================================
+# 資料來源 (Provider)
+# ==========================================
+class YahooProvider:
+    """
+    yfinance 批次下載，回傳 {ticker: 單層欄位 DataFrame}
+    yf.download 把結果暫存在模組層級的共用 dict，多執行緒同時呼叫會互相覆蓋：批次之間一次只下載一批，
+    批次內的併發交給 yfinance 自己的 threads=True；逾時交給 yfinance 的 HTTP 請求，呼叫一定會結束並釋放鎖
+    """
+    concurrency = 1
+    _lock = threading.Lock()
+
+    def download(self, tickers, timeout=TIMEOUT, **kwargs):
+        import yfinance as yf  # 延遲載入，離線 / 測速時不需要
+        with self._lock:
+            raw = yf.download(tickers, group_by='ticker', progress=False, auto_adjust=True, threads=True, timeout=timeout, **kwargs)
+            return split_frame(raw, tickers)
+
+
+class FixtureProvider:
+    """本機離線資料 (每檔一個 <ticker>.csv)，供批次流程做離線測速"""
+
+    def __init__(self, root):
+        self.root = root
+
+    def download(self, tickers, period=None, start=None, **kwargs):
+        frames = {}
+        for t in tickers:
+            path = os.path.join(self.root, f"{t}.csv")
+            if not os.path.exists(path): continue
+            df = pd.read_csv(path, index_col=0, parse_dates=True).dropna(how='all')
+            if start is not None: df = df[df.index >= pd.Timestamp(start)]
+            elif period: df = df[df.index > df.index[-1] - period_offset(period)] if not df.empty else df
+            frames[t] = df
+        return frames
+
+
+def period_offset(period):
+    """把 yfinance 的 period 字串 ('6mo', '1y', '4y') 轉成 DateOffset"""
+    if period.endswith('mo'): return pd.DateOffset(months=int(period[:-2]))
+    if period.endswith('y'): return pd.DateOffset(years=int(period[:-1]))
+    if period.endswith('d'): return pd.DateOffset(days=int(period[:-1]))
+    raise ValueError(f"不支援的 period: {period}")
+
+
+def split_frame(raw, tickers):
+    """把 group_by='ticker' 的 MultiIndex 結果拆成每檔一個 DataFrame，缺資料的標的直接略過"""
+    frames = {}
+    if raw is None or raw.empty: return frames
+    if not isinstance(raw.columns, pd.MultiIndex):
+        # 單檔下載時 yfinance 不一定會回傳 MultiIndex
+        if len(tickers) == 1: frames[tickers[0]] = raw[[c for c in FIELDS if c in raw.columns]].dropna(how='all')
+        return frames
+    level = 0 if set(tickers) & set(raw.columns.get_level_values(0)) else 1
+    for t in tickers:
+        if t not in raw.columns.get_level_values(level): continue
+        df = raw.xs(t, axis=1, level=level)
+        df = df[[c for c in FIELDS if c in df.columns]].dropna(how='all')
+        if not df.empty: frames[t] = df
+    return frames
+
+# ==========================================
+# 非同步下載管線 (限制併發 + 逾時 + 指數退避重試)
+# ==========================================
+class FetchReport:
+    """下載結果統計，取代原本 except: continue 的靜默略過"""
+
+    def __init__(self):
+        self.ok, self.empty, self.failed, self.retries = [], [], {}, 0
+
+    def summary(self):
+        msg = f"📥 下載完成 {len(self.ok)} 檔，無資料 {len(self.empty)} 檔，失敗 {len(self.failed)} 檔，重試 {self.retries} 次"
+        for t, err in list(self.failed.items())[:10]:
+            msg += f"\n   ❌ {t}: {err}"
+        return msg
+
+
+def make_jobs(tickers, chunk_size=CHUNK_SIZE, **kwargs):
+    """切成 (chunk, kwargs) 下載工作"""
+    tickers = list(tickers)
+    return [(tickers[i:i + chunk_size], kwargs) for i in range(0, len(tickers), chunk_size)]
+
+
+async def fetch_async(jobs, provider=None, concurrency=CONCURRENCY, timeout=TIMEOUT, retries=RETRIES, backoff=BACKOFF, report=None):
+    """
+    非同步產出 (ticker, df)，哪一批先下載完就先交給下游
+    provider 若提供 coroutine `adownload` 直接使用 (逾時即取消)，否則把 `download(..., timeout=)` 丟到執行緒池；
+    執行緒無法從外部取消，逾時由 provider 的網路請求負責，逾時後才重試，不會留下仍在跑的呼叫
+    provider 的 concurrency 屬性為同時下載的批次上限 (例如 yfinance 只能一次一批)
+    整批重試仍失敗時拆成逐檔工作，讓單檔壞資料不拖垮整批
+    """
+    provider = provider or YahooProvider()
+    report = report if report is not None else FetchReport()
+    loop = asyncio.get_running_loop()
+    sem = asyncio.Semaphore(min(concurrency, getattr(provider, 'concurrency', concurrency)))
+    results = asyncio.Queue()
+    pending = [0]
+
+    async def attempt(chunk, kwargs):
+        if hasattr(provider, 'adownload'):
+            return await asyncio.wait_for(provider.adownload(chunk, **kwargs), timeout)
+        return await loop.run_in_executor(None, partial(provider.download, chunk, timeout=timeout, **kwargs))
+
+    async def worker(chunk, kwargs, tries):
+        res = None
+        async with sem:
+            for n in range(tries + 1):
+                try:
+                    res = await attempt(chunk, kwargs)
+                    break
+                except Exception as e:
+                    res = e if str(e) else type(e).__name__
+                    if n < tries:
+                        report.retries += 1
+                        await asyncio.sleep(backoff * 2 ** n)
+        if isinstance(res, dict) or len(chunk) == 1:
+            await results.put((chunk, res))
+        else:
+            # 拆成逐檔後只再試一次，避免壞標的把退避時間放大
+            for t in chunk: spawn([t], kwargs, min(retries, 1))
+        pending[0] -= 1
+        if pending[0] == 0: await results.put(None)
+
+    def spawn(chunk, kwargs, tries=retries):
+        pending[0] += 1
+        asyncio.ensure_future(worker(chunk, kwargs, tries))
+
+    jobs = [(list(c), kw) for c, kw in jobs if c]
+    if not jobs: return
+    for chunk, kwargs in jobs: spawn(chunk, kwargs)
+    while True:
+        item = await results.get()
+        if item is None: break
+        chunk, res = item
+        if not isinstance(res, dict):
+            for t in chunk: report.failed[t] = str(res)
+            continue
+        for t in chunk:
+            df = res.get(t)
+            if df is None or df.empty:
+                report.empty.append(t)
+                continue
+            report.ok.append(t)
+            yield t, df
+
+
+def iter_fetch(jobs, provider=None, report=None, **kwargs):
+    """同步介面：事件迴圈跑在背景執行緒，主執行緒邊收邊分析 (CPU 與網路等待重疊)"""
+    out = queue.Queue(maxsize=CHUNK_SIZE * 2)
+    done = object()
+
+    def produce():
+        async def pump():
+            async for item in fetch_async(jobs, provider, report=report, **kwargs):
+                await asyncio.get_running_loop().run_in_executor(None, out.put, item)
+        try: asyncio.run(pump())
+        except Exception as e: print(f"下載管線異常: {e}")
+        finally: out.put(done)
+
+    threading.Thread(target=produce, daemon=True).start()
+    while True:
+        item = out.get()
+        if item is done: break
+        yield item
+
+
+def batch_download(tickers, provider=None, chunk_size=CHUNK_SIZE, report=None, **kwargs):
+    """分批下載，逐檔產出 (ticker, df)；單檔失敗不影響同批其他標的"""
+    return iter_fetch(make_jobs(tickers, chunk_size, **kwargs), provider, report)
@@ -0,0 +1,162 @@
+import os
+import numpy as np
+import pandas as pd
+
+# ==========================================
+# ⚙️ 濾網漏斗設定
+# ==========================================
+FUNNEL_DIR = '_funnel'      # 存在價格庫目錄下，每個交易日一個 parquet
+GATES = ('price', 'volume', 'stage2', 'rs', 'pattern')
+CHOSE_SETUPS = ("", "🚀 高窄旗型", "🕳️ 買進跳空", "📦 VCP突破")
+NEAR = 0.05             # near() 預設：差距 5% (RS 為 5 分) 以內視為接近門檻
+
+# ==========================================
+# 向量化關卡 (日期 × 標的，與 StockSystem.analyze_chose / analyze_drive 相同判斷)
+# ==========================================
+def _rank_gate(s, ok, margin, min_rank):
+    """有設定 RS 排名門檻時併入 RS 關卡 (沒有排名視為未通過)"""
+    if not min_rank: return ok, margin
+    rank = s['rs_rank'] if 'rs_rank' in s else np.full(ok.shape, np.nan)
+    with np.errstate(invalid='ignore'):
+        return ok & (rank >= min_rank), np.fmax(margin, min_rank - rank)
+
+
+class Gates:
+    """
+    某策略的各關卡：values 為判斷用的數值，ok 為是否通過，margin 為未通過時距門檻的差距
+    (價格 / 均量 / 均線為比例，RS 與評分為分數)；關卡依 GATES 順序判斷
+    """
+
+    def __init__(self, values, ok, margin):
+        self.values, self.ok, self.margin = values, ok, margin
+
+    def passed(self, upto='pattern'):
+        """依序通過 upto (含) 以前所有關卡"""
+        out = np.ones_like(self.ok[GATES[0]])
+        for g in GATES[:GATES.index(upto) + 1]: out &= self.ok[g]
+        return out
+
+    def first_failed(self):
+        """第一個未通過的關卡編號 (全部通過為 len(GATES))"""
+        fail = np.stack([~self.ok[g] for g in GATES])
+        return np.where(fail.any(axis=0), np.argmax(fail, axis=0), len(GATES))
+
+
+def chose_gates(ind, bench_roc, system):
+    """bench_roc 為最新一日的大盤 ROC (純量) 或對齊日期的 (日期, 1) 陣列；pattern 值為 CHOSE_SETUPS 的索引"""
+    s = ind.values
+    c, ma50, ma200 = s['close'], s['ma50'], s['ma200']
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rs = (s[f'roc{system.rs_period_chose}'] - bench_roc) * 100
+        dist = (s['high250'] - c) / s['high250']
+        is_breakout = (c > s['high20_prev']) & (s['prev_close'] < s['high20_prev'])
+        rally = (s['high60'] - s['close_min60']) / s['close_min60']
+        is_flag = (rally > 0.8) & (dist < 0.25) & is_breakout
+        is_gap = (s['open'] - s['prev_close']) / s['prev_close'] > 0.08
+        is_vcp = is_breakout & (dist < 0.15)
+        # 判斷順序同 if / elif：高窄旗型 > 買進跳空 > VCP
+        setup = np.select([is_flag, is_gap, is_vcp], [1, 2, 3], 0)
+        rs_ok, rs_margin = _rank_gate(s, ~(rs < 0), -rs, system.min_rank_chose)
+        return Gates(
+            {'close': c, 'vol20': s['vol20'], 'ma50': ma50, 'ma200': ma200, 'rs': rs, 'pattern': setup},
+            {'price': ~(c < system.min_price), 'volume': ~(s['vol20'] < system.min_volume_chose),
+             'stage2': (c > ma50) & (ma50 > ma200), 'rs': rs_ok, 'pattern': setup > 0},
+            {'price': 1 - c / system.min_price, 'volume': 1 - s['vol20'] / system.min_volume_chose,
+             'stage2': np.fmax(1 - c / ma50, 1 - ma50 / ma200), 'rs': rs_margin, 'pattern': np.full(c.shape, np.nan)})
+
+
+def drive_gates(ind, bench_roc, system):
+    """同 chose_gates；pattern 值為 DRIVE 評分，Stage 2 含距 52 週高點 25% 以內"""
+    s = ind.values
+    c, ma50, ma200 = s['close'], s['ma50'], s['ma200']
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rs = (s[f'roc{system.rs_period_drive}'] - bench_roc) * 100
+        dist = (s['high250'] - c) / s['high250']
+        is_mvp = (s['up_days15'] >= 9) & (s['vol_ratio15'] >= 1.2)
+        breakout = (c > s['close_max20_prev']) & (s['volume'] > s['vol20'] * 1.3)
+        score = breakout * 50 + is_mvp * 30 + (rs > 30) * 20
+        rs_ok, rs_margin = _rank_gate(s, ~(rs < 5), 5 - rs, system.min_rank_drive)
+        return Gates(
+            {'close': c, 'vol20': s['vol20'], 'ma50': ma50, 'ma200': ma200, 'rs': rs, 'pattern': score},
+            {'price': ~(c < system.min_price), 'volume': ~(s['vol20'] < system.min_volume_drive),
+             'stage2': (c > ma50) & (ma50 > ma200) & (dist < 0.25), 'rs': rs_ok, 'pattern': score >= 30},
+            {'price': 1 - c / system.min_price, 'volume': 1 - s['vol20'] / system.min_volume_drive,
+             'stage2': np.fmax(np.fmax(1 - c / ma50, 1 - ma50 / ma200), dist - 0.25), 'rs': rs_margin, 'pattern': 30.0 - score})
+
+# ==========================================
+# 每檔最新一根 K 棒的關卡紀錄 (欄位式表格)
+# ==========================================
+def gate_table(ind, gates):
+    """
+    gates 為 {策略名稱: Gates}，回傳每個 (策略, 標的) 一列：
+    date / strategy / ticker、各關卡數值、ok_<關卡>、failed (第一個未通過的關卡，全過為空字串) 與其 margin
+    """
+    p = ind.panel
+    j = np.flatnonzero(ind.last >= 0)
+    i = ind.last[j]
+    labels = np.array(GATES + ('',), dtype=object)
+    parts = []
+    for name, g in gates.items():
+        first = g.first_failed()[i, j]
+        margin = np.stack([g.margin[x][i, j] for x in GATES] + [np.full(len(j), np.nan)])
+        df = pd.DataFrame({'date': p.dates[i], 'strategy': name, 'ticker': [p.tickers[x] for x in j]})
+        for k, v in g.values.items(): df[k] = v[i, j].astype(np.float32)
+        for k in GATES: df[f'ok_{k}'] = g.ok[k][i, j]
+        df['failed'] = labels[first]
+        df['margin'] = margin[first, np.arange(len(j))].astype(np.float32)
+        parts.append(df)
+    if not parts: return pd.DataFrame()
+    table = pd.concat(parts, ignore_index=True)
+    for k in ('strategy', 'failed'): table[k] = pd.Categorical(table[k], categories=sorted(set(table[k])))
+    return table
+
+# ==========================================
+# 歷史漏斗 (價格庫目錄下，每日一檔)
+# ==========================================
+class Funnel:
+    """每日關卡紀錄的讀寫與查詢"""
+
+    def __init__(self, store, root=None):
+        self.root = root or os.path.join(store.root, FUNNEL_DIR)
+        os.makedirs(self.root, exist_ok=True)
+
+    def path(self, date):
+        return os.path.join(self.root, f"{pd.Timestamp(date):%Y-%m-%d}.parquet")
+
+    def save(self, table):
+        """以各列最新的交易日為檔名；同一天重跑直接覆蓋"""
+        if table.empty: return None
+        path = self.path(table['date'].max())
+        table.to_parquet(path, index=False)
+        return path
+
+    def dates(self):
+        return sorted(pd.Timestamp(f[:-8]) for f in os.listdir(self.root) if f.endswith('.parquet'))
+
+    def load(self, start=None, end=None, strategy=None, ticker=None):
+        """讀回 [start, end] 期間的紀錄，可依策略 / 代號過濾"""
+        days = [d for d in self.dates() if (start is None or d >= pd.Timestamp(start)) and (end is None or d <= pd.Timestamp(end))]
+        if not days: return pd.DataFrame()
+        table = pd.concat([pd.read_parquet(self.path(d)) for d in days], ignore_index=True)
+        if strategy is not None: table = table[table['strategy'] == strategy]
+        if ticker is not None: table = table[table['ticker'] == ticker]
+        return table.reset_index(drop=True)
+
+
+def skip_pairs(table, before='pattern'):
+    """在 before 以前的關卡就被剔除的 (策略, 代號)：掃描時不必再呼叫策略外掛"""
+    if table.empty: return set()
+    out = table['failed'].isin(GATES[:GATES.index(before)])
+    return set(zip(table['strategy'][out].astype(str), table['ticker'][out]))
+
+
+def near(table, gate, within=NEAR):
+    """卡在 gate 且距門檻不到 within 的標的 (明天最可能翻過門檻的觀察名單)"""
+    return table[(table['failed'] == gate) & (table['margin'] <= within)].sort_values('margin')
+
+
+def funnel_counts(table):
+    """各策略在每個關卡被剔除的檔數 (漏斗)"""
+    if table.empty: return pd.DataFrame()
+    counts = pd.crosstab(table['strategy'].astype(str), table['failed'].astype(str))
+    return counts.reindex(columns=[g for g in GATES + ('',) if g in counts.columns]).rename(columns={'': 'passed'})
@@ -1,130 +1,268 @@
 
 
-import yfinance as yf
+import os
+import json
 import pandas as pd
 import numpy as np
 from tabulate import tabulate
+from store import PriceStore
+from indicators import build_panel, compute_indicators
+from prices import PriceBars
+from scanner import register
 
 # ==========================================
 # ⚙️ 使用者設定 (請在此輸入您的庫存)
 # ==========================================
-# 格式: '代號': {'cost': 買入成本, 'stop_loss_pct': 初始停損% (書中建議 5-7%)}
+# 格式: '代號': {'cost': 買入成本, 'stop_loss_pct': 初始停損% (書中建議 5-7%)}，可另加 'entry': 進場日 (盤中監控據此算持有以來最高價)
+# 上市用 .TW、上櫃用 .TWO；main.py / monitor.py 皆引用這一份
 MY_PORTFOLIO = {
-    '4939.TW': {'cost': 51.2, 'stop_loss_pct': 0.07},  #
-    '3346.TW': {'cost': 50.8, 'stop_loss_pct': 0.07}, #
-    '2317.TWO': {'cost': 227.2, 'stop_loss_pct': 0.07} # (上櫃用 .TWO)
+    '4939.TW': {'cost': 51.2, 'stop_loss_pct': 0.07},  # 亞電
+    '3346.TW': {'cost': 50.8, 'stop_loss_pct': 0.07},  # 麗清
+    '2492.TW': {'cost': 133.5, 'stop_loss_pct': 0.07}, # 華新科
+    '2317.TW': {'cost': 227.2, 'stop_loss_pct': 0.07}  # 鴻海
 }
+# 多帳戶：目錄下每個 .json / .csv 為一個 (或多個) 帳戶的庫存，沒有檔案時只健檢 MY_PORTFOLIO
+PORTFOLIO_DIR = os.environ.get('PORTFOLIO_DIR', os.path.join('data', 'portfolios'))
+HEALTH_PERIOD = '6mo'   # 均線所需的資料長度
 
 # ==========================================
 # 核心邏輯
 # ==========================================
-def health_check(portfolio):
-    print("🏥 正在為您的庫存進行「考特賣出法則」健檢...\n")
-    results = []
+def check_position(ticker, data, snap):
+    """單一持股套用考特賣出法則；snap 為 indicators 算好的最新指標"""
+    # 2. 計算關鍵指標
+    current_price = snap['close']
+    cost = data['cost']
+    init_risk_pct = data['stop_loss_pct']
+    init_risk_amt = cost * init_risk_pct # 初始風險金額 (1R)
+
+    # 均線
+    ma10, ma20, ma50 = snap['ma10'], snap['ma20'], snap['ma50']
+
+    # 獲利狀況
+    pnl_pct = (current_price - cost) / cost
+    pnl_amt = current_price - cost
+    r_multiple = pnl_amt / init_risk_amt # 目前賺了幾個 R
+
+    # 3. 執行賣出法則判定
+    action = "✅ 續抱"
+    sell_price = 0.0
+    reason = []
+
+    # (A) 初始停損 (Hard Stop)
+    hard_stop_price = cost * (1 - init_risk_pct)
+    if current_price < hard_stop_price:
+        action = "🛑 清倉賣出 (停損)"
+        reason.append(f"觸發初始停損 (跌破 {round(hard_stop_price, 2)})")
+        sell_price = current_price
+
+    # (B) 第一法則：保本法則 (Breakeven) - 賺 2R 以上
+    # 如果賺超過 2R，停損點上移至成本價
+    elif r_multiple >= 2:
+        # 檢查是否跌回成本
+        if current_price < cost:
+            action = "🛑 清倉賣出 (保本)"
+            reason.append("獲利回吐觸及成本價 (Rule 1)")
+            sell_price = cost
+        else:
+            reason.append(f"已達 2R ({round(r_multiple,1)}R)，停損上移至成本價 {cost}")
+
+    # (C) 第二法則：獲利 3R 減碼 (Scale Out)
+    if r_multiple >= 3:
+        reason.append(f"獲利達 3R ({round(r_multiple,1)}R)，建議獲利了結一半 (Rule 2)")
+        if action == "✅ 續抱": action = "💰 部分獲利"
+
+    # (D) 第三/四法則：均線防守 (MA Rule)
+    # 判斷是否為超級強勢股 (連續7週守住10日線 -> 這裡簡化為最近35天都在10MA上)
+    is_super_strong = bool(snap['super35'])
+
+    check_ma = ma10 if is_super_strong else ma20
+    ma_name = "10MA" if is_super_strong else "20MA"
+
+    if current_price < check_ma:
+        if action != "🛑 清倉賣出 (停損)": # 如果還沒被停損
+            action = "⚠️ 警戒 / 賣出"
+            reason.append(f"跌破 {ma_name} ({round(check_ma, 2)})，趨勢轉弱 (Rule 3/4)")
+            sell_price = current_price
+    else:
+        reason.append(f"股價守穩 {ma_name} ({round(check_ma, 2)})")
+
+    # (E) 整合建議賣出價 (若需賣出)
+    # 如果目前是續抱，建議賣出價就是這三者的最高者：初始停損、成本(若達2R)、均線
+    suggested_stop = hard_stop_price
+    if r_multiple >= 2: suggested_stop = max(suggested_stop, cost)
+    suggested_stop = max(suggested_stop, check_ma) # 動態防守
+
+    return {
+        "代號": ticker.split('.')[0],
+        "現價": round(current_price, 2),
+        "成本": cost,
+        "獲利(R)": f"{round(r_multiple, 1)}R",
+        "建議動作": action,
+        "建議防守價": round(suggested_stop, 2),
+        "診斷原因": " | ".join(reason)
+    }
+
+
+@register('health', portfolio_only=True)
+def scan_plugin(info, df, ctx):
+    """統一掃描外掛：只處理 ctx.portfolio 內的持股"""
+    data = ctx.portfolio.get(info['ticker'])
+    if data is None: return None
+    return check_position(info['ticker'], data, ctx.snapshot(info['ticker']))
 
-    for ticker, data in portfolio.items():
-        try:
-            # 1. 抓取資料 (抓取足夠計算均線的天數)
-            df = yf.download(ticker, period='6mo', progress=False, auto_adjust=True)
-            if df.empty:
-                print(f"❌ 找不到 {ticker} 資料")
-                continue
-
-            # 處理多層索引
-            close = df['Close']
-            if isinstance(close, pd.DataFrame): close = close.iloc[:, 0]
-
-            # 2. 計算關鍵指標
-            current_price = float(close.iloc[-1])
-            cost = data['cost']
-            init_risk_pct = data['stop_loss_pct']
-            init_risk_amt = cost * init_risk_pct # 初始風險金額 (1R)
-
-            # 均線
-            ma10 = float(close.rolling(10).mean().iloc[-1])
-            ma20 = float(close.rolling(20).mean().iloc[-1])
-            ma50 = float(close.rolling(50).mean().iloc[-1])
-
-            # 獲利狀況
-            pnl_pct = (current_price - cost) / cost
-            pnl_amt = current_price - cost
-            r_multiple = pnl_amt / init_risk_amt # 目前賺了幾個 R
-
-            # 3. 執行賣出法則判定
-            action = "✅ 續抱"
-            sell_price = 0.0
-            reason = []
-
-            # (A) 初始停損 (Hard Stop)
-            hard_stop_price = cost * (1 - init_risk_pct)
-            if current_price < hard_stop_price:
-                action = "🛑 清倉賣出 (停損)"
-                reason.append(f"觸發初始停損 (跌破 {round(hard_stop_price, 2)})")
-                sell_price = current_price
-
-            # (B) 第一法則：保本法則 (Breakeven) - 賺 2R 以上
-            # 如果賺超過 2R，停損點上移至成本價
-            elif r_multiple >= 2:
-                # 檢查是否跌回成本
-                if current_price < cost:
-                    action = "🛑 清倉賣出 (保本)"
-                    reason.append("獲利回吐觸及成本價 (Rule 1)")
-                    sell_price = cost
-                else:
-                    reason.append(f"已達 2R ({round(r_multiple,1)}R)，停損上移至成本價 {cost}")
-
-            # (C) 第二法則：獲利 3R 減碼 (Scale Out)
-            if r_multiple >= 3:
-                reason.append(f"獲利達 3R ({round(r_multiple,1)}R)，建議獲利了結一半 (Rule 2)")
-                if action == "✅ 續抱": action = "💰 部分獲利"
-
-            # (D) 第三/四法則：均線防守 (MA Rule)
-            # 判斷是否為超級強勢股 (連續7週守住10日線 -> 這裡簡化為最近35天都在10MA上)
-            is_super_strong = (close.iloc[-35:] > close.rolling(10).mean().iloc[-35:]).all()
-
-            check_ma = ma10 if is_super_strong else ma20
-            ma_name = "10MA" if is_super_strong else "20MA"
-
-            if current_price < check_ma:
-                if action != "🛑 清倉賣出 (停損)": # 如果還沒被停損
-                    action = "⚠️ 警戒 / 賣出"
-                    reason.append(f"跌破 {ma_name} ({round(check_ma, 2)})，趨勢轉弱 (Rule 3/4)")
-                    sell_price = current_price
-            else:
-                reason.append(f"股價守穩 {ma_name} ({round(check_ma, 2)})")
-
-            # (E) 整合建議賣出價 (若需賣出)
-            # 如果目前是續抱，建議賣出價就是這三者的最高者：初始停損、成本(若達2R)、均線
-            suggested_stop = hard_stop_price
-            if r_multiple >= 2: suggested_stop = max(suggested_stop, cost)
-            suggested_stop = max(suggested_stop, check_ma) # 動態防守
-
-            results.append({
-                "代號": ticker.replace('.TW', '').replace('.TWO', ''),
-                "現價": round(current_price, 2),
-                "成本": cost,
-                "獲利(R)": f"{round(r_multiple, 1)}R",
-                "建議動作": action,
-                "建議防守價": round(suggested_stop, 2),
-                "診斷原因": " | ".join(reason)
-            })
-
-        except Exception as e:
-            print(f"分析 {ticker} 時發生錯誤: {e}")
-
-    return pd.DataFrame(results)
 
 # ==========================================
-# 執行程式
+# 多帳戶健檢引擎 (同一檔只下載一次、指標只算一次)
 # ==========================================
-if __name__ == "__main__":
-    df_result = health_check(MY_PORTFOLIO)
+ACTIONS = ("✅ 續抱", "💰 部分獲利", "⚠️ 警戒 / 賣出", "🛑 清倉賣出 (保本)", "🛑 清倉賣出 (停損)")
+
+
+def positions_frame(portfolio, account='default'):
+    """{代號: {'cost', 'stop_loss_pct'}} 轉成持股表 (account / ticker / cost / stop_loss_pct)"""
+    return pd.DataFrame([{'account': account, 'ticker': t, 'cost': float(d['cost']), 'stop_loss_pct': float(d['stop_loss_pct'])}
+                         for t, d in portfolio.items()], columns=['account', 'ticker', 'cost', 'stop_loss_pct'])
+
+
+def load_portfolios(paths=None, default=MY_PORTFOLIO):
+    """
+    讀入任意數量的帳戶庫存，回傳持股表 (一列一個持股)
+    .json：{代號: {'cost', 'stop_loss_pct'}}，帳戶名為檔名
+    .csv：ticker, cost, stop_loss_pct 欄位，可另有 account 欄位 (一檔多帳戶)
+    paths 為 None 時讀 PORTFOLIO_DIR 下所有檔案；都沒有時以 default 為唯一帳戶
+    """
+    if paths is None:
+        paths = sorted(os.path.join(PORTFOLIO_DIR, f) for f in os.listdir(PORTFOLIO_DIR)) if os.path.isdir(PORTFOLIO_DIR) else []
+    parts = []
+    for path in paths:
+        account = os.path.splitext(os.path.basename(path))[0]
+        if path.endswith('.json'):
+            with open(path, encoding='utf-8') as f: parts.append(positions_frame(json.load(f), account))
+        elif path.endswith('.csv'):
+            df = pd.read_csv(path, dtype={'ticker': str, 'account': str})
+            if 'account' not in df: df.insert(0, 'account', account)
+            parts.append(df[['account', 'ticker', 'cost', 'stop_loss_pct']])
+    if not parts: return positions_frame(default)
+    return pd.concat(parts, ignore_index=True)
+
 
+def canonical_tickers(tickers, universe=None):
+    """
+    依上市 / 上櫃別改正代號後綴 ('2317'、'2317.TWO' -> '2317.TW')，回傳 {原代號: 正確代號}
+    代號表 (twstock) 取不到時保留原樣
+    """
+    if universe is None:
+        try:
+            from fetch import get_universe
+            universe = get_universe()
+        except Exception:
+            universe = []
+    by_code = {u['ticker'].split('.')[0]: u['ticker'] for u in universe}
+    return {t: by_code.get(t.split('.')[0], t) for t in tickers}
+
+
+def kotter(positions, ind):
+    """
+    所有帳戶的持股一次套用考特賣出法則 (判斷同 check_position)
+    同一檔的均線只取一次，各持股依自己的成本 / 停損比例判斷；ind 沒有資料的持股略過
+    """
+    pos = positions[positions['ticker'].isin(ind.panel.col)].reset_index(drop=True)
+    v = ind.latest(pos['ticker'], ('close', 'ma10', 'ma20', 'super35'))
+    price, cost, pct = v['close'], pos['cost'].to_numpy(float), pos['stop_loss_pct'].to_numpy(float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        r = (price - cost) / (cost * pct)
+        hard = cost * (1 - pct)
+        is_super = v['super35'] != 0    # 同 bool(snap['super35'])：NaN 視為 True
+        check_ma = np.where(is_super, v['ma10'], v['ma20'])
+        stopped = price < hard
+        r2 = ~stopped & (r >= 2)
+        r3 = r >= 3
+        below = price < check_ma
+        # ACTIONS 的索引：停損 > 跌破均線 > 保本 > 3R 減碼 > 續抱 (跌破均線的警戒會蓋過保本)
+        code = np.select([stopped, below, r2 & (price < cost), r3], [4, 2, 3, 1], 0)
+        stop = np.fmax(np.where(r >= 2, np.fmax(hard, cost), hard), check_ma)
+
+    reasons = []
+    # 文字以 Python float 四捨五入 (同 check_position 的 round)
+    price_, cost_, r_, hard_, ma_ = price.tolist(), cost.tolist(), r.tolist(), hard.tolist(), check_ma.tolist()
+    for k in range(len(pos)):
+        reason = []
+        if stopped[k]: reason.append(f"觸發初始停損 (跌破 {round(hard_[k], 2)})")
+        elif r2[k]:
+            if price_[k] < cost_[k]: reason.append("獲利回吐觸及成本價 (Rule 1)")
+            else: reason.append(f"已達 2R ({round(r_[k], 1)}R)，停損上移至成本價 {cost_[k]}")
+        if r3[k]: reason.append(f"獲利達 3R ({round(r_[k], 1)}R)，建議獲利了結一半 (Rule 2)")
+        ma_name = "10MA" if is_super[k] else "20MA"
+        if below[k]:
+            if not stopped[k]: reason.append(f"跌破 {ma_name} ({round(ma_[k], 2)})，趨勢轉弱 (Rule 3/4)")
+        else: reason.append(f"股價守穩 {ma_name} ({round(ma_[k], 2)})")
+        reasons.append(" | ".join(reason))
+
+    return pd.DataFrame({
+        "帳戶": pos['account'],
+        "代號": [t.split('.')[0] for t in pos['ticker']],
+        "現價": [round(x, 2) for x in price_],
+        "成本": cost,
+        "獲利(R)": [f"{round(x, 1)}R" for x in r_],
+        "建議動作": np.array(ACTIONS, dtype=object)[code],
+        "建議防守價": [round(x, 2) for x in stop.tolist()],
+        "診斷原因": reasons,
+    })
+
+
+def health_check_all(positions, store=None, universe=None):
+    """多帳戶健檢：代號先改正並去重，每檔只讀一次價格、全部持股共用同一份指標"""
+    store = store or PriceStore()
+    positions = positions.assign(ticker=positions['ticker'].map(canonical_tickers(positions['ticker'].unique(), universe)))
+    tickers = list(dict.fromkeys(positions['ticker']))
+    print(f"🏥 {positions['account'].nunique()} 個帳戶、{len(positions)} 筆持股 ({len(tickers)} 檔不重複) 進行「考特賣出法則」健檢...\n")
+    frames = {t: PriceBars.from_frame(df) for t, df in store.get(tickers, HEALTH_PERIOD)}
+    for t in tickers:
+        if t not in frames: print(f"❌ 找不到 {t} 資料")
+    if not frames: return pd.DataFrame()
+    return kotter(positions, compute_indicators(build_panel(frames)))
+
+
+def health_check(portfolio, store=None, universe=None):
+    """單一帳戶健檢 (同 health_check_all，不含帳戶欄)"""
+    df = health_check_all(positions_frame(portfolio), store, universe)
+    return df.drop(columns='帳戶') if not df.empty else df
+
+
+TIPS = [
+    "1. [獲利(R)]: 獲利金額 / 初始風險金額。書中建議 >3R 可減碼。",
+    "2. [建議防守價]: 若明日收盤價低於此價格，應執行賣出。",
+]
+
+
+def print_report(df_result):
     if not df_result.empty:
         print("\n📊 庫存健檢報告 (依據書中法則)")
         print(tabulate(df_result, headers='keys', tablefmt='fancy_grid', showindex=False))
         print("\n💡 說明：")
-        print("1. [獲利(R)]: 獲利金額 / 初始風險金額。書中建議 >3R 可減碼。")
-        print("2. [建議防守價]: 若明日收盤價低於此價格，應執行賣出。")
+        for tip in TIPS: print(tip)
     else:
         print("無資料")
+
+
+def run_health_check(portfolio=MY_PORTFOLIO):
+    """指令列入口：健檢並印出報告"""
+    print_report(health_check(portfolio))
+
+# ==========================================
+# 執行程式
+# ==========================================
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="考特賣出法則庫存健檢 (多帳戶)")
+    parser.add_argument('paths', nargs='*', help="帳戶庫存檔 (.json / .csv)，預設讀 PORTFOLIO_DIR，沒有檔案時為 MY_PORTFOLIO")
+    parser.add_argument('--out', help="全部帳戶結果另存 CSV")
+    args = parser.parse_args()
+
+    result = health_check_all(load_portfolios(args.paths or None))
+    for account, df in (result.groupby('帳戶', sort=False) if not result.empty else []):
+        print(f"\n👤 帳戶：{account}")
+        print_report(df.drop(columns='帳戶'))
+    if args.out and not result.empty:
+        result.to_csv(args.out, index=False, encoding='utf-8-sig')
+        print(f"\n💾 已寫入 {args.out}")
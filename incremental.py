@@ -0,0 +1,237 @@
+import os
+import math
+import pickle
+from collections import deque
+import numpy as np
+from prices import PriceBars
+from indicators import Indicators, MA_WINDOWS, ROC_PERIODS, YEAR_WINDOW, SUPER_WINDOW, MVP_WINDOW
+
+# ==========================================
+# ⚙️ 增量指標設定
+# ==========================================
+STATE_FILE = '_indicators.pkl'      # 存在價格庫目錄下
+NAN = float('nan')
+
+
+def _div(a, b):
+    """與 numpy 相同的除法語意 (除以 0 得 inf / NaN，不丟例外)"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return float(np.float64(a) / b)
+
+
+def two_sum(a, b):
+    """a + b = s + e 且無捨入誤差 (Knuth TwoSum)"""
+    s = a + b
+    bb = s - a
+    return s, (a - (s - bb)) + (b - bb)
+
+# ==========================================
+# O(1) 滾動運算
+# ==========================================
+class RollingSum:
+    """
+    w 日精確加總 (雙倍精度 hi + lo)：加入新值、扣掉 w 天前的值，長期逐日累加也不會累積捨入誤差
+    indicators.rolling_sum 為一般前綴和相減，兩者只差在最後幾位的捨入
+    """
+    __slots__ = ('w', 'buf', 'hi', 'lo', 'nans')
+
+    def __init__(self, w):
+        self.w = w
+        self.buf = deque(maxlen=w)
+        self.hi = self.lo = 0.0
+        self.nans = 0
+
+    def _add(self, x):
+        s, e = two_sum(self.hi, x)
+        self.hi, self.lo = two_sum(s, e + self.lo)
+
+    def push(self, x):
+        if len(self.buf) == self.w:
+            old = self.buf[0]
+            if math.isnan(old): self.nans -= 1
+            else: self._add(-old)
+        self.buf.append(x)
+        if math.isnan(x): self.nans += 1
+        else: self._add(x)
+
+    @property
+    def value(self):
+        return self.hi if len(self.buf) == self.w and not self.nans else NAN
+
+    def value_after(self, x):
+        """假設再加入 x 時的加總 (不改變狀態)，盤中試算用"""
+        full = len(self.buf) == self.w
+        if len(self.buf) < self.w - 1 or math.isnan(x) or self.nans - (full and math.isnan(self.buf[0])): return NAN
+        hi, lo = self.hi, self.lo
+        for y in ((-self.buf[0], x) if full else (x,)):
+            s, e = two_sum(hi, y)
+            hi, lo = two_sum(s, e + lo)
+        return hi
+
+
+class RollingExtreme:
+    """單調佇列求 w 日極值 (略過 NaN，不足 w 筆時取已有資料)，結果與 rolling_max / rolling_min 相同"""
+    __slots__ = ('w', 'sign', 'q', 'i')
+
+    def __init__(self, w, sign=1):
+        self.w = w
+        self.sign = sign        # 1 = 最大值，-1 = 最小值 (存負值)
+        self.q = deque()
+        self.i = -1
+
+    def push(self, x):
+        self.i += 1
+        if not math.isnan(x):
+            x = x * self.sign
+            while self.q and self.q[-1][1] <= x: self.q.pop()
+            self.q.append((self.i, x))
+        while self.q and self.q[0][0] <= self.i - self.w: self.q.popleft()
+
+    @property
+    def value(self):
+        return self.q[0][1] * self.sign if self.q else NAN
+
+    def value_after(self, x):
+        """假設再加入 x 時的極值 (不改變狀態)"""
+        keep = [v for i, v in self.q if i > self.i + 1 - self.w]
+        if not math.isnan(x): keep.append(x * self.sign)
+        return max(keep) * self.sign if keep else NAN
+
+# ==========================================
+# 單檔指標狀態
+# ==========================================
+class IndicatorState:
+    """
+    單檔的滾動狀態：每加入一根 K 棒 O(1) 更新
+    snapshot 與 compute_indicators 在同一段資料最後一根 K 棒的結果相同 (均線 / 均量只差浮點捨入)
+    """
+
+    def __init__(self, roc_periods=ROC_PERIODS):
+        self.roc_periods = tuple(roc_periods)
+        self.asof = None
+        self.last_close = NAN
+        self.snap = None
+        self.closes = deque(maxlen=max(self.roc_periods + (1,)) + 1)
+        self.ma = {w: RollingSum(w) for w in MA_WINDOWS}
+        self.vol20 = RollingSum(20)
+        self.vol15 = RollingSum(MVP_WINDOW)
+        self.vol15_hist = deque(maxlen=MVP_WINDOW + 2)
+        self.up = RollingSum(MVP_WINDOW - 1)
+        self.high250 = RollingExtreme(YEAR_WINDOW)
+        self.low250 = RollingExtreme(YEAR_WINDOW, -1)
+        self.high60 = RollingExtreme(60)
+        self.close_min60 = RollingExtreme(60, -1)
+        self.high20 = RollingExtreme(20)
+        self.close_max20 = RollingExtreme(20)
+        self.above = RollingExtreme(SUPER_WINDOW, -1)
+
+    def update(self, date, o, h, l, c, v):
+        prev_c = self.closes[-1] if self.closes else NAN
+        # 昨日以前的窗口值 (等同 shift(..., 1))，要在加入今天之前取
+        high20_prev, close_max20_prev, up_days = self.high20.value, self.close_max20.value, self.up.value
+
+        self.closes.append(c)
+        for s in self.ma.values(): s.push(c)
+        self.vol20.push(v)
+        self.vol15.push(v)
+        self.vol15_hist.append(self.vol15.value)
+        self.up.push(NAN if math.isnan(c) else float(c > prev_c))
+        self.high250.push(h)
+        self.low250.push(l)
+        self.high60.push(h)
+        self.close_min60.push(c)
+        self.high20.push(h)
+        self.close_max20.push(c)
+        ma10 = self.ma[10].value / 10
+        self.above.push(NAN if math.isnan(c) else float(c > ma10))
+
+        if math.isnan(c): return   # 與 Indicators.snapshot 相同：停在最後一根有收盤價的 K 棒
+        snap = {'close': c, 'prev_close': prev_c, 'open': o, 'volume': v}
+        for w, s in self.ma.items():
+            snap[f'ma{w}'] = s.value / w
+        snap['vol20'] = self.vol20.value / 20
+        for p in self.roc_periods:
+            snap[f'roc{p}'] = _div(c, self.closes[-1 - p]) - 1 if len(self.closes) > p else NAN
+        snap['high250'] = self.high250.value
+        snap['low250'] = self.low250.value
+        snap['high60'] = self.high60.value
+        snap['close_min60'] = self.close_min60.value
+        snap['high20_prev'] = high20_prev
+        snap['close_max20_prev'] = close_max20_prev
+        snap['super35'] = self.above.value
+        snap['up_days15'] = up_days
+        hist = self.vol15_hist
+        snap['vol_ratio15'] = _div(hist[-2] / MVP_WINDOW, hist[0] / MVP_WINDOW) if len(hist) == hist.maxlen else NAN
+        self.snap = snap
+        self.asof, self.last_close = date, c
+
+    def provisional(self, price):
+        """盤中試算：假設今天以 price 收盤，回傳健檢需要的指標 (close / prev_close / 均線 / super35)"""
+        snap = {'close': price, 'prev_close': self.closes[-1] if self.closes else NAN}
+        for w, s in self.ma.items():
+            snap[f'ma{w}'] = s.value_after(price) / w
+        snap['super35'] = self.above.value_after(float(price > snap['ma10']))
+        return snap
+
+    def extend(self, bars, start=0):
+        """把 bars[start:] 依序餵入"""
+        cols = [a[start:].tolist() for a in (bars.open, bars.high, bars.low, bars.close)]
+        vol = bars.volume[start:].astype(float).tolist()
+        for date, o, h, l, c, v in zip(bars.dates[start:], *cols, vol):
+            self.update(date, o, h, l, c, v)
+        return self
+
+    def resume_at(self, bars):
+        """bars 接續目前狀態時回傳下一根的位置；歷史被改寫 (除權息還原) 時回傳 None"""
+        if self.asof is None: return None
+        pos = bars.dates.searchsorted(self.asof)
+        if pos >= len(bars) or bars.dates[pos] != self.asof or bars.close[pos] != self.last_close: return None
+        return pos + 1
+
+# ==========================================
+# 全市場狀態簿 (存在價格庫目錄)
+# ==========================================
+class StateBook:
+    """每檔一份 IndicatorState；每天只需餵入新的 K 棒"""
+
+    def __init__(self, store, roc_periods=ROC_PERIODS, path=None):
+        self.roc_periods = tuple(roc_periods)
+        self.path = path or os.path.join(store.root, STATE_FILE)
+        self.states = self.load()
+        self.rebuilt = 0
+
+    def load(self):
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'rb') as f: return pickle.load(f)
+            except Exception as e: print(f"⚠️ 指標狀態無法讀取，重新建立: {e}")
+        return {}
+
+    def save(self):
+        tmp = self.path + '.tmp'
+        with open(tmp, 'wb') as f: pickle.dump(self.states, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self.path)
+
+    def sync(self, ticker, bars):
+        """餵入比狀態新的 K 棒；沒有狀態、週期不同或歷史被改寫時整段重建"""
+        bars = PriceBars.of(bars)
+        state = self.states.get(ticker)
+        start = state.resume_at(bars) if state is not None and state.roc_periods == self.roc_periods else None
+        if start is None:
+            state, start = IndicatorState(self.roc_periods), 0
+            self.rebuilt += 1
+        self.states[ticker] = state.extend(bars, start)
+        return state
+
+    def indicators(self, panel, frames):
+        """同步 frames 每一檔，回傳只在各檔最新一根填值的 Indicators (掃描、平行分派可直接使用)"""
+        ind = Indicators(panel, {})
+        for t, bars in frames.items():
+            snap = self.sync(t, bars).snap
+            j = panel.col[t]
+            i = ind.last[j]
+            if snap is None or i < 0: continue
+            for k, v in snap.items():
+                if k not in ind.values: ind.values[k] = np.full(panel.close.shape, np.nan)
+                ind.values[k][i, j] = v
+        return ind
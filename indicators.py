@@ -0,0 +1,206 @@
+import numpy as np
+import pandas as pd
+from prices import column
+
+# ==========================================
+# ⚙️ 指標參數
+# ==========================================
+FIELDS = ['Open', 'High', 'Low', 'Close', 'Volume']
+MA_WINDOWS = (10, 20, 50, 200)
+ROC_PERIODS = (20, 60)
+YEAR_WINDOW = 250       # 52 週高低點
+SUPER_WINDOW = 35       # 超級強勢股：連續 35 天站上 10MA
+MVP_WINDOW = 15         # 大戶吸籌觀察天數
+
+# ==========================================
+# 對齊價格矩陣 (日期 × 標的)
+# ==========================================
+class Panel:
+    """
+    全市場對齊後的 OHLCV 矩陣，shape = (日期數, 標的數)
+    present 標記各檔自己有的 K 棒 (None = 每檔日期都相同)；別檔有、這檔沒有的日期不是這檔的 K 棒
+    """
+
+    def __init__(self, dates, tickers, open, high, low, close, volume, present=None):
+        self.dates = dates
+        self.tickers = list(tickers)
+        self.open, self.high, self.low, self.close, self.volume = open, high, low, close, volume
+        self.present = present
+        self.col = {t: j for j, t in enumerate(self.tickers)}
+        self._order = None
+
+    def per_ticker(self, fn, *arrays):
+        """
+        在每檔自己的 K 棒上計算 fn (時間軸為該檔的第幾根，與單檔計算相同)，結果放回對齊後的日期
+        做法：每欄把自己的 K 棒往前壓緊、其餘留在尾端，fn 只往回看 (或往前看到 NaN) 所以尾端不影響結果，
+        算完再放回原本的列；fn 回傳陣列或 {名稱: 陣列}
+        """
+        if self.present is None: return fn(*arrays)
+        if self._order is None: self._order = np.argsort(~self.present, axis=0, kind='stable')
+        order = self._order
+        res = fn(*(np.take_along_axis(a, order, axis=0) for a in arrays))
+
+        def back(a):
+            out = np.empty_like(a)
+            np.put_along_axis(out, order, a, axis=0)
+            out[~self.present] = False if a.dtype == bool else np.nan
+            return out
+        return {k: back(a) for k, a in res.items()} if isinstance(res, dict) else back(res)
+
+
+def build_panel(frames):
+    """把 {ticker: DataFrame 或 PriceBars} 對齊成 Panel，缺資料的日期補 NaN 並記在 present"""
+    frames = dict(frames)
+    tickers = list(frames)
+    dates = pd.DatetimeIndex([])
+    for df in frames.values():
+        if not dates.equals(df.index): dates = dates.union(df.index)
+    arrays = [np.full((len(dates), len(tickers)), np.nan) for _ in FIELDS]
+    present = None
+    for j, t in enumerate(tickers):
+        df = frames[t]
+        if dates.equals(df.index): rows = slice(None)
+        else:
+            rows = dates.get_indexer(df.index)
+            if present is None: present = np.ones((len(dates), len(tickers)), dtype=bool)
+            present[:, j] = False
+            present[rows, j] = True
+        for a, f in zip(arrays, FIELDS):
+            a[rows, j] = column(df, f)
+    return Panel(dates, tickers, *arrays, present=present)
+
+# ==========================================
+# 向量化滾動運算 (axis 0 = 時間)
+# ==========================================
+def shift(a, n):
+    out = np.full_like(a, np.nan, dtype=float)
+    if n < len(a): out[n:] = a[:len(a) - n]
+    return out
+
+
+def prefix_sum(a):
+    """NaN 視為 0 的前綴和，首列補 0 (多條均線共用同一份)"""
+    return np.concatenate([np.zeros((1,) + a.shape[1:]), np.cumsum(np.where(np.isnan(a), 0.0, a), axis=0)])
+
+
+def rolling_sum(a, w, prefix=None):
+    """等同 pandas rolling(w).sum()：視窗內有 NaN 或不足 w 筆即為 NaN"""
+    valid = ~np.isnan(a)
+    zero = np.zeros((1,) + a.shape[1:])
+    cs = prefix if prefix is not None else prefix_sum(a)
+    cn = np.concatenate([zero, np.cumsum(valid, axis=0)])
+    out = np.full(a.shape, np.nan)
+    if len(a) >= w:
+        n = cn[w:] - cn[:-w]
+        out[w - 1:] = np.where(n == w, cs[w:] - cs[:-w], np.nan)
+    return out
+
+
+def rolling_mean(a, w, prefix=None):
+    return rolling_sum(a, w, prefix) / w
+
+
+def _rolling_extreme(a, w, ufunc):
+    """van Herk/Gil-Werman 區塊演算法，O(n) 計算含當日的 w 日極值 (不足 w 筆時取已有資料)"""
+    n = len(a)
+    out = np.empty(a.shape)
+    if n == 0: return out
+    head = min(w - 1, n)
+    out[:head] = ufunc.accumulate(a[:head], axis=0)
+    if n < w: return out
+    pad = (-n) % w
+    x = np.concatenate([a, np.full((pad,) + a.shape[1:], np.nan)])
+    b = x.reshape((-1, w) + a.shape[1:])
+    pre = ufunc.accumulate(b, axis=1).reshape(x.shape)
+    suf = ufunc.accumulate(b[:, ::-1], axis=1)[:, ::-1].reshape(x.shape)
+    out[w - 1:] = ufunc(suf[:n - w + 1], pre[w - 1:n])
+    return out
+
+
+def rolling_max(a, w):
+    return _rolling_extreme(a, w, np.fmax)
+
+
+def rolling_min(a, w):
+    return _rolling_extreme(a, w, np.fmin)
+
+
+def roc(a, n):
+    """等同 pandas pct_change(n, fill_method=None)：不先向前補值，同 prices.pct_change"""
+    return a / shift(a, n) - 1
+
+# ==========================================
+# 全市場指標計算
+# ==========================================
+class Indicators:
+    """一次算完全市場指標，CHOSE / DRIVE / 健檢共用"""
+
+    def __init__(self, panel, values):
+        self.panel = panel
+        self.values = values
+        # 每檔最後一根有效 K 棒的位置
+        valid = ~np.isnan(panel.close)
+        self.last = np.where(valid.any(axis=0), len(valid) - 1 - np.argmax(valid[::-1], axis=0), -1)
+
+    def __getitem__(self, key):
+        return self.values[key]
+
+    def snapshot(self, ticker):
+        """取出單檔最新一根 K 棒的所有指標 (dict of float)"""
+        j = self.panel.col[ticker]
+        i = self.last[j]
+        if i < 0: return None
+        return {k: float(v[i, j]) for k, v in self.values.items()}
+
+    def latest(self, tickers, keys=None):
+        """多檔 (可重複) 最新一根 K 棒的指標：{指標: 與 tickers 對齊的陣列}，沒有資料為 NaN"""
+        j = np.array([self.panel.col[t] for t in tickers], dtype=np.intp)
+        i = self.last[j]
+        ok = i >= 0
+        out = {}
+        for k in keys or self.values:
+            a = np.full(len(j), np.nan)
+            a[ok] = self.values[k][i[ok], j[ok]]
+            out[k] = a
+        return out
+
+
+def compute_indicators(panel, roc_periods=ROC_PERIODS):
+    """全市場指標；滾動窗口與 ROC 都只看各檔自己的 K 棒，結果與 compute_frame 逐檔計算相同"""
+    values = panel.per_ticker(lambda o, h, l, c, v: _indicators(o, h, l, c, v, roc_periods), panel.open, panel.high, panel.low, panel.close, panel.volume)
+    values.update(close=panel.close, open=panel.open, volume=panel.volume)     # 原始價量直接共用面板
+    return Indicators(panel, values)
+
+
+def _indicators(o, h, l, c, v, roc_periods):
+    values = {'close': c, 'prev_close': shift(c, 1), 'open': o, 'volume': v}
+    prefix = prefix_sum(c)  # 各條均線共用
+    for w in MA_WINDOWS:
+        values[f'ma{w}'] = rolling_mean(c, w, prefix)
+    vol_prefix = prefix_sum(v)
+    values['vol20'] = rolling_mean(v, 20, vol_prefix)
+    for p in roc_periods:
+        values[f'roc{p}'] = roc(c, p)
+
+    values['high250'] = rolling_max(h, YEAR_WINDOW)
+    values['low250'] = rolling_min(l, YEAR_WINDOW)
+    values['high60'] = rolling_max(h, 60)
+    values['close_min60'] = rolling_min(c, 60)
+    values['high20_prev'] = shift(rolling_max(h, 20), 1)           # 昨日以前的 20 日高
+    values['close_max20_prev'] = shift(rolling_max(c, 20), 1)
+
+    # 超級強勢股：最近 35 天收盤都站上 10MA
+    above = np.where(np.isnan(c), np.nan, (c > values['ma10']).astype(float))
+    values['super35'] = rolling_min(above, SUPER_WINDOW)
+
+    # MVP：前 15 天 (不含今天) 的上漲天數與量能放大倍數
+    up = np.where(np.isnan(c), np.nan, (c > shift(c, 1)).astype(float))
+    values['up_days15'] = shift(rolling_sum(up, MVP_WINDOW - 1), 1)
+    vol15 = rolling_mean(v, MVP_WINDOW, vol_prefix)
+    values['vol_ratio15'] = shift(vol15, 1) / shift(vol15, MVP_WINDOW + 1)
+    return values
+
+
+def compute_frame(df, roc_periods=ROC_PERIODS):
+    """單檔版本：回傳該檔最新一根 K 棒的指標"""
+    return compute_indicators(build_panel({'_': df}), roc_periods).snapshot('_')
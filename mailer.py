@@ -0,0 +1,196 @@
+import os
+import json
+import time
+import email
+import smtplib
+from metrics import METRICS
+
+# ==========================================
+# ⚙️ 寄信設定 (環境變數；本機測試可指向 aiosmtpd 等替身伺服器)
+# ==========================================
+SMTP_HOST = os.environ.get('SMTP_HOST', 'smtp.gmail.com')
+SMTP_PORT = int(os.environ.get('SMTP_PORT', 465))
+# ssl (465) / starttls (587) / none (本機替身)
+SMTP_SECURITY = os.environ.get('SMTP_SECURITY') or {465: 'ssl', 587: 'starttls'}.get(SMTP_PORT, 'none')
+TIMEOUT = 30
+SUBSCRIBERS_FILE = os.environ.get('SUBSCRIBERS_FILE', os.path.join('data', 'subscribers.json'))
+OUTBOX_DIR = os.environ.get('MAIL_OUTBOX', os.path.join('data', 'outbox'))
+RETRIES = 2             # 同一次執行內，暫時性失敗的重寄輪數
+BACKOFF = 5             # 第一次重寄前等待秒數，之後每輪加倍
+MAX_ATTEMPTS = 5        # 跨執行累計失敗次數上限，超過即放棄
+MAX_AGE_HOURS = 24      # 排隊超過此時數的報告已過時，不再重寄
+ATTEMPT_HEADER = 'X-Delivery-Attempts'
+
+# ==========================================
+# 訂閱者
+# ==========================================
+def load_subscribers(path=SUBSCRIBERS_FILE, portfolio=None, receivers=None):
+    """
+    訂閱者清單 [{'email', 'name', 'portfolio'}]
+    path 的 JSON 格式同上 (portfolio 為 {代號: {'cost', 'stop_loss_pct'}}，省略則只收市場掃描)
+    檔案不存在時以 RECEIVER_EMAIL (可用逗號分隔多人) 為收件人，庫存皆為 portfolio
+    """
+    if path and os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            subs = json.load(f)
+        return [{'email': s['email'], 'name': s.get('name', s['email']), 'portfolio': s.get('portfolio') or {}} for s in subs]
+    receivers = receivers if receivers is not None else os.environ.get('RECEIVER_EMAIL', '')
+    return [{'email': r.strip(), 'name': r.strip(), 'portfolio': dict(portfolio or {})} for r in receivers.split(',') if r.strip()]
+
+
+def merge_portfolios(subscribers, base=None):
+    """所有訂閱者庫存的聯集 (同一代號只掃描一次；成本以先出現者為準，個人健檢時再套用各自成本)"""
+    out = dict(base or {})
+    for s in subscribers:
+        for t, data in s['portfolio'].items(): out.setdefault(t, data)
+    return out
+
+# ==========================================
+# 重寄佇列 (每封一個 .eml，檔名為排入時的 time_ns；寫入先寫暫存檔再換名)
+# ==========================================
+class Outbox:
+    """暫時性失敗的郵件存在磁碟上，下次寄信時先寄"""
+
+    def __init__(self, root=OUTBOX_DIR, max_age_hours=MAX_AGE_HOURS):
+        self.root = root
+        self.max_age = max_age_hours * 3600
+        os.makedirs(self.root, exist_ok=True)
+
+    def put(self, msg, path=None):
+        """path 為 None 時新排入；重新排入沿用原檔名，排隊時間不因改寫而重算"""
+        path = path or os.path.join(self.root, f"{time.time_ns()}.eml")
+        tmp = f"{path}.tmp"
+        with open(tmp, 'wb') as f: f.write(msg.as_bytes())
+        os.replace(tmp, path)
+        return path
+
+    @staticmethod
+    def queued_at(path):
+        """排入時間 (epoch 秒)：取自檔名；非本佇列命名的檔案退回修改時間"""
+        stem = os.path.basename(path)[:-len('.eml')]
+        return int(stem) / 1e9 if stem.isdigit() else os.path.getmtime(path)
+
+    def remove(self, path):
+        if path and os.path.exists(path): os.remove(path)
+
+    def items(self):
+        """依排入順序回傳 [(路徑, 郵件)]；過期的直接丟棄"""
+        out = []
+        for f in sorted(os.listdir(self.root)):
+            if not f.endswith('.eml'): continue
+            path = os.path.join(self.root, f)
+            if time.time() - self.queued_at(path) > self.max_age:
+                print(f"🗑️ 捨棄過期郵件 {f}")
+                os.remove(path)
+                continue
+            with open(path, 'rb') as fh: out.append((path, email.message_from_binary_file(fh)))
+        return out
+
+    def __len__(self):
+        return sum(f.endswith('.eml') for f in os.listdir(self.root))
+
+
+def is_transient(e):
+    """4xx、斷線、逾時、連不上視為暫時性 (稍後重寄)；5xx 為永久失敗"""
+    if isinstance(e, smtplib.SMTPRecipientsRefused):
+        return all(400 <= code < 500 for code, _ in e.recipients.values())
+    if isinstance(e, smtplib.SMTPResponseException):
+        return 400 <= e.smtp_code < 500
+    return isinstance(e, OSError)   # SMTPServerDisconnected / timeout / ConnectionRefusedError
+
+# ==========================================
+# 共用連線寄件
+# ==========================================
+class Mailer:
+    """
+    一個 SMTP 連線寄出整批郵件 (伺服器閒置斷線時自動重連)
+    暫時性失敗在同次執行內退避重寄，仍失敗就放進 outbox，下次 deliver 時優先寄出
+    """
+
+    def __init__(self, host=SMTP_HOST, port=SMTP_PORT, user=None, password=None, security=SMTP_SECURITY, outbox=None, timeout=TIMEOUT):
+        self.host, self.port, self.security, self.timeout = host, port, security, timeout
+        self.user = user if user is not None else os.environ.get('GMAIL_USER')
+        self.password = password if password is not None else os.environ.get('GMAIL_APP_PASSWORD')
+        self.outbox = outbox if outbox is not None else Outbox()
+        self.server = None
+        self.sent, self.queued, self.failed = 0, 0, {}   # failed: {收件人: 錯誤}
+
+    def connect(self):
+        cls = smtplib.SMTP_SSL if self.security == 'ssl' else smtplib.SMTP
+        server = cls(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.security == 'starttls': server.starttls()
+            if self.user and self.password: server.login(self.user, self.password)
+        except Exception:
+            server.close()
+            raise
+        self.server = server
+
+    def close(self):
+        if self.server is None: return
+        try: self.server.quit()
+        except (smtplib.SMTPException, OSError): self.server.close()
+        self.server = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def send(self, msg):
+        if self.server is None: self.connect()
+        try:
+            self.server.send_message(msg)
+        except smtplib.SMTPServerDisconnected:
+            self.server = None
+            self.connect()
+            self.server.send_message(msg)
+
+    def deliver(self, messages, retries=RETRIES, backoff=BACKOFF):
+        """先寄 outbox 內的舊郵件再寄 messages；回傳 (寄出, 排入佇列, 失敗) 封數"""
+        pending = self.outbox.items() + [(None, m) for m in messages]
+        if pending: print(f"📮 寄出 {len(pending)} 封 ({self.host}:{self.port})")
+        for attempt in range(retries + 1):
+            if attempt:
+                wait = backoff * 2 ** (attempt - 1)
+                print(f"⏳ {len(pending)} 封暫時失敗，{wait} 秒後重寄")
+                time.sleep(wait)
+            retry = []
+            for k, (path, msg) in enumerate(pending):
+                try:
+                    self.send(msg)
+                except Exception as e:
+                    # 連不上 / 登入失敗：這一輪剩下的都同樣處理，不再逐封連線
+                    down = self.server is None
+                    rest = pending[k:] if down else [(path, msg)]
+                    if is_transient(e): retry.extend((p, m, e) for p, m in rest)
+                    else:
+                        for p, m in rest: self._fail(p, m, e)
+                    if down: break
+                    continue
+                self.sent += 1
+                self.outbox.remove(path)
+            pending = [(p, m) for p, m, _ in retry]
+            if not pending: break
+        for path, msg, e in retry: self._queue(path, msg, e)
+        METRICS.count('mail_sent', self.sent)
+        METRICS.count('mail_queued', self.queued)
+        METRICS.count('mail_failed', len(self.failed))
+        return self.sent, self.queued, len(self.failed)
+
+    def _fail(self, path, msg, e):
+        self.failed[msg['To']] = str(e)
+        self.outbox.remove(path)
+        print(f"❌ 寄送失敗 {msg['To']}: {e}")
+
+    def _queue(self, path, msg, e):
+        attempts = int(msg.get(ATTEMPT_HEADER, 0)) + 1
+        if attempts >= MAX_ATTEMPTS:
+            self._fail(path, msg, e)
+            return
+        del msg[ATTEMPT_HEADER]
+        msg[ATTEMPT_HEADER] = str(attempts)
+        self.outbox.put(msg, path)
+        self.queued += 1
+        print(f"📥 {msg['To']} 暫時失敗 ({e})，已排入重寄佇列")
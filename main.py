@@ -1,57 +1,68 @@
 import os
-import smtplib
 import pandas as pd
 import numpy as np
-import yfinance as yf
-import twstock
-from tqdm import tqdm
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+from collections import Counter
+from fetch import CHUNK_SIZE
+from store import PriceStore
+from indicators import compute_frame
+from prices import column
+from backtest import backtest_frame, run_backtests
+from market import get_benchmark
+from scanner import register, run_scan
+from universe import Prefilter
+from metrics import METRICS, reject, profile
+from funnel import chose_gates, drive_gates
+from report import ReportWriter
+from mailer import Mailer, load_subscribers, merge_portfolios
+from health import MY_PORTFOLIO
+import sectors
 
 # ==========================================
 # ⚙️ 使用者設定區
 # ==========================================
-MY_PORTFOLIO = {
-    '4939.TW': {'cost': 51.2, 'stop_loss_pct': 0.07},  # 亞電
-    '3346.TW': {'cost': 50.8, 'stop_loss_pct': 0.07},  # 麗清
-    '2492.TW': {'cost': 133.5, 'stop_loss_pct': 0.07}, # 華新科
-    '2317.TW': {'cost': 227.2, 'stop_loss_pct': 0.07}  # 鴻海
-}
+# 庫存統一在 health.MY_PORTFOLIO 設定 (多帳戶放在 health.PORTFOLIO_DIR)
 
 # 環境變數 (GitHub Secrets)
 GMAIL_USER = os.environ.get('GMAIL_USER')
 GMAIL_APP_PASSWORD = os.environ.get('GMAIL_APP_PASSWORD')
 RECEIVER_EMAIL = os.environ.get('RECEIVER_EMAIL')
 
+# 分析階段的行程數 (1 = 單行程)
+SCAN_WORKERS = int(os.environ.get('SCAN_WORKERS', os.cpu_count() or 1))
+
 class StockSystem:
-    def __init__(self):
-        self.bench_ticker = '0050.TW'
+    def __init__(self, provider=None, chunk_size=CHUNK_SIZE, store=None, workers=1, prefilter=True, incremental=True, funnel=True, rank=True):
+        self.store = store or PriceStore(provider=provider, chunk_size=chunk_size)
+        self.workers = workers
+        self.prefilter = prefilter   # 先以全市場索引剔除低價 / 低量 / 非 Stage 2 標的
+        self.incremental = incremental   # 指標由持久化的滾動狀態逐日更新
+        self.funnel = funnel    # 關卡整批判斷並存成每日漏斗，只把通過 RS 的標的交給逐檔分析
+        self.rank = rank        # 全市場 RS 排名 (1 ~ 99)，結果附上「RS排名」欄
+        self.bench = get_benchmark(self.store)
         self.min_price = 20
         self.min_volume_chose = 800000
         self.min_volume_drive = 1000000
         self.rs_period_chose = 20
         self.rs_period_drive = 60
+        # RS 排名門檻 (None = 只看 ROC 差值)；設定後 RS 關卡另需排名 >= 門檻
+        self.min_rank_chose = None
+        self.min_rank_drive = None
 
     def get_benchmark_roc(self, period):
-        try:
-            bench = yf.download(self.bench_ticker, period='1y', progress=False, auto_adjust=True)
-            close = bench['Close'].iloc[:, 0] if isinstance(bench['Close'], pd.DataFrame) else bench['Close']
-            return float(close.pct_change(period).iloc[-1])
-        except: return 0
+        return self.bench.roc(period)
 
-    def health_check_logic(self, ticker, name, data, df):
+    def health_check_logic(self, ticker, name, data, df, snap=None):
         """完全移植考特賣出法則"""
         try:
-            close = df['Close'].iloc[:, 0] if isinstance(df['Close'], pd.DataFrame) else df['Close']
-            curr = float(close.iloc[-1])
+            snap = snap or compute_frame(df)
+            curr = snap['close']
             cost = data['cost']
             init_risk_pct = data['stop_loss_pct']
             init_risk_amt = cost * init_risk_pct
             pnl_amt = curr - cost
             r_multiple = pnl_amt / init_risk_amt
             
-            ma10 = float(close.rolling(10).mean().iloc[-1])
-            ma20 = float(close.rolling(20).mean().iloc[-1])
+            ma10, ma20 = snap['ma10'], snap['ma20']
             
             action, reason = "✅ 續抱", []
             hard_stop = cost * (1 - init_risk_pct)
@@ -63,7 +74,7 @@ class StockSystem:
                 if curr < cost: action = "🛑 清倉賣出(保本)"; reason.append("獲利回吐觸及成本")
                 else: reason.append(f"達2R({round(r_multiple,1)}R)啟動保本")
             
-            is_super = (close.iloc[-35:] > close.rolling(10).mean().iloc[-35:]).all()
+            is_super = bool(snap['super35'])
             check_ma = ma10 if is_super else ma20
             if curr < check_ma:
                 action = "⚠️ 警戒/賣出"
@@ -72,187 +83,162 @@ class StockSystem:
             return {"代號": ticker, "名稱": name, "現價": round(curr, 2), "獲利(R)": f"{round(r_multiple, 1)}R", "建議動作": action, "防守價": round(max(hard_stop, check_ma), 2), "原因": " | ".join(reason)}
         except: return None
 
-    def analyze_chose(self, ticker, name, df, bench_roc):
+    def analyze_chose(self, ticker, name, df, bench_roc, snap=None):
         """全量移植買入型態判斷"""
         try:
-            close = df['Close'].iloc[:, 0] if isinstance(df['Close'], pd.DataFrame) else df['Close']
-            high = df['High'].iloc[:, 0] if isinstance(df['High'], pd.DataFrame) else df['High']
-            vol = df['Volume'].iloc[:, 0] if isinstance(df['Volume'], pd.DataFrame) else df['Volume']
-            open_p = df['Open'].iloc[:, 0] if isinstance(df['Open'], pd.DataFrame) else df['Open']
-            
-            curr, avg_vol = float(close.iloc[-1]), float(vol.rolling(20).mean().iloc[-1])
-            if curr < self.min_price or avg_vol < self.min_volume_chose: return None
+            snap = snap or compute_frame(df)
+            curr, avg_vol = snap['close'], snap['vol20']
+            if curr < self.min_price: return reject('main.chose', 'price')
+            if avg_vol < self.min_volume_chose: return reject('main.chose', 'volume')
             
-            ma50, ma200 = float(close.rolling(50).mean().iloc[-1]), float(close.rolling(200).mean().iloc[-1])
-            if not (curr > ma50 > ma200): return None
+            ma50, ma200 = snap['ma50'], snap['ma200']
+            if not (curr > ma50 > ma200): return reject('main.chose', 'stage2')
             
-            stock_roc = float(close.pct_change(self.rs_period_chose).iloc[-1])
+            stock_roc = snap[f'roc{self.rs_period_chose}']
             rs_rating = (stock_roc - bench_roc) * 100
-            if rs_rating < 0: return None
+            if rs_rating < 0: return reject('main.chose', 'rs')
+            rs_rank = snap.get('rs_rank', np.nan)
+            if self.min_rank_chose and not rs_rank >= self.min_rank_chose: return reject('main.chose', 'rs')
             
-            year_high = float(high.iloc[-250:].max())
-            prev_20_high = float(high.iloc[-21:-1].max())
-            is_breakout = (curr > prev_20_high) and (close.iloc[-2] < prev_20_high)
+            year_high = snap['high250']
+            prev_20_high = snap['high20_prev']
+            prev_close = snap['prev_close']
+            is_breakout = (curr > prev_20_high) and (prev_close < prev_20_high)
             
             setup, reason = "", ""
             # 高窄旗型
-            rally = (high.iloc[-60:].max() - close.iloc[-60:].min())/close.iloc[-60:].min()
+            rally = (snap['high60'] - snap['close_min60'])/snap['close_min60']
             if rally > 0.8 and (year_high-curr)/year_high < 0.25 and is_breakout:
                 setup, reason = "🚀 高窄旗型", "飆漲動能突破"
             # 買進跳空
-            elif (open_p.iloc[-1] - close.iloc[-2])/close.iloc[-2] > 0.08:
+            elif (snap['open'] - prev_close)/prev_close > 0.08:
                 setup, reason = "🕳️ 買進跳空", "強力消息缺口"
             # VCP 突破
             elif is_breakout and (year_high - curr)/year_high < 0.15:
                 setup, reason = "📦 VCP突破", "整理區帶量突破"
 
             if setup:
-                return {"代號": ticker, "名稱": name, "現價": round(curr, 2), "型態": setup, "RS": round(rs_rating, 1), "建議買價": round(prev_20_high, 2), "買入原因": reason}
-            return None
-        except: return None
+                return {"代號": ticker, "名稱": name, "現價": round(curr, 2), "型態": setup, "RS": round(rs_rating, 1), "RS排名": _rank(rs_rank), "建議買價": round(prev_20_high, 2), "買入原因": reason}
+            return reject('main.chose', 'pattern')
+        except Exception: return reject('main.chose', 'error')
 
-    def analyze_drive(self, item, df, bench_roc):
+    def analyze_drive(self, item, df, bench_roc, snap=None):
         """全量移植 DRIVE 深度評分"""
         try:
-            close = df['Close'].iloc[:, 0] if isinstance(df['Close'], pd.DataFrame) else df['Close']
-            high = df['High'].iloc[:, 0] if isinstance(df['High'], pd.DataFrame) else df['High']
-            low = df['Low'].iloc[:, 0] if isinstance(df['Low'], pd.DataFrame) else df['Low']
-            vol = df['Volume'].iloc[:, 0] if isinstance(df['Volume'], pd.DataFrame) else df['Volume']
-            
-            curr, avg_vol = float(close.iloc[-1]), float(vol.rolling(20).mean().iloc[-1])
-            if curr < self.min_price or avg_vol < self.min_volume_drive: return None
+            snap = snap or compute_frame(df)
+            curr, avg_vol = snap['close'], snap['vol20']
+            if curr < self.min_price: return reject('main.drive', 'price')
+            if avg_vol < self.min_volume_drive: return reject('main.drive', 'volume')
             
-            ma50, ma200 = float(close.rolling(50).mean().iloc[-1]), float(close.rolling(200).mean().iloc[-1])
-            year_high, year_low = float(high.iloc[-250:].max()), float(low.iloc[-250:].min())
-            if not (curr > ma50 > ma200 and (year_high - curr)/year_high < 0.25): return None
+            ma50, ma200 = snap['ma50'], snap['ma200']
+            year_high = snap['high250']
+            if not (curr > ma50 > ma200 and (year_high - curr)/year_high < 0.25): return reject('main.drive', 'stage2')
 
-            stock_roc = float(close.pct_change(self.rs_period_drive).iloc[-1])
+            stock_roc = snap[f'roc{self.rs_period_drive}']
             rs_rating = (stock_roc - bench_roc) * 100
-            if rs_rating < 5: return None
+            if rs_rating < 5: return reject('main.drive', 'rs')
+            rs_rank = snap.get('rs_rank', np.nan)
+            if self.min_rank_drive and not rs_rank >= self.min_rank_drive: return reject('main.drive', 'rs')
 
             # MVP 邏輯：15天內收紅>=9天 + 成交量比前段放大
-            up_days = (close.iloc[-16:-1].diff() > 0).sum()
-            vol_ratio = vol.iloc[-16:-1].mean() / vol.iloc[-31:-16].mean()
-            is_mvp = up_days >= 9 and vol_ratio >= 1.2
+            is_mvp = snap['up_days15'] >= 9 and snap['vol_ratio15'] >= 1.2
             
             score, comments = 0, []
-            prev_20_high = float(close.iloc[-21:-1].max())
-            if curr > prev_20_high and vol.iloc[-1] > avg_vol * 1.3:
+            prev_20_high = snap['close_max20_prev']
+            if curr > prev_20_high and snap['volume'] > avg_vol * 1.3:
                 score += 50; comments.append("樞紐突破")
             if is_mvp: score += 30; comments.append("🔥MVP吸籌")
             if rs_rating > 30: score += 20; comments.append("超強RS")
 
             if score >= 30:
-                return {"代號": item['ticker'], "名稱": item['name'], "產業": item['industry'], "評分": score, "RS": round(rs_rating, 1), "吸籌特徵": " + ".join(comments)}
-            return None
-        except: return None
+                return {"代號": item['ticker'], "名稱": item['name'], "產業": item['industry'], "評分": score, "RS": round(rs_rating, 1), "RS排名": _rank(rs_rank), "吸籌特徵": " + ".join(comments)}
+            return reject('main.drive', 'pattern')
+        except Exception: return reject('main.drive', 'error')
+
+    def run(self, portfolio=None):
+        # 單次掃描：每檔只下載一次、指標只算一次，三個策略外掛共用
+        # portfolio 可為多位訂閱者庫存的聯集，各持股的最新指標留在 self.positions 供 portfolio_health 使用
+        res = run_scan(['main.health', 'main.position', 'main.chose', 'main.drive'], store=self.store, portfolio=portfolio or MY_PORTFOLIO,
+                       roc_periods=(self.rs_period_chose, self.rs_period_drive), workers=self.workers, prefilter=self.prefilter, incremental=self.incremental, funnel=self.funnel, rank=self.rank, system=self)
+        self.positions = {r['代號']: r for r in res['main.position']}
+        return res['main.health'], res['main.chose'], res['main.drive']
+
+    def portfolio_health(self, portfolio):
+        """依某位訂閱者自己的成本套用考特賣出法則；指標取自最近一次 run() 的掃描結果，不重新下載"""
+        rows = []
+        for t, data in portfolio.items():
+            pos = self.positions.get(t)
+            row = pos and self.health_check_logic(t, pos['名稱'], data, None, pos['snap'])
+            if row: rows.append(row)
+        return rows
+
+
+def _rank(r):
+    """RS 排名顯示用 (沒有排名為空字串)"""
+    return int(r) if r == r else ''
+
+
+# ==========================================
+# 🧩 統一掃描外掛 (共用同一次下載與指標)
+# ==========================================
+def _system(ctx):
+    if 'system' not in ctx.cache:
+        ctx.cache['system'] = ctx.options.get('system') or StockSystem(store=ctx.store)
+    return ctx.cache['system']
+
+@register('main.health', min_bars=200, portfolio_only=True)
+def scan_health(item, df, ctx):
+    if item['ticker'] not in ctx.portfolio: return None
+    return _system(ctx).health_check_logic(item['ticker'], item['name'], ctx.portfolio[item['ticker']], df, ctx.snapshot(item['ticker']))
+
+@register('main.position', min_bars=200, portfolio_only=True)
+def scan_position(item, df, ctx):
+    # 庫存標的的最新指標 (寄信時依各訂閱者的成本各自健檢)
+    if item['ticker'] not in ctx.portfolio: return None
+    return {"代號": item['ticker'], "名稱": item['name'], "snap": ctx.snapshot(item['ticker'])}
+
+def _chose_gates(ind, ctx):
+    system = _system(ctx)
+    return chose_gates(ind, ctx.bench_roc(system.rs_period_chose), system)
+
+def _drive_gates(ind, ctx):
+    system = _system(ctx)
+    return drive_gates(ind, ctx.bench_roc(system.rs_period_drive), system)
 
-    def run(self):
-        codes = twstock.codes
-        all_stocks = [{'ticker': c+('.TW' if r.market=='上市' else '.TWO'), 'name': r.name, 'industry': r.group} for c,r in codes.items() if r.type=='股票']
-        bench_c, bench_d = self.get_benchmark_roc(20), self.get_benchmark_roc(60)
-        res_h, res_c, res_d = [], [], []
-        print(f"🚀 全力掃描 {len(all_stocks)} 檔標的...")
-        for item in tqdm(all_stocks):
-            try:
-                df = yf.download(item['ticker'], period='1y', progress=False, auto_adjust=True)
-                if df.empty or len(df) < 200: continue
-                if item['ticker'] in MY_PORTFOLIO:
-                    h = self.health_check_logic(item['ticker'], item['name'], MY_PORTFOLIO[item['ticker']], df)
-                    if h: res_h.append(h)
-                c = self.analyze_chose(item['ticker'], item['name'], df, bench_c)
-                if c: res_c.append(c)
-                d = self.analyze_drive(item, df, bench_d)
-                if d: res_d.append(d)
-            except: continue
-        return res_h, res_c, res_d
+@register('main.chose', min_bars=200, prefilter=Prefilter(min_price=20, min_volume=800000, stage2=True), gates=_chose_gates)   # 與 StockSystem 門檻一致
+def scan_chose(item, df, ctx):
+    system = _system(ctx)
+    return system.analyze_chose(item['ticker'], item['name'], df, ctx.bench_roc(system.rs_period_chose), ctx.snapshot(item['ticker']))
+
+@register('main.drive', min_bars=200, prefilter=Prefilter(min_price=20, min_volume=1000000, stage2=True), gates=_drive_gates)
+def scan_drive(item, df, ctx):
+    system = _system(ctx)
+    return system.analyze_drive(item, df, ctx.bench_roc(system.rs_period_drive), ctx.snapshot(item['ticker']))
 
 
 # ==========================================
 # 📊 策略回測引擎 (100% 同步進出場邏輯)
 # ==========================================
-def backtest_3y_strategy(ticker, bench_roc_series):
+def backtest_3y_strategy(ticker, bench_roc_series, store=None):
     try:
         # 抓取 4 年數據確保計算 MA200 無誤
-        df = yf.download(ticker, period='4y', progress=False, auto_adjust=True)
-        if df.empty or len(df) < 300: return 0, 0
-        
-        c_series = df['Close'].iloc[:, 0] if isinstance(df['Close'], pd.DataFrame) else df['Close']
-        h_series = df['High'].iloc[:, 0] if isinstance(df['High'], pd.DataFrame) else df['High']
-        l_series = df['Low'].iloc[:, 0] if isinstance(df['Low'], pd.DataFrame) else df['Low']
-        o_series = df['Open'].iloc[:, 0] if isinstance(df['Open'], pd.DataFrame) else df['Open']
-        v_series = df['Volume'].iloc[:, 0] if isinstance(df['Volume'], pd.DataFrame) else df['Volume']
-
-        ma10 = c_series.rolling(10).mean()
-        ma20 = c_series.rolling(20).mean()
-        ma50 = c_series.rolling(50).mean()
-        ma200 = c_series.rolling(200).mean()
-        avg_vol_20 = v_series.rolling(20).mean()
-        
-        trades = []
-        in_pos = False
-        entry_p = 0
-        init_stop_pct = 0.07 
-
-        # 模擬過去 3 年的每日交易
-        start_idx = len(df) - 750
-        for i in range(start_idx, len(df)):
-            curr_c = float(c_series.iloc[i])
-            dt = df.index[i]
-            
-            if not in_pos:
-                # --- 進場：analyze_chose 邏輯 ---
-                if curr_c < 20 or avg_vol_20.iloc[i] < 800000: continue
-                if not (curr_c > ma50.iloc[i] > ma200.iloc[i]): continue
-                
-                s_roc = float(c_series.iloc[i] / c_series.iloc[i-20] - 1)
-                if (s_roc - bench_roc_series.get(dt, 0)) < 0: continue
-                
-                y_high = float(h_series.iloc[i-250:i].max())
-                p20_high = float(h_series.iloc[i-21:i].max())
-                is_break = (curr_c > p20_high) and (c_series.iloc[i-1] < p20_high)
-                
-                rally = (h_series.iloc[i-60:i].max() - c_series.iloc[i-60:i].min()) / c_series.iloc[i-60:i].min()
-                is_flag = rally > 0.8 and (y_high - curr_c)/y_high < 0.25 and is_break
-                is_gap = (o_series.iloc[i] - c_series.iloc[i-1])/c_series.iloc[i-1] > 0.08
-                is_vcp = is_break and (y_high - curr_c)/y_high < 0.15
-                
-                if is_flag or is_gap or is_vcp:
-                    entry_p = curr_c
-                    in_pos = True
-            
-            elif in_pos:
-                # --- 出場：health_check_logic 邏輯 ---
-                r_mult = (curr_c - entry_p) / (entry_p * init_stop_pct)
-                is_super = (c_series.iloc[i-34:i+1] > ma10.iloc[i-34:i+1]).all()
-                check_ma = ma10.iloc[i] if is_super else ma20.iloc[i]
-                
-                exit_now = False
-                if curr_c < entry_p * (1 - init_stop_pct): exit_now = True
-                elif r_mult >= 2 and curr_c < entry_p: exit_now = True
-                elif curr_c < check_ma: exit_now = True
-                
-                if exit_now:
-                    trades.append((curr_c - entry_p) / entry_p)
-                    in_pos = False
-        
-        if not trades: return 0, 0
-        wr = len([t for t in trades if t > 0]) / len(trades) * 100
-        tr = (np.prod([1 + t for t in trades]) - 1) * 100
-        return round(wr, 1), round(tr, 1)
+        df = (store or PriceStore()).frame(ticker, '4y')
+        # 進出場訊號整段向量化，再以狀態機在事件之間跳躍 (逐根版本見 backtest.backtest_reference)
+        return backtest_frame(df, bench_roc_series)
     except: return 0, 0
         
 # ==========================================
 # 📧 郵件發送與 AI 深度診斷文字引擎
 # ==========================================
-def generate_ai_diagnostic(row_c, row_d, df, bench_series):
+def generate_ai_diagnostic(row_c, row_d, df, bench_series, store=None, backtest=None):
     """
     根據量化數據產出 AI 深度點評文字
     包含：原始診斷、精確停損、3年同步回測、績優生標記
+    backtest 若已預先算好 (勝率, 總報酬) 則直接使用
     """
     try:
         # 確保數據不為空且列名正確
-        close = df['Close'].iloc[:, 0] if isinstance(df['Close'], pd.DataFrame) else df['Close']
+        close = pd.Series(column(df, 'Close'))
         
         # 1. 計算各類停損價格 (修正變數名稱)
         buy_price = row_c['建議買價']
@@ -261,7 +247,7 @@ def generate_ai_diagnostic(row_c, row_d, df, bench_series):
         ma20 = round(float(close.rolling(20).mean().iloc[-1]), 2)
         
         # 2. 執行 3 年同步回測
-        win_rate, cumulative_ret = backtest_3y_strategy(row_c['代號'], bench_series)
+        win_rate, cumulative_ret = backtest or backtest_3y_strategy(row_c['代號'], bench_series, store)
         
         # 3. 標記與防護邏輯
         star_tag = "<b style='color:#f1c40f;'>🌟 歷史績優生</b>" if win_rate >= 60 and cumulative_ret > 50 else ""
@@ -291,73 +277,85 @@ def generate_ai_diagnostic(row_c, row_d, df, bench_series):
         print(f"Error analyzing {row_c['名稱']}: {e}")
         return f"【{row_c['名稱']}】數據解析異常，跳過診斷。<br>"
 
-def send_email(h, c, d):
-    df_h, df_c, df_d = pd.DataFrame(h), pd.DataFrame(c), pd.DataFrame(d)
+def send_email(h, c, d, store=None, workers=None, subscribers=None, system=None):
+    """
+    市場掃描區段 (AI 診斷 / CHOSE / DRIVE) 只渲染一次，每位訂閱者只另外渲染自己的庫存健檢
+    system 有值時依各訂閱者的成本重新健檢 (沿用 system.run 的掃描結果)，否則所有人共用 h
+    全部郵件經同一個 SMTP 連線寄出
+    """
+    store = store or PriceStore()
+    today = pd.Timestamp.now().strftime('%Y-%m-%d')
+    subscribers = subscribers if subscribers is not None else load_subscribers(portfolio=MY_PORTFOLIO, receivers=RECEIVER_EMAIL)
+
+    # 產業分析：全市場產業 RS 最強的三個 (快取由 sectors.update_sectors 逐日更新)，沒有快取時退回 DRIVE 入選最多的三個產業
+    sector_latest = sectors.SectorHistory(store).latest()
+    top_ind = sectors.leaders(sector_latest) if not sector_latest.empty else [k for k, _ in Counter(r['產業'] for r in d).most_common(3)]
 
     # --- 準備大盤數據字典用於回測 ---
     print("正在準備回測大盤數據...")
-    bench_df = yf.download('0050.TW', period='4y', progress=False, auto_adjust=True)
-    bench_close = bench_df['Close'].iloc[:, 0] if isinstance(bench_df['Close'], pd.DataFrame) else bench_df['Close']
-    bench_series = bench_close.pct_change(20).to_dict()
-
-    # 產業分析與雙重認證個股
-    top_ind = df_d['產業'].value_counts().head(3).index.tolist() if not df_d.empty else []
-    ai_section = ""
-    if not df_c.empty and not df_d.empty:
-        inter_ids = list(set(df_c['代號']) & set(df_d['代號']))
-        for tid in inter_ids:
-            row_c = df_c[df_c['代號'] == tid].iloc[0]
-            row_d = df_d[df_d['代號'] == tid].iloc[0]
-
-            # 抓取較長的時間段以滿足回測需求 (3年回測需要4年數據以供MA計算)
-            df_temp = yf.download(tid, period='4y', progress=False, auto_adjust=True)
-            # 傳入正確的參數
-            ai_section += generate_ai_diagnostic(row_c, row_d, df_temp, bench_series)
-
-    style = """
-    <style>
-        body { font-family: sans-serif; line-height: 1.6; color: #333; }
-        .title { background: #2c3e50; color: white; padding: 12px; margin-top: 25px; font-weight: bold; border-radius: 5px; }
-        .ai-box { background: #fffcf0; border: 1px solid #f1c40f; border-left: 6px solid #f1c40f; padding: 15px; margin: 15px 0; font-size: 14px; color: #7f8c8d; }
-        .table { border-collapse: collapse; width: 100%; font-size: 13px; margin-bottom: 20px; }
-        .table th, .table td { border: 1px solid #ddd; padding: 10px; text-align: left; }
-        .table th { background-color: #f8f9fa; }
-    </style>
-    """
-    
-    html = f"<html><head>{style}</head><body>"
-    html += f"<h2>📈 台股動能投資策略報告 ({pd.Timestamp.now().strftime('%Y-%m-%d')})</h2>"
-    html += f"<p>💰 本日主流板塊：{', '.join(top_ind)}</p>"
-    
-    html += "<div class='title'>1. 🏥 庫存健檢 (考特賣出法則)</div>"
-    html += df_h.to_html(classes='table', index=False) if not df_h.empty else "<p>無庫存資料</p>"
-
-    html += "<div class='title' style='background:#8e44ad;'>4. 💎 雙重認證個股深度分析 (AI 診斷)</div>"
-    if ai_section:
-        html += f"<div class='ai-box'>{ai_section}</div>"
-    else:
-        html += "<div class='ai-box'>今日無雙重認證標的，大盤可能處於盤整期，請謹慎持倉。</div>"
-
-    html += "<div class='title'>2. 🚀 買入型態掃描 (CHOSE)</div>"
-    html += df_c.to_html(classes='table', index=False) if not df_c.empty else "<p>今日無符合標的</p>"
-
-    html += "<div class='title'>3. 👑 大戶動能評分 (DRIVE)</div>"
-    html += df_d.to_html(classes='table', index=False) if not df_d.empty else "<p>今日無高動能標的</p>"
-    
-    html += "</body></html>"
-
-    msg = MIMEMultipart(); msg['Subject'] = f"台股策略報告 - {pd.Timestamp.now().strftime('%Y-%m-%d')}"
-    msg['From'], msg['To'] = GMAIL_USER, RECEIVER_EMAIL
-    msg.attach(MIMEText(html, 'html'))
-    with smtplib.SMTP_SSL('smtp.gmail.com', 465) as s:
-        s.login(GMAIL_USER, GMAIL_APP_PASSWORD)
-        s.send_message(msg)
+    bench_series = get_benchmark(store).roc_series(20)
 
-if __name__ == "__main__":
-    system = StockSystem()
-    h, c, d = system.run()
+    # 雙重認證個股 (每個代號取第一筆，查表取代逐檔篩選 DataFrame)
+    rows_c, rows_d = {}, {}
+    for r in c: rows_c.setdefault(r['代號'], r)
+    for r in d: rows_d.setdefault(r['代號'], r)
+    inter_ids = sorted(rows_c.keys() & rows_d.keys())
+    frames, backtests = {}, {}
+    if inter_ids:
+        # 抓取較長的時間段以滿足回測需求 (3年回測需要4年數據以供MA計算)，每檔只讀一次
+        frames = dict(METRICS.iterate('fetch', store.get(inter_ids, '4y')))
+        # 回測平行分派到多個行程，結果依代號排序
+        with METRICS.stage('backtest'):
+            backtests = run_backtests(frames, bench_series, workers)
+
+    with METRICS.stage('render'):
+        shared = ReportWriter()
+        shared.title("4. 💎 雙重認證個股深度分析 (AI 診斷)", color='#8e44ad')
+        # 診斷逐檔產生、逐檔寫出
+        shared.box((generate_ai_diagnostic(rows_c[tid], rows_d[tid], frames.get(tid, pd.DataFrame()), bench_series, store, backtests.get(tid, (0, 0)))
+                    for tid in inter_ids), empty="今日無雙重認證標的，大盤可能處於盤整期，請謹慎持倉。")
+
+        shared.title("2. 🚀 買入型態掃描 (CHOSE)")
+        shared.table(c, "今日無符合標的", 'chose.csv')
+
+        shared.title("3. 👑 大戶動能評分 (DRIVE)")
+        shared.table(d, "今日無高動能標的", 'drive.csv')
 
-    send_email(h, c, d); print("Done!")
+        if not sector_latest.empty:
+            shared.title("5. 🧭 產業輪動 (全市場 RS / 廣度 / 動能)")
+            shared.table(sectors.report_table(sector_latest), csv_name='sectors.csv')
 
+        messages = []
+        for sub in subscribers:
+            rep = ReportWriter(f"📈 台股動能投資策略報告 ({today})")
+            rep.paragraph(f"💰 本日主流板塊：{', '.join(top_ind)}")
+            rep.title("1. 🏥 庫存健檢 (考特賣出法則)")
+            rep.table(system.portfolio_health(sub['portfolio']) if system is not None else h, "無庫存資料", 'health.csv')
+            rep.extend(shared)
+            messages.append(rep.close().message(f"台股策略報告 - {today}", GMAIL_USER, sub['email']))
 
+    with METRICS.stage('smtp'), Mailer(user=GMAIL_USER, password=GMAIL_APP_PASSWORD) as mailer:
+        sent, queued, failed = mailer.deliver(messages)
+    print(f"📧 寄出 {sent} 封，排入重寄 {queued} 封，失敗 {failed} 封")
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="台股動能策略每日報告")
+    parser.add_argument('--metrics', default=os.environ.get('SCAN_METRICS'), help="各階段耗時 / 濾網統計輸出檔 (.json 或 Prometheus .prom)")
+    parser.add_argument('--profile', default=os.environ.get('SCAN_PROFILE'), help="cProfile 輸出檔 (.prof)")
+    parser.add_argument('--sectors', action='store_true', default=bool(os.environ.get('SCAN_SECTORS')), help="寄信前更新全市場產業輪動快取 (每個交易日只算一次)")
+    args = parser.parse_args()
+
+    try:
+        with profile(args.profile):
+            # 多位訂閱者的庫存合併成一次掃描，寄信時各自健檢
+            subscribers = load_subscribers(portfolio=MY_PORTFOLIO, receivers=RECEIVER_EMAIL)
+            system = StockSystem(workers=SCAN_WORKERS)
+            h, c, d = system.run(merge_portfolios(subscribers, MY_PORTFOLIO))
+            if args.sectors: sectors.update_sectors(system.store, bench=system.bench)
 
+            send_email(h, c, d, system.store, subscribers=subscribers, system=system); print("Done!")
+    finally:
+        # 失敗的夜晚也留下各階段耗時，才知道卡在哪裡
+        print(METRICS.summary())
+        if args.metrics: METRICS.write(args.metrics)
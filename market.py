@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+from store import PriceStore
+
+# ==========================================
+# ⚙️ 大盤基準設定
+# ==========================================
+BENCHMARK = '0050.TW'   # 大盤基準
+HISTORY = '4y'          # 回測需要 4 年
+
+# ==========================================
+# 大盤序列服務 (每個交易日只抓一次，所有策略共用)
+# ==========================================
+class BenchmarkSeries:
+    """大盤收盤序列，提供任意週期的 ROC (最新值或對齊日期的陣列)"""
+
+    def __init__(self, store=None, ticker=BENCHMARK, history=HISTORY, close=None):
+        """close 可直接給定收盤序列 (例如子行程)，此時不讀價格庫"""
+        self.store = store if store is not None or close is not None else PriceStore()
+        self.ticker = ticker
+        self.history = history
+        self._close = close
+        self._roc = {}
+
+    @property
+    def close(self):
+        if self._close is None:
+            df = self.store.frame(self.ticker, self.history)
+            close = df['Close'] if not df.empty else pd.Series(dtype=float)
+            self._close = close.iloc[:, 0] if isinstance(close, pd.DataFrame) else close
+        return self._close
+
+    def roc_series(self, period, index=None):
+        """ROC 序列；給定 index 時回傳對齊後的陣列 (缺日期補 0)"""
+        if period not in self._roc:
+            self._roc[period] = self.close.pct_change(period)
+        s = self._roc[period]
+        if index is None: return s
+        return s.reindex(index, fill_value=0).to_numpy(dtype=float)
+
+    def roc(self, period):
+        """最新一日的 ROC，取不到資料時回傳 0"""
+        try:
+            value = float(self.roc_series(period).iloc[-1])
+            return 0 if np.isnan(value) else value
+        except: return 0
+
+
+_shared = {}
+
+def get_benchmark(store=None, ticker=BENCHMARK):
+    """同一個價格庫共用一份大盤序列"""
+    store = store or PriceStore()
+    key = (store.root, ticker)
+    if key not in _shared:
+        _shared[key] = BenchmarkSeries(store, ticker)
+    return _shared[key]
@@ -0,0 +1,124 @@
+import os
+import time
+import json
+import cProfile
+from contextlib import contextmanager
+
+# ==========================================
+# ⚙️ 觀測設定
+# ==========================================
+STAGES = ('fetch', 'parse', 'indicator', 'strategy', 'backtest', 'render', 'smtp')
+GATES = ('price', 'volume', 'stage2', 'rs', 'pattern', 'error')
+PREFIX = 'stock_scan'   # Prometheus 指標名稱前綴
+
+# ==========================================
+# 各階段耗時 / 計數 / 濾網剔除統計
+# ==========================================
+class Metrics:
+    """一次執行的觀測資料：階段耗時、計數器、每個策略在各濾網被剔除的檔數"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.started = time.time()
+        self.seconds, self.calls, self.counters, self.gates = {}, {}, {}, {}
+
+    def add(self, stage, seconds, calls=1):
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+        self.calls[stage] = self.calls.get(stage, 0) + calls
+
+    @contextmanager
+    def stage(self, name):
+        t0 = time.perf_counter()
+        try: yield
+        finally: self.add(name, time.perf_counter() - t0)
+
+    def iterate(self, name, iterable):
+        """逐筆產出，只把等待下一筆的時間 (例如下載) 記在 name 底下"""
+        it = iter(iterable)
+        while True:
+            t0 = time.perf_counter()
+            try: item = next(it)
+            except StopIteration:
+                self.add(name, time.perf_counter() - t0, 0)
+                break
+            self.add(name, time.perf_counter() - t0)
+            yield item
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def reject(self, strategy, gate, n=1):
+        """記錄剔除並回傳 None，策略可直接 return metrics.reject(...)"""
+        key = (strategy, gate)
+        self.gates[key] = self.gates.get(key, 0) + n
+        return None
+
+    def snapshot(self):
+        """可 JSON 序列化的 dict (子行程回傳給主行程合併用)"""
+        gates = {}
+        for (s, g), n in self.gates.items(): gates.setdefault(s, {})[g] = n
+        return {"started": self.started, "seconds": {k: round(v, 6) for k, v in self.seconds.items()},
+                "calls": dict(self.calls), "counters": dict(self.counters), "gates": gates}
+
+    def merge(self, snap):
+        for k, v in snap['seconds'].items(): self.add(k, v, snap['calls'].get(k, 0))
+        for k, v in snap['counters'].items(): self.count(k, v)
+        for s, gates in snap['gates'].items():
+            for g, n in gates.items(): self.gates[(s, g)] = self.gates.get((s, g), 0) + n
+
+    def to_prometheus(self):
+        """node_exporter textfile collector 格式"""
+        lines = []
+        def metric(name, help, rows):
+            lines.append(f"# HELP {PREFIX}_{name} {help}")
+            lines.append(f"# TYPE {PREFIX}_{name} gauge")
+            for labels, v in rows:
+                tag = ','.join(f'{k}="{x}"' for k, x in labels.items())
+                lines.append(f"{PREFIX}_{name}{{{tag}}} {v}" if tag else f"{PREFIX}_{name} {v}")
+        metric('stage_seconds', 'Wall time spent per stage', [({'stage': k}, round(v, 6)) for k, v in self.seconds.items()])
+        metric('stage_calls', 'Number of timed calls per stage', [({'stage': k}, v) for k, v in self.calls.items()])
+        metric('count', 'Run counters', [({'name': k}, v) for k, v in self.counters.items()])
+        metric('gate_rejections', 'Tickers rejected per strategy and gate', [({'strategy': s, 'gate': g}, n) for (s, g), n in self.gates.items()])
+        metric('last_run_timestamp_seconds', 'Start time of the run', [({}, round(self.started, 3))])
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """副檔名 .prom 寫 Prometheus textfile，其餘寫 JSON；先寫暫存檔再換名，避免收集器讀到半個檔案"""
+        text = self.to_prometheus() if path.endswith('.prom') else json.dumps(self.snapshot(), ensure_ascii=False, indent=2)
+        tmp = f"{path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f: f.write(text)
+        os.replace(tmp, path)
+
+    def summary(self):
+        msg = "⏱️ 階段耗時：" + "，".join(f"{k} {self.seconds[k]:.2f}s" for k in sorted(self.seconds, key=lambda k: (STAGES + (k,)).index(k)))
+        for s in sorted({s for s, _ in self.gates}):
+            msg += f"\n   🔻 {s} 剔除：" + "，".join(f"{g} {self.gates[(s, g)]}" for g in GATES if (s, g) in self.gates)
+        return msg
+
+
+METRICS = Metrics()     # 同一行程共用
+
+
+def stage(name):
+    return METRICS.stage(name)
+
+
+def reject(strategy, gate):
+    return METRICS.reject(strategy, gate)
+
+
+@contextmanager
+def profile(path=None):
+    """path 有值時以 cProfile 記錄整段執行並寫入 path (可用 snakeviz / pstats 檢視)"""
+    if not path:
+        yield
+        return
+    prof = cProfile.Profile()
+    prof.enable()
+    try: yield
+    finally:
+        prof.disable()
+        prof.dump_stats(path)
+        print(f"🔬 cProfile 已寫入 {path}")
@@ -0,0 +1,191 @@
+import csv
+import time
+import argparse
+import pandas as pd
+from store import PriceStore
+from prices import PriceBars, column, nanmax
+from incremental import IndicatorState
+
+# ==========================================
+# ⚙️ 盤中監控設定
+# ==========================================
+POLL_SECONDS = 30       # 即時報價輪詢間隔
+HISTORY = '13mo'        # 昨日以前的資料 (算均線 / super35)
+BREAKEVEN_R = 2         # 最高曾達 2R 後停損上移至成本
+LOT = 1000              # twstock 成交量單位為張，價格庫為股
+NAN = float('nan')
+
+# ==========================================
+# 單一持股監控 (只算最新一筆報價的差量)
+# ==========================================
+class PositionMonitor:
+    """
+    昨日收盤的滾動狀態常駐記憶體，每筆報價只試算「今天以此價收盤」的均線
+    依序檢查：初始停損、2R 保本、10MA / 20MA 防守；同一種警示跌破後只發一次，站回後重新啟動
+    peak 為持有以來最高價 (判斷是否曾達 2R)，通常由 holding_peak 從價格庫算出
+    """
+
+    def __init__(self, ticker, data, state, name=None, peak=None):
+        self.ticker = ticker
+        self.name = name or ticker
+        self.cost = data['cost']
+        self.risk = data['cost'] * data['stop_loss_pct']
+        self.hard_stop = data['cost'] - self.risk
+        self.peak = peak if peak is not None else data.get('peak', data['cost'])
+        self.state = state
+        self.session = None
+        self.bar = None         # 今日盤中 [open, high, low, last]
+        self.volume = NAN       # 今日累計成交量 (股)
+        self.breached = set()
+
+    def levels(self, price):
+        """回傳 {警示種類: 防守價}，以及試算的指標"""
+        snap = self.state.provisional(price)
+        is_super = bool(snap['super35'])   # 與 health_check_logic 相同
+        levels = {'停損': self.hard_stop}
+        if (self.peak - self.cost) / self.risk >= BREAKEVEN_R: levels['保本'] = self.cost
+        levels['10MA' if is_super else '20MA'] = snap['ma10'] if is_super else snap['ma20']
+        return levels, snap
+
+    def on_tick(self, price, ts, volume=NAN):
+        """處理一筆報價 (volume 為當日累計成交股數，沒有時為 NaN)，回傳新觸發的警示 list"""
+        ts = pd.Timestamp(ts)
+        if self.session is not None and ts.normalize() > self.session: self.close_session()
+        if self.session is None: self.session = ts.normalize()
+        self.bar = [price, price, price, price] if self.bar is None else [self.bar[0], max(self.bar[1], price), min(self.bar[2], price), price]
+        if volume == volume: self.volume = volume if self.volume != self.volume else max(self.volume, volume)
+        self.peak = max(self.peak, price)
+
+        alerts = []
+        levels, snap = self.levels(price)
+        for kind, level in levels.items():
+            if price < level:
+                if kind in self.breached: continue
+                self.breached.add(kind)
+                alerts.append({"時間": ts, "代號": self.ticker, "名稱": self.name, "警示": kind, "現價": round(price, 2),
+                               "防守價": round(level, 2), "獲利(R)": round((price - self.cost) / self.risk, 1)})
+            else:
+                self.breached.discard(kind)
+        return alerts
+
+    def close_session(self):
+        """換日：把昨天盤中最後價格與累計成交量當作日線寫入狀態，隔天的均線 / 均量以此為基準"""
+        if self.bar is not None:
+            o, h, l, c = self.bar
+            self.state.update(self.session, o, h, l, c, self.volume)
+        self.session, self.bar, self.volume = None, None, NAN
+
+
+def holding_peak(df, data):
+    """
+    持有以來最高價：價格庫中進場日 (data['entry']) 以後的最高價，與成本、已記錄的 peak 取大
+    沒有進場日時無從得知持有期間，只能從成本 (或 peak) 起算
+    """
+    peak = max(data['cost'], data.get('peak', data['cost']))
+    if data.get('entry') is None or df.empty: return peak
+    high = nanmax(column(df, 'High')[df.index >= pd.Timestamp(data['entry'])])
+    return max(peak, high) if high == high else peak
+
+# ==========================================
+# 報價來源：重播檔 / 即時輪詢
+# ==========================================
+def replay_feed(path, speed=0):
+    """
+    重播檔 CSV 欄位：time, ticker, price (或 close)，可另有 volume (當日累計成交股數)，依時間排序
+    speed=0 盡快重播；speed=1 依原始時間間隔；speed=60 以 60 倍速
+    產出 (時間, 代號, 價格, 累計成交量)
+    """
+    prev = None
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            row = {k.strip().lower(): v for k, v in row.items()}
+            ts = pd.Timestamp(row['time'])
+            if speed and prev is not None: time.sleep(max((ts - prev).total_seconds() / speed, 0))
+            prev = ts
+            yield ts, row['ticker'].strip(), float(row.get('price') or row['close']), float(row.get('volume') or 'nan')
+
+
+def poll_feed(tickers, interval=POLL_SECONDS):
+    """twstock 即時報價輪詢 (盤中約 5 秒更新一次)，價格與累計成交量都沒變就不送出"""
+    import twstock  # 延遲載入
+    codes = {t.split('.')[0]: t for t in tickers}
+    last = {}
+    while True:
+        try:
+            quotes = twstock.realtime.get(list(codes))
+            for code, q in quotes.items():
+                if not isinstance(q, dict) or not q.get('success', True) or code not in codes: continue
+                try: price = float(q['realtime']['latest_trade_price'])
+                except: continue
+                try: volume = float(q['realtime']['accumulate_trade_volume']) * LOT
+                except: volume = NAN
+                if last.get(code) != (price, volume):
+                    last[code] = (price, volume)
+                    yield pd.Timestamp.now(), codes[code], price, volume
+        except Exception as e:
+            print(f"⚠️ 即時報價失敗: {e}")
+        time.sleep(interval)
+
+# ==========================================
+# 監控主迴圈
+# ==========================================
+def build_monitors(portfolio, store=None, before=None):
+    """以 before (預設今天) 以前的日線建立各持股的滾動狀態，持有以來最高價也由同一段日線算出"""
+    store = store or PriceStore()
+    before = pd.Timestamp(before).normalize() if before is not None else pd.Timestamp.now().normalize()
+    monitors = {}
+    for ticker, df in store.get(portfolio, HISTORY):
+        df = df[df.index < before]
+        if len(df):
+            data = portfolio[ticker]
+            monitors[ticker] = PositionMonitor(ticker, data, IndicatorState().extend(PriceBars.from_frame(df)), peak=holding_peak(df, data))
+    for t in portfolio:
+        if t not in monitors: print(f"❌ 找不到 {t} 資料，略過監控")
+    return monitors
+
+
+def monitor(feed, monitors, on_alert=None):
+    """逐筆處理報價；回傳 (所有警示, 延遲統計)"""
+    on_alert = on_alert or print_alert
+    alerts, count, total, worst = [], 0, 0, 0
+    for ts, ticker, price, volume in feed:
+        m = monitors.get(ticker)
+        if m is None: continue
+        t0 = time.perf_counter_ns()
+        new = m.on_tick(price, ts, volume)
+        dt = time.perf_counter_ns() - t0
+        count, total, worst = count + 1, total + dt, max(worst, dt)
+        for a in new:
+            on_alert(a)
+            alerts.append(a)
+    stats = {"報價數": count, "平均延遲(µs)": round(total / count / 1000, 1) if count else 0, "最大延遲(µs)": round(worst / 1000, 1)}
+    return alerts, stats
+
+
+def print_alert(a):
+    print(f"🚨 {a['時間']:%H:%M:%S} {a['代號']} 跌破{a['警示']} {a['防守價']} (現價 {a['現價']}, {a['獲利(R)']}R)")
+
+# ==========================================
+# 主程式執行
+# ==========================================
+if __name__ == "__main__":
+    from main import MY_PORTFOLIO
+    parser = argparse.ArgumentParser(description="MY_PORTFOLIO 盤中健檢監控")
+    parser.add_argument('--replay', help="以重播檔 (time,ticker,price) 取代即時報價")
+    parser.add_argument('--speed', type=float, default=0, help="重播速度倍數，0 = 盡快")
+    parser.add_argument('--interval', type=float, default=POLL_SECONDS, help="即時報價輪詢秒數")
+    args = parser.parse_args()
+
+    if args.replay:
+        first = next(replay_feed(args.replay))[0]
+        monitors = build_monitors(MY_PORTFOLIO, before=first)
+        feed = replay_feed(args.replay, args.speed)
+    else:
+        monitors = build_monitors(MY_PORTFOLIO)
+        feed = poll_feed(list(monitors), args.interval)
+    print(f"👀 監控 {len(monitors)} 檔持股：{', '.join(monitors)}")
+    try:
+        alerts, stats = monitor(feed, monitors)
+        print(f"\n📊 共 {len(alerts)} 則警示，{stats}")
+    except KeyboardInterrupt:
+        print("\n結束監控")
@@ -0,0 +1,200 @@
+import os
+import argparse
+import itertools
+import numpy as np
+import pandas as pd
+from tabulate import tabulate
+from concurrent.futures import ProcessPoolExecutor
+from indicators import build_panel, compute_indicators
+from backtest import chose_features, chose_entry, ma_exits, rank_feature, align_bench, iter_trades, BACKTEST_BARS, MIN_BARS, STOP_PCT
+from backtest import MIN_PRICE, RS_PERIOD, DRIVE_MIN_VOLUME, DRIVE_RS_PERIOD, DRIVE_NEAR_HIGH_PCT, DRIVE_MIN_RS, DRIVE_VOL_SPIKE, MVP_UP_DAYS, MVP_VOL_INC
+from ranking import rank_panel
+from parallel import SharedArrays, attach, release
+
+# ==========================================
+# ⚙️ 參數掃描設定
+# ==========================================
+# 格點：每個參數列出要測的值 (預設值為 chose.py / drive.py / backtest_3y_strategy 現行門檻)
+GRIDS = {
+    'chose': {
+        'rally_pct': [0.6, 0.7, 0.8, 0.9, 1.0],        # HTF_RALLY_PCT
+        'gap_pct': [0.05, 0.06, 0.08, 0.10],           # GAP_UP_PCT
+        'near_high_pct': [0.10, 0.15, 0.20],           # NEAR_HIGH_PCT
+        'stop_pct': [0.05, 0.07, 0.08, 0.10],          # 初始停損
+    },
+    'drive': {
+        'mvp_up_days': [7, 8, 9, 10, 11, 12],          # MVP_UP_DAYS
+        'mvp_vol_inc': [1.0, 1.1, 1.2, 1.3, 1.5],      # MVP_VOL_INC
+        'stop_pct': [0.05, 0.07, 0.08, 0.10],
+    },
+}
+# 隨機搜尋：每個參數的 (下限, 上限)，整數參數取整數；min_rank 為 RS 排名門檻 (0 = 不限)
+RANGES = {
+    'chose': {'rally_pct': (0.5, 1.2), 'gap_pct': (0.03, 0.12), 'near_high_pct': (0.05, 0.25), 'stop_pct': (0.03, 0.12), 'min_rank': (0, 95)},
+    'drive': {'mvp_up_days': (6, 14), 'mvp_vol_inc': (0.9, 1.8), 'stop_pct': (0.03, 0.12), 'min_rank': (0, 95)},
+}
+CHUNK = 16              # 每個工作單位的參數組數
+SEED = 42
+OUT_FILE = 'sweep_results.csv'
+
+# ==========================================
+# 與參數無關的特徵 (每檔指標只算一次)
+# ==========================================
+def drive_features(ind, bench_roc):
+    """StockSystem.analyze_drive 中與 MVP 門檻無關的部分；bench_roc 為對齊日期的 60 日大盤 ROC"""
+    c, v = ind.panel.close, ind['volume']
+    with np.errstate(invalid='ignore'):
+        gate = ~((c < MIN_PRICE) | (ind['vol20'] < DRIVE_MIN_VOLUME))
+        gate &= (c > ind['ma50']) & (ind['ma50'] > ind['ma200']) & ((ind['high250'] - c) / ind['high250'] < DRIVE_NEAR_HIGH_PCT)
+        gate &= ~((ind[f'roc{DRIVE_RS_PERIOD}'] - bench_roc.reshape(-1, 1)) * 100 < DRIVE_MIN_RS)
+        breakout = (c > ind['close_max20_prev']) & (v > ind['vol20'] * DRIVE_VOL_SPIKE)
+    return {'gate': gate, 'breakout': breakout, 'up_days': ind['up_days15'], 'vol_ratio': ind['vol_ratio15'], 'rank': rank_feature(ind)}
+
+
+def drive_entry(f, mvp_up_days=MVP_UP_DAYS, mvp_vol_inc=MVP_VOL_INC, min_rank=0):
+    """評分 >= 30 才進場：帶量突破 (50 分) 或 MVP 吸籌 (30 分)；RS 超強 (20 分) 單獨不足"""
+    with np.errstate(invalid='ignore'):
+        is_mvp = (f['up_days'] >= mvp_up_days) & (f['vol_ratio'] >= mvp_vol_inc)
+        gate = f['gate'] & (f['rank'] >= min_rank) if min_rank else f['gate']
+    return gate & (f['breakout'] | is_mvp)
+
+
+ENTRIES = {'chose': chose_entry, 'drive': drive_entry}
+
+
+def prepare(frames, bench_close, strategy='chose', bars=BACKTEST_BARS):
+    """
+    全市場指標一次算完，只保留回測區間內的特徵矩陣 (標的 × 日期，逐檔連續)
+    回傳 {名稱: 陣列}，可直接放進共享記憶體
+    """
+    ind = compute_indicators(build_panel(frames), (RS_PERIOD, DRIVE_RS_PERIOD))
+    ind.values['rs_rank'] = rank_panel(ind)     # 全市場每日 RS 排名 (min_rank 參數用)
+    p = ind.panel
+    bench = bench_close.iloc[:, 0] if isinstance(bench_close, pd.DataFrame) else bench_close
+    if strategy == 'chose':
+        f = chose_features(ind, align_bench(bench.pct_change(RS_PERIOD), p.dates))
+    else:
+        f = drive_features(ind, align_bench(bench.pct_change(DRIVE_RS_PERIOD), p.dates))
+    f['close'], f['ma_exit'] = p.close, ma_exits(ind)
+    start = max(len(p.dates) - bars, 0)
+    return {k: np.ascontiguousarray(a[start:].T) for k, a in f.items()}
+
+# ==========================================
+# 單組參數評估
+# ==========================================
+def evaluate(features, strategy, params):
+    """
+    全市場套用一組參數：各檔獨立跑狀態機 (同 backtest_frame)
+    績效以每檔等權重、出場才入帳的組合淨值計算
+    """
+    params = dict(params)
+    stop_pct = params.pop('stop_pct', STOP_PCT)
+    entry = ENTRIES[strategy](features, **params)
+    close, ma_exit = features['close'], features['ma_exit']
+    m, n = close.shape
+
+    returns, delta = [], np.zeros(n)
+    for j in np.flatnonzero(entry.any(axis=1)):
+        equity = 1.0
+        for x, r in iter_trades(close[j], entry[j], ma_exit[j], 0, stop_pct):
+            returns.append(r)
+            delta[x] += equity * r / m
+            equity *= 1 + r
+
+    curve = 1 + np.cumsum(delta)
+    returns = np.asarray(returns)
+    return {
+        "交易次數": len(returns),
+        "勝率(%)": round(float((returns > 0).mean()) * 100, 1) if len(returns) else 0,
+        "平均報酬(%)": round(float(returns.mean()) * 100, 2) if len(returns) else 0,
+        "總報酬(%)": round((float(curve[-1]) - 1) * 100, 2) if n else 0,
+        "最大回撤(%)": round(float((curve / np.maximum.accumulate(curve) - 1).min()) * 100, 2) if n else 0,
+    }
+
+
+def _run_chunk(spec, strategy, combos):
+    """子行程：掛載共享特徵矩陣，依序評估一批參數"""
+    arrays, handles = attach(spec)
+    try:
+        return [evaluate(arrays, strategy, c) for c in combos]
+    finally:
+        # 同 parallel._run_shard：先放掉共享矩陣的參照再關閉，關閉失敗也不蓋掉 evaluate 的錯誤
+        arrays = None
+        release(handles)
+
+# ==========================================
+# 參數組合
+# ==========================================
+def grid(space):
+    """格點搜尋：{參數: [值]} 的笛卡兒積"""
+    keys = list(space)
+    return [dict(zip(keys, values)) for values in itertools.product(*space.values())]
+
+
+def random_search(ranges, n, seed=SEED):
+    """隨機搜尋：在 {參數: (下限, 上限)} 內均勻抽 n 組 (整數範圍抽整數)"""
+    rng = np.random.default_rng(seed)
+    combos = [{} for _ in range(n)]
+    for k, (lo, hi) in ranges.items():
+        if isinstance(lo, int) and isinstance(hi, int): values = rng.integers(lo, hi + 1, n).tolist()
+        else: values = np.round(rng.uniform(lo, hi, n), 4).tolist()
+        for c, v in zip(combos, values): c[k] = v
+    return combos
+
+
+def sweep(frames, bench_close, combos, strategy='chose', workers=None, bars=BACKTEST_BARS):
+    """
+    所有參數組合共用同一份指標與特徵；workers > 1 時依參數分批交給多個行程 (共享記憶體讀特徵)
+    回傳 DataFrame：每列一組參數與其勝率 / 報酬 / 回撤，順序同 combos
+    """
+    features = prepare(frames, bench_close, strategy, bars)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(combos) <= 1:
+        rows = [evaluate(features, strategy, c) for c in combos]
+    else:
+        shared = SharedArrays(features)
+        try:
+            chunks = [combos[i:i + CHUNK] for i in range(0, len(combos), CHUNK)]
+            with ProcessPoolExecutor(max_workers=workers) as ex:
+                rows = [r for part in ex.map(_run_chunk, itertools.repeat(shared.spec), itertools.repeat(strategy), chunks) for r in part]
+        finally:
+            shared.close()
+    return pd.concat([pd.DataFrame(combos), pd.DataFrame(rows)], axis=1)
+
+# ==========================================
+# 主程式執行
+# ==========================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CHOSE / DRIVE 門檻參數掃描 (指標只算一次)")
+    parser.add_argument('--strategy', choices=list(GRIDS), default='chose')
+    parser.add_argument('--random', type=int, help="隨機搜尋 N 組 (預設為格點搜尋)")
+    parser.add_argument('--seed', type=int, default=SEED)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--synthetic', type=int, help="以 N 檔合成資料測試，不讀價格庫")
+    parser.add_argument('--sort', default='總報酬(%)')
+    parser.add_argument('--top', type=int, default=20)
+    parser.add_argument('--out', default=OUT_FILE)
+    args = parser.parse_args()
+
+    if args.synthetic:
+        from perf import synthetic_market, BACKTEST_DAYS
+        frames, bench_close = synthetic_market(args.synthetic, BACKTEST_DAYS)
+    else:
+        from fetch import get_universe
+        from store import PriceStore
+        from market import get_benchmark
+        store = PriceStore()
+        tickers = [s['ticker'] for s in get_universe()]
+        print(f"🚀 載入全市場 {len(tickers)} 檔 4 年資料...")
+        frames = {t: df for t, df in store.get(tickers, '4y') if len(df) >= MIN_BARS}
+        bench_close = get_benchmark(store).close
+
+    combos = random_search(RANGES[args.strategy], args.random, args.seed) if args.random else grid(GRIDS[args.strategy])
+    print(f"🔧 {args.strategy.upper()}：{len(frames)} 檔 × {len(combos)} 組參數")
+    res = sweep(frames, bench_close, combos, args.strategy, args.workers)
+    res = res.sort_values(args.sort, ascending=False, kind='stable')
+    res.to_csv(args.out, index=False, encoding='utf-8-sig')
+
+    print(f"\n📊 參數掃描結果 (前 {args.top} 組，依 {args.sort})")
+    print(tabulate(res.head(args.top), headers='keys', tablefmt='fancy_grid', showindex=False))
+    print(f"\n💾 全部結果已寫入 {args.out}")
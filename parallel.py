@@ -0,0 +1,100 @@
+import os
+import numpy as np
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+from indicators import Panel, Indicators, FIELDS
+from prices import PriceBars
+from metrics import METRICS
+
+# ==========================================
+# 共享記憶體矩陣 (worker 直接讀取，不用 pickle DataFrame)
+# ==========================================
+class SharedArrays:
+    """把一組 numpy 矩陣複製進 shared memory；spec 可傳給子行程重新掛載"""
+
+    def __init__(self, arrays):
+        self.blocks, self.spec = [], {}
+        for key, a in arrays.items():
+            a = np.ascontiguousarray(a)
+            shm = shared_memory.SharedMemory(create=True, size=max(a.nbytes, 1))
+            np.ndarray(a.shape, a.dtype, buffer=shm.buf)[...] = a
+            self.blocks.append(shm)
+            self.spec[key] = (shm.name, a.shape, a.dtype.str)
+
+    def close(self):
+        for shm in self.blocks:
+            shm.close()
+            shm.unlink()
+
+
+def attach(spec):
+    """依 spec 掛載共享矩陣，回傳 (arrays, handles)；用完需 close handles"""
+    arrays, handles = {}, []
+    for key, (name, shape, dtype) in spec.items():
+        shm = shared_memory.SharedMemory(name=name)
+        handles.append(shm)
+        arrays[key] = np.ndarray(shape, np.dtype(dtype), buffer=shm.buf)
+    return arrays, handles
+
+
+def release(handles):
+    """關閉掛載的 handle；仍有陣列參照 (例如錯誤的 traceback 留住的區域變數) 時 close 會丟 BufferError，略過以免蓋掉原本的錯誤"""
+    for shm in handles:
+        try:
+            shm.close()
+        except BufferError:
+            pass
+
+# ==========================================
+# 平行分派策略
+# ==========================================
+def _run_shard(spec, dates, tickers, shard, items, names, portfolio, options, bench_close, skip):
+    """子行程：從共享矩陣切出自己負責的標的，依序跑完所有策略"""
+    from scanner import STRATEGIES, ScanContext, load_plugins, dispatch
+    from market import BenchmarkSeries
+
+    load_plugins(names)
+    METRICS.reset()     # fork 出來的子行程帶著主行程的計數，只回傳本分片的部分
+    arrays, handles = attach(spec)
+    try:
+        panel = Panel(dates, tickers, *[arrays[f] for f in FIELDS])
+        ind = Indicators(panel, {k[4:]: v for k, v in arrays.items() if k.startswith('ind:')})
+        ctx = ScanContext(None, BenchmarkSeries(close=bench_close), portfolio, ind, options)
+
+        frames = ((tickers[j], PriceBars.from_panel(panel, j)) for j in shard)
+        hits, errors = dispatch(frames, [STRATEGIES[n] for n in names], items, ctx, skip)
+        return hits, {k: repr(e) for k, e in errors.items()}, METRICS.snapshot()
+    finally:
+        # 先放掉所有指向共享記憶體的陣列 (錯誤的 traceback 也會留住 K 棒)，close 才不會因仍有參照而失敗；
+        # 中途出錯時部分名稱尚未建立，用指派而不是 del
+        arrays = panel = ind = ctx = frames = errors = None
+        release(handles)
+
+
+def dispatch_parallel(ind, items, names, portfolio, options, bench_close, workers=None, skip=()):
+    """
+    依標的順序切成 workers 份，各行程以共享記憶體讀取價格與指標
+    回傳與單行程 dispatch 相同順序的 (hits, errors)；各行程的濾網統計併入 METRICS
+    """
+    panel = ind.panel
+    workers = workers or os.cpu_count() or 1
+    arrays = {f: a for f, a in zip(FIELDS, [panel.open, panel.high, panel.low, panel.close, panel.volume])}
+    arrays.update({f"ind:{k}": v for k, v in ind.values.items()})
+    shared = SharedArrays(arrays)
+    try:
+        shards = [s for s in np.array_split(np.arange(len(panel.tickers)), workers) if len(s)]
+        sub_items = [{panel.tickers[j]: items[panel.tickers[j]] for j in s} for s in shards]
+        with ProcessPoolExecutor(max_workers=len(shards)) as ex:
+            futures = [ex.submit(_run_shard, shared.spec, panel.dates, panel.tickers, s.tolist(), it, names, portfolio, options, bench_close,
+                                 {(n, t) for n, t in skip if t in it})
+                       for s, it in zip(shards, sub_items)]
+            hits, errors = [], {}
+            # 依分片順序合併 = 依標的順序
+            for fut in futures:
+                h, e, m = fut.result()
+                hits += h
+                errors.update(e)
+                METRICS.merge(m)
+        return hits, errors
+    finally:
+        shared.close()
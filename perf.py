@@ -0,0 +1,167 @@
+import os
+import json
+import time
+import pickle
+import argparse
+import tempfile
+import platform
+import subprocess
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+# ==========================================
+# ⚙️ 效能測試參數
+# ==========================================
+SIZES = (100, 2000, 10000)     # 全市場檔數
+SCAN_DAYS = 250                # 掃描用 1 年資料
+BACKTEST_DAYS = 1000           # 回測用 4 年資料
+BACKTEST_CAP = 200             # 回測只取前 N 檔量測 (單檔延遲)
+SEED = 42
+OUT_FILE = 'perf_results.json'
+
+# ==========================================
+# 合成市場資料 (固定亂數種子，可重現)
+# ==========================================
+def synthetic_market(n_tickers, n_days, seed=SEED):
+    """產生 n_tickers 檔 × n_days 天的 OHLCV，回傳 ({ticker: df}, 大盤收盤 Series)"""
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(end='2024-12-31', periods=n_days)
+    drift = rng.uniform(-0.001, 0.003, n_tickers)
+    vol = rng.uniform(0.01, 0.04, n_tickers)
+    ret = rng.normal(drift, vol, (n_days, n_tickers))
+    close = rng.uniform(10, 300, n_tickers) * np.cumprod(1 + ret, axis=0)
+    gap = rng.normal(0.002, 0.02, (n_days, n_tickers))
+    open_p = np.vstack([close[:1], close[:-1]]) * (1 + gap)
+    high = np.maximum(open_p, close) * (1 + np.abs(rng.normal(0, 0.01, (n_days, n_tickers))))
+    low = np.minimum(open_p, close) * (1 - np.abs(rng.normal(0, 0.01, (n_days, n_tickers))))
+    volume = rng.lognormal(np.log(rng.uniform(2e5, 5e6, n_tickers)), 0.4, (n_days, n_tickers)).round()
+
+    frames = {}
+    for j in range(n_tickers):
+        frames[f"{1000 + j}.TW"] = pd.DataFrame({'Open': open_p[:, j], 'High': high[:, j], 'Low': low[:, j], 'Close': close[:, j], 'Volume': volume[:, j]}, index=dates)
+    bench = pd.Series(100 * np.cumprod(1 + rng.normal(0.0004, 0.01, n_days)), index=dates, name='Close')
+    return frames, bench
+
+# ==========================================
+# 量測工具
+# ==========================================
+def measure(fn, memory=True):
+    """回傳 (秒數, 峰值 MB, 結果)；記憶體另跑一次避免 tracemalloc 影響計時"""
+    t0 = time.perf_counter()
+    result = fn()
+    seconds = time.perf_counter() - t0
+    peak = None
+    if memory:
+        tracemalloc.start()
+        fn()
+        peak = tracemalloc.get_traced_memory()[1] / 1e6
+        tracemalloc.stop()
+    return seconds, peak, result
+
+
+def git_commit():
+    try: return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except Exception: return None
+
+# ==========================================
+# 各階段效能
+# ==========================================
+def bench_size(n, memory=True, backtest_cap=BACKTEST_CAP):
+    from main import StockSystem
+    from store import PriceStore
+    from indicators import build_panel, compute_indicators
+    from backtest import backtest_frame, backtest_reference
+    from prices import PriceBars
+    from incremental import IndicatorState
+    import chose
+    import drive
+
+    frames, bench = synthetic_market(n, SCAN_DAYS)
+    system = StockSystem(store=PriceStore(root=os.path.join(tempfile.gettempdir(), 'perf_prices')))   # 合成資料，不讀價格庫
+    bench_c = float(bench.pct_change(system.rs_period_chose).iloc[-1])
+    bench_d = float(bench.pct_change(system.rs_period_drive).iloc[-1])
+    items = [{'ticker': t, 'name': t, 'industry': '合成'} for t in frames]
+    position = {'cost': 50.0, 'stop_loss_pct': 0.07}
+
+    # 掃描時每檔以 PriceBars 常駐 (與 run_scan 相同)
+    bars = {t: PriceBars.from_frame(df) for t, df in frames.items()}
+    panel_ind = {}
+    def indicators():
+        panel_ind['ind'] = compute_indicators(build_panel(bars), (system.rs_period_chose, system.rs_period_drive))
+    stages = [('PriceBars.from_frame', n, lambda: [PriceBars.from_frame(df) for df in frames.values()]), ('indicators', n, indicators)]
+    # StockSystem 的策略讀取共用指標快照 (與 run() 相同路徑)
+    snap = lambda t: panel_ind['ind'].snapshot(t)
+    stages += [
+        ('StockSystem.health_check_logic', n, lambda: [system.health_check_logic(t, t, position, frames[t], snap(t)) for t in frames]),
+        ('StockSystem.analyze_chose', n, lambda: [system.analyze_chose(t, t, frames[t], bench_c, snap(t)) for t in frames]),
+        ('StockSystem.analyze_drive', n, lambda: [system.analyze_drive(it, frames[it['ticker']], bench_d, snap(it['ticker'])) for it in items]),
+        ('chose.analyze_stock', n, lambda: [chose.analyze_stock(t, bars[t], bench_c) for t in bars]),
+        ('drive.analyze_drive_full', n, lambda: [drive.analyze_drive_full(it, bars[it['ticker']], bench_d) for it in items]),
+    ]
+
+    # 回測用 4 年資料，只取前 backtest_cap 檔量測單檔延遲
+    k = min(n, backtest_cap)
+
+    # 增量指標：前 k 檔先累積到昨天，量測「讀回狀態 + 加入今天一根 K 棒」
+    head = [bars[t] for t in list(bars)[:k]]
+    states = [IndicatorState((system.rs_period_chose, system.rs_period_drive)).extend(PriceBars(b.dates[:-1], b.open[:-1], b.high[:-1], b.low[:-1], b.close[:-1], b.volume[:-1])) for b in head]
+    def daily_update():
+        for st, b in zip(pickle.loads(pickle.dumps(states)), head): st.extend(b, len(b) - 1)
+    stages.append(('IndicatorState.load+update', k, daily_update))
+    bt_frames, bt_bench = synthetic_market(k, BACKTEST_DAYS)
+    bench_roc = bt_bench.pct_change(20).to_dict()
+    stages.append(('backtest_3y_strategy', k, lambda: [backtest_frame(df, bench_roc) for df in bt_frames.values()]))
+
+    rows = []
+    for name, count, fn in stages:
+        seconds, peak, result = measure(fn, memory)
+        hits = sum(r is not None for r in result) if isinstance(result, list) else None
+        rows.append({"stage": name, "universe": n, "tickers": count, "seconds": round(seconds, 4),
+                     "per_ticker_ms": round(seconds / count * 1000, 4), "peak_mb": round(peak, 2) if peak is not None else None, "hits": hits})
+        print(f"  {name:<34} {count:>6} 檔  {seconds:8.3f}s  {rows[-1]['per_ticker_ms']:8.3f} ms/檔  峰值 {rows[-1]['peak_mb']} MB")
+
+    # 向量化回測與逐根原始版本比對 (結果必須一致)
+    sample = list(bt_frames.values())[:min(k, 20)]
+    mismatch = sum(backtest_frame(df, bench_roc) != backtest_reference(df, bench_roc) for df in sample)
+    print(f"  回測一致性檢查：{len(sample)} 檔中 {mismatch} 檔不一致")
+    return rows, mismatch
+
+
+def compare(prev, rows):
+    """與上一次結果比較，列出變慢超過 20% 的階段"""
+    old = {(r['stage'], r['universe']): r for r in prev.get('results', [])}
+    for r in rows:
+        o = old.get((r['stage'], r['universe']))
+        if o and o['seconds'] > 0:
+            ratio = r['seconds'] / o['seconds']
+            flag = "⚠️ 變慢" if ratio > 1.2 else ""
+            print(f"  {r['stage']:<34} {r['universe']:>6} 檔  {o['seconds']:.3f}s -> {r['seconds']:.3f}s  (x{ratio:.2f}) {flag}")
+
+# ==========================================
+# 主程式執行
+# ==========================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="掃描 / 指標 / 回測 熱點效能測試")
+    parser.add_argument('--sizes', default=','.join(map(str, SIZES)), help="全市場檔數，逗號分隔")
+    parser.add_argument('--backtest-cap', type=int, default=BACKTEST_CAP)
+    parser.add_argument('--no-memory', action='store_true', help="不量測峰值記憶體")
+    parser.add_argument('--out', default=OUT_FILE)
+    parser.add_argument('--compare', help="與先前的結果 JSON 比較")
+    args = parser.parse_args()
+
+    results, mismatches = [], 0
+    for n in [int(x) for x in args.sizes.split(',')]:
+        print(f"\n🧪 全市場 {n} 檔")
+        rows, bad = bench_size(n, not args.no_memory, args.backtest_cap)
+        results += rows
+        mismatches += bad
+
+    report = {"commit": git_commit(), "timestamp": pd.Timestamp.now().isoformat(), "python": platform.python_version(),
+              "numpy": np.__version__, "pandas": pd.__version__, "cpu_count": os.cpu_count(),
+              "backtest_mismatches": mismatches, "results": results}
+    if args.compare and os.path.exists(args.compare):
+        print("\n📈 與先前結果比較")
+        with open(args.compare) as f: compare(json.load(f), results)
+    with open(args.out, 'w') as f: json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n💾 結果已寫入 {args.out}")
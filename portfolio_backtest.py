@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+from tabulate import tabulate
+from fetch import get_universe
+from store import PriceStore
+from market import get_benchmark
+from indicators import build_panel, compute_indicators
+from backtest import signals, align_bench, BACKTEST_BARS, STOP_PCT, RS_PERIOD
+
+# ==========================================
+# ⚙️ 投組回測參數
+# ==========================================
+INIT_CAPITAL = 1000000  # 初始資金
+MAX_POSITIONS = 10      # 同時持股上限
+POSITION_PCT = 0.10     # 每檔投入淨值比例
+FEE = 0.001425          # 手續費 (買賣各一次)
+TAX = 0.003             # 證交稅 (賣出)
+
+# ==========================================
+# 全市場投組回測
+# ==========================================
+def backtest_portfolio(frames, bench_close, bars=BACKTEST_BARS, capital=INIT_CAPITAL, max_positions=MAX_POSITIONS,
+                       position_pct=POSITION_PCT, stop_pct=STOP_PCT, fee=FEE, tax=TAX):
+    """
+    全市場同時套用 CHOSE 進場 + 健檢出場，每天依 RS 由強到弱補滿空位
+    回傳 equity / drawdown / turnover / benchmark (Series)、trades (DataFrame)、summary (dict)
+    """
+    ind = compute_indicators(build_panel(frames), (RS_PERIOD,))
+    p = ind.panel
+    bench = bench_close.iloc[:, 0] if isinstance(bench_close, pd.DataFrame) else bench_close
+    bench_roc = align_bench(bench.pct_change(RS_PERIOD), p.dates)
+    entry, ma_exit = signals(ind, bench_roc)
+    rs = ind[f'roc{RS_PERIOD}'] - bench_roc.reshape(-1, 1)
+
+    raw = p.close
+    mark = pd.DataFrame(raw).ffill().fillna(0).to_numpy()   # 停牌日以前一日收盤計價
+    tradable = ~np.isnan(raw)
+    n, m = raw.shape
+    start = max(n - bars, 0)
+
+    cash = float(capital)
+    shares = np.zeros(m)
+    entry_p = np.full(m, np.nan)
+    entry_i = np.zeros(m, dtype=int)
+    held = np.zeros(m, dtype=bool)
+    equity, turnover, trades = np.empty(n - start), np.empty(n - start), []
+
+    for k, i in enumerate(range(start, n)):
+        c, traded = raw[i], 0.0
+
+        # --- 出場：初始停損 / 均線防守 ---
+        with np.errstate(invalid='ignore'):
+            out = held & tradable[i] & (ma_exit[i] | (c < entry_p * (1 - stop_pct)))
+        if out.any():
+            proceeds = shares[out] * c[out]
+            cash += float((proceeds * (1 - fee - tax)).sum())
+            traded += float(proceeds.sum())
+            for j in np.flatnonzero(out):
+                trades.append((p.tickers[j], p.dates[entry_i[j]], p.dates[i], entry_p[j], c[j], c[j] / entry_p[j] - 1))
+            held[out], shares[out], entry_p[out] = False, 0, np.nan
+
+        # --- 進場：今日訊號依 RS 排序，補滿持股上限 ---
+        slots = max_positions - int(held.sum())
+        cand = np.flatnonzero(entry[i] & ~held & ~out & tradable[i])
+        if slots > 0 and cand.size:
+            cand = cand[np.argsort(-rs[i, cand], kind='stable')][:slots]
+            value = cash + float(shares @ mark[i])
+            alloc = min(value * position_pct, cash / (1 + fee) / len(cand))
+            if alloc > 0:
+                shares[cand] = alloc / c[cand]
+                entry_p[cand], entry_i[cand], held[cand] = c[cand], i, True
+                cash -= alloc * len(cand) * (1 + fee)
+                traded += alloc * len(cand)
+
+        equity[k] = cash + float(shares @ mark[i])
+        turnover[k] = traded / equity[k]
+
+    dates = p.dates[start:]
+    equity = pd.Series(equity, index=dates)
+    drawdown = equity / equity.cummax() - 1
+    turnover = pd.Series(turnover, index=dates)
+    bench_curve = bench.reindex(dates).ffill()
+    bench_curve = bench_curve / bench_curve.iloc[0] * capital
+    trades = pd.DataFrame(trades, columns=['代號', '進場日', '出場日', '進場價', '出場價', '報酬'])
+
+    years = len(dates) / 250
+    summary = {
+        "總報酬(%)": round((float(equity.iloc[-1]) / capital - 1) * 100, 1),
+        "年化報酬(%)": round(((float(equity.iloc[-1]) / capital) ** (1 / years) - 1) * 100, 1) if years > 0 else 0,
+        "最大回撤(%)": round(float(drawdown.min()) * 100, 1),
+        "年化週轉率(倍)": round(float(turnover.sum()) / years, 1) if years > 0 else 0,
+        "交易次數": len(trades),
+        "勝率(%)": round(float((trades['報酬'] > 0).mean()) * 100, 1) if len(trades) else 0,
+        "大盤報酬(%)": round((float(bench_curve.iloc[-1]) / capital - 1) * 100, 1),
+    }
+    return {"equity": equity, "drawdown": drawdown, "turnover": turnover, "benchmark": bench_curve, "trades": trades, "summary": summary}
+
+# ==========================================
+# 主程式執行
+# ==========================================
+if __name__ == "__main__":
+    store = PriceStore()
+    tickers = [s['ticker'] for s in get_universe()]
+    print(f"🚀 載入全市場 {len(tickers)} 檔 4 年資料...")
+    frames = {t: df for t, df in store.get(tickers, '4y') if len(df) >= 300}
+    res = backtest_portfolio(frames, get_benchmark(store).close)
+
+    print("\n📊 【CHOSE 進場 + 健檢出場】全市場投組回測 (3Y)")
+    print(tabulate([res['summary']], headers='keys', tablefmt='fancy_grid'))
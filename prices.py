@@ -0,0 +1,116 @@
+import numpy as np
+import pandas as pd
+from fetch import FIELDS
+
+# ==========================================
+# ⚙️ 價格容器設定
+# ==========================================
+PRICE_DTYPE = np.float64    # 10 年全市場面板可改 np.float32 減半記憶體
+VOLUME_DTYPE = np.float64  # 保留缺量 (NaN)，均量判斷同 pandas：窗口內缺量為 NaN，不會被當成 0 量剔除
+
+# ==========================================
+# 欄位拆解 (取代各處重複的 iloc[:, 0] 判斷)
+# ==========================================
+def column(data, field):
+    """從 DataFrame (含 MultiIndex 欄位) 或 PriceBars 取出一維 numpy 陣列"""
+    if isinstance(data, PriceBars): return data[field]
+    s = data[field]
+    return (s.iloc[:, 0] if isinstance(s, pd.DataFrame) else s).to_numpy(dtype=float)
+
+
+_dates = {}
+
+def shared_dates(index):
+    """相同的日期索引只保留一份，讓全市場標的共用"""
+    index = pd.DatetimeIndex(index)
+    if len(index) == 0: return index
+    key = (len(index), index[0], index[-1])
+    cached = _dates.get(key)
+    if cached is not None and cached.equals(index): return cached
+    _dates[key] = index
+    return index
+
+# ==========================================
+# 單檔 OHLCV 容器
+# ==========================================
+class PriceBars:
+    """單檔 OHLCV：連續的 numpy 陣列 + 共用日期索引，取代掃描期間常駐的 DataFrame"""
+    __slots__ = ('dates', 'open', 'high', 'low', 'close', 'volume')
+
+    def __init__(self, dates, open, high, low, close, volume):
+        self.dates = dates
+        self.open, self.high, self.low, self.close, self.volume = open, high, low, close, volume
+
+    @classmethod
+    def from_arrays(cls, dates, open, high, low, close, volume, dtype=PRICE_DTYPE):
+        prices = [np.ascontiguousarray(a, dtype=dtype) for a in (open, high, low, close)]
+        volume = np.ascontiguousarray(volume, dtype=VOLUME_DTYPE)
+        return cls(shared_dates(dates), *prices, volume)
+
+    @classmethod
+    def from_frame(cls, df, dtype=PRICE_DTYPE):
+        return cls.from_arrays(df.index, *[column(df, f) for f in FIELDS], dtype=dtype)
+
+    @classmethod
+    def from_panel(cls, panel, j, dtype=PRICE_DTYPE):
+        """從 Panel 取出第 j 檔，去掉該檔沒有交易的日期"""
+        cols = [a[:, j] for a in (panel.open, panel.high, panel.low, panel.close, panel.volume)]
+        rows = ~np.all(np.isnan(np.column_stack(cols)), axis=1)
+        dates = panel.dates if rows.all() else panel.dates[rows]
+        return cls.from_arrays(dates, *[c[rows] for c in cols], dtype=dtype)
+
+    @classmethod
+    def of(cls, data):
+        return data if isinstance(data, cls) else cls.from_frame(data)
+
+    def __len__(self):
+        return len(self.close)
+
+    def __getitem__(self, field):
+        return getattr(self, field.lower())
+
+    @property
+    def index(self):
+        return self.dates
+
+    @property
+    def empty(self):
+        return len(self.close) == 0
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.open, self.high, self.low, self.close, self.volume))
+
+    def to_frame(self):
+        return pd.DataFrame({f: self[f] for f in FIELDS}, index=self.dates)
+
+# ==========================================
+# 最新一根 K 棒的窗口運算 (語意同 pandas：rolling 不足 / 有 NaN 為 NaN，max/min 略過 NaN)
+# ==========================================
+def tail_mean(a, w):
+    """等同 Series.rolling(w).mean().iloc[-1]"""
+    return float(np.mean(a[-w:])) if len(a) >= w else np.nan
+
+
+def nanmax(a):
+    """等同 Series.max()：略過 NaN，全為 NaN 時回傳 NaN"""
+    a = a[~np.isnan(a)] if a.dtype.kind == 'f' else a
+    return float(a.max()) if len(a) else np.nan
+
+
+def nanmin(a):
+    a = a[~np.isnan(a)] if a.dtype.kind == 'f' else a
+    return float(a.min()) if len(a) else np.nan
+
+
+def nanmean(a):
+    a = a[~np.isnan(a)] if a.dtype.kind == 'f' else a
+    return float(a.mean()) if len(a) else np.nan
+
+
+def pct_change(a, n):
+    """
+    等同 Series.pct_change(n, fill_method=None).iloc[-1] (pandas 3 的預設)：任一端為 NaN 即為 NaN
+    不像 pandas 2 預設的 fill_method='pad' 先以停牌前的收盤價補上
+    """
+    return float(a[-1] / a[-1 - n] - 1) if len(a) > n else np.nan
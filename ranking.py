@@ -0,0 +1,94 @@
+import os
+import numpy as np
+import pandas as pd
+from indicators import roc
+
+# ==========================================
+# ⚙️ RS 排名設定 (IBD 式：最近一季權重加倍)
+# ==========================================
+RANK_PERIODS = (63, 126, 189, 252)  # 3 / 6 / 9 / 12 個月
+WEIGHTS = (0.4, 0.2, 0.2, 0.2)
+RANK_FILE = '_rs_rank.parquet'      # 存在價格庫目錄下，日期 × 代號
+TREND_DAYS = 20         # 排名趨勢：與 20 個交易日前相比
+
+# ==========================================
+# 加權 ROC 與橫斷面百分位
+# ==========================================
+def rs_score(ind):
+    """加權多期 ROC (日期 × 標的)；ind 已有 roc<N> 就直接用 (增量指標只有最新一根)，否則由各檔自己的收盤價計算"""
+    p = ind.panel
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return sum(w * (ind[f'roc{n}'] if f'roc{n}' in ind.values else p.per_ticker(lambda c: roc(c, n), p.close)) for n, w in zip(RANK_PERIODS, WEIGHTS))
+
+
+def percentile_rank(score):
+    """
+    每一列 (每個交易日) 排序一次，換成 1 ~ 99 的百分位排名 (99 最強)；NaN 沒有排名
+    score 為一維 (單日全市場) 或二維 (日期 × 標的)
+    """
+    s = np.atleast_2d(np.asarray(score, dtype=float))
+    order = np.argsort(s, axis=1, kind='stable')    # NaN 排在最後
+    pos = np.empty(s.shape)
+    np.put_along_axis(pos, order, np.arange(s.shape[1], dtype=float)[None, :], axis=1)
+    n = (~np.isnan(s)).sum(axis=1, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rank = np.where(n > 1, np.floor(pos * 98 / (n - 1)) + 1, 99.0)
+    rank[np.isnan(s)] = np.nan
+    return rank if np.ndim(score) == 2 else rank[0]
+
+
+def rank_panel(ind):
+    """全面板每一天的 RS 排名 (回測 / 重播 / 參數掃描用，面板需涵蓋全市場)"""
+    return percentile_rank(rs_score(ind))
+
+
+def latest_ranks(ind, pool=None):
+    """
+    各檔最新一根 K 棒的 RS 排名：回傳 (全體排名 Series, 與 ind 同形狀且只有最新一根有值的矩陣)
+    pool 為 {代號: 加權 ROC} 的全市場分數 (例如預篩索引)，ind 內的分數會覆蓋 pool；沒有 pool 時只在 ind 內排名
+    """
+    p = ind.panel
+    j = np.flatnonzero(ind.last >= 0)
+    i = ind.last[j]
+    fresh = pd.Series(rs_score(ind)[i, j], index=[p.tickers[x] for x in j], dtype=float)
+    scores = fresh if pool is None else pd.concat([pool.drop(fresh.index, errors='ignore'), fresh])
+    ranks = pd.Series(percentile_rank(scores.to_numpy()), index=scores.index).dropna()
+    out = np.full(p.close.shape, np.nan)
+    out[i, j] = ranks.reindex(fresh.index).to_numpy()
+    return ranks, out
+
+# ==========================================
+# 每日排名歷史 (價格庫目錄下)
+# ==========================================
+class RankHistory:
+    """日期 × 代號的 RS 排名 (uint8，0 = 沒有排名)；同一天重算直接覆蓋"""
+
+    def __init__(self, store, path=None):
+        self.path = path or os.path.join(store.root, RANK_FILE)
+
+    def load(self):
+        """回傳日期 × 代號的 float 表 (沒有排名為 NaN)"""
+        if os.path.exists(self.path):
+            try: return pd.read_parquet(self.path).replace(0, np.nan).astype(float)
+            except Exception as e: print(f"⚠️ RS 排名歷史無法讀取，重新建立: {e}")
+        return pd.DataFrame(dtype=float)
+
+    def update(self, ranks, date=None):
+        """ranks 為某日 {代號: 排名} 的 Series，或日期 × 代號的 DataFrame (整段回填)"""
+        new = ranks if isinstance(ranks, pd.DataFrame) else ranks.to_frame(pd.Timestamp(date)).T
+        old = self.load()
+        table = pd.concat([old.drop(new.index, errors='ignore'), new]).sort_index() if not old.empty else new
+        tmp = f"{self.path}.tmp"
+        table.fillna(0).astype(np.uint8).to_parquet(tmp)
+        os.replace(tmp, self.path)
+        return table
+
+    def series(self, ticker):
+        table = self.load()
+        return table[ticker].dropna() if ticker in table else pd.Series(dtype=float)
+
+    def trend(self, days=TREND_DAYS):
+        """最新排名與 days 個交易日前的差 (正值為轉強)"""
+        table = self.load()
+        if len(table) <= days: return pd.Series(dtype=float)
+        return (table.iloc[-1] - table.iloc[-1 - days]).dropna()
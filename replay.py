@@ -0,0 +1,131 @@
+import argparse
+import numpy as np
+import pandas as pd
+from tabulate import tabulate
+from indicators import build_panel, compute_indicators, shift
+from backtest import align_bench, MIN_BARS
+from funnel import chose_gates, drive_gates, CHOSE_SETUPS
+from ranking import rank_panel
+
+# ==========================================
+# ⚙️ 歷史重播設定
+# ==========================================
+HORIZONS = (5, 20, 60)  # 前瞻報酬天數
+REPLAY_DAYS = 750       # 預設重播最近 3 年
+OUT_FILE = 'replay_picks.csv'
+
+# ==========================================
+# 向量化選股 (日期 × 標的，關卡定義見 funnel)
+# ==========================================
+def _bench(bench_close, dates, period):
+    """各日期當下的大盤 ROC；取不到時為 0 (同 BenchmarkSeries.roc)"""
+    return np.nan_to_num(align_bench(bench_close.pct_change(period), dates)).reshape(-1, 1)
+
+
+def chose_matrix(ind, bench_close, system):
+    """回傳 (setup, rs)：setup 為 CHOSE_SETUPS 的索引 (0 = 未入選)，rs 為 RS 強度"""
+    g = chose_gates(ind, _bench(bench_close, ind.panel.dates, system.rs_period_chose), system)
+    return np.where(g.passed(), g.values['pattern'], 0), g.values['rs']
+
+
+def drive_matrix(ind, bench_close, system):
+    """回傳 (score, rs)：score 為 DRIVE 評分 (未達 30 分為 0)"""
+    g = drive_gates(ind, _bench(bench_close, ind.panel.dates, system.rs_period_drive), system)
+    return np.where(g.passed(), g.values['pattern'], 0), g.values['rs']
+
+
+def forward_returns(close, h):
+    """h 日後的報酬 (超出資料範圍或停牌為 NaN)"""
+    return shift(close[::-1], h)[::-1] / close - 1
+
+# ==========================================
+# 逐日重播
+# ==========================================
+def replay(frames, bench_close, system, start=None, end=None, days=None, names=None, horizons=HORIZONS):
+    """
+    以全市場面板重播每個交易日的 CHOSE / DRIVE 選股 (指標皆只用當日以前的資料)
+    start / end 限定日期範圍，days 只取範圍內最後 N 個交易日
+    回傳 DataFrame：每列為某日某策略的一檔入選標的與其前瞻報酬
+    """
+    names = names or {}
+    ind = compute_indicators(build_panel(frames), (system.rs_period_chose, system.rs_period_drive))
+    ind.values['rs_rank'] = rank_panel(ind)     # 每日全市場 RS 排名 (system.min_rank_* 與輸出欄位用)
+    p = ind.panel
+    rows = np.ones(len(p.dates), dtype=bool)
+    if start is not None: rows &= p.dates >= pd.Timestamp(start)
+    if end is not None: rows &= p.dates <= pd.Timestamp(end)
+    if days is not None: rows[np.flatnonzero(rows)[:-days]] = False
+
+    fwd = {h: p.per_ticker(lambda c: forward_returns(c, h), p.close) for h in horizons}     # 各檔自己的第 h 根 K 棒
+    setup, rs_c = chose_matrix(ind, bench_close, system)
+    score, rs_d = drive_matrix(ind, bench_close, system)
+
+    out = []
+    for strategy, hit, rs, label in (('CHOSE', setup, rs_c, lambda i, j: CHOSE_SETUPS[setup[i, j]]),
+                                     ('DRIVE', score, rs_d, lambda i, j: f"評分 {score[i, j]}")):
+        i, j = np.nonzero((hit > 0) & rows.reshape(-1, 1))
+        df = pd.DataFrame({
+            "日期": p.dates[i],
+            "策略": strategy,
+            "代號": [p.tickers[x] for x in j],
+            "名稱": [names.get(p.tickers[x], p.tickers[x]) for x in j],
+            "訊號": [label(a, b) for a, b in zip(i, j)],
+            "現價": np.round(p.close[i, j], 2),
+            "RS": np.round(rs[i, j], 1),
+            "RS排名": ind['rs_rank'][i, j],
+        })
+        for h in horizons:
+            df[f"{h}日報酬(%)"] = np.round(fwd[h][i, j] * 100, 2)
+        out.append(df)
+    return pd.concat(out, ignore_index=True).sort_values(['日期', '策略'], kind='stable').reset_index(drop=True)
+
+
+def summarize_picks(picks, horizons=HORIZONS):
+    """各策略的每日平均入選數、前瞻報酬平均與勝率"""
+    rows = []
+    days = picks['日期'].nunique()
+    for strategy, g in picks.groupby('策略'):
+        row = {"策略": strategy, "入選次數": len(g), "日均入選": round(len(g) / days, 1) if days else 0}
+        for h in horizons:
+            r = g[f"{h}日報酬(%)"].dropna()
+            row[f"{h}日平均(%)"] = round(float(r.mean()), 2) if len(r) else None
+            row[f"{h}日勝率(%)"] = round(float((r > 0).mean()) * 100, 1) if len(r) else None
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+# ==========================================
+# 主程式執行
+# ==========================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CHOSE / DRIVE 每日選股歷史重播")
+    parser.add_argument('--start', help="起始日 (預設為最近 750 個交易日)")
+    parser.add_argument('--end')
+    parser.add_argument('--synthetic', type=int, help="以 N 檔合成資料測試，不讀價格庫")
+    parser.add_argument('--out', default=OUT_FILE)
+    args = parser.parse_args()
+
+    from store import PriceStore
+    from main import StockSystem
+    if args.synthetic:
+        import os
+        import tempfile
+        from perf import synthetic_market, BACKTEST_DAYS
+        store = PriceStore(root=os.path.join(tempfile.gettempdir(), 'perf_prices'))
+        frames, bench_close = synthetic_market(args.synthetic, BACKTEST_DAYS)
+        universe = {}
+    else:
+        from fetch import get_universe
+        from market import get_benchmark
+        store = PriceStore()
+        universe = {s['ticker']: s['name'] for s in get_universe()}
+        print(f"🚀 載入全市場 {len(universe)} 檔 4 年資料...")
+        frames = {t: df for t, df in store.get(universe, '4y') if len(df) >= MIN_BARS}
+        bench_close = get_benchmark(store).close
+
+    days = None if args.start else REPLAY_DAYS
+    picks = replay(frames, bench_close, StockSystem(store=store), args.start, args.end, days, universe)
+    picks.to_csv(args.out, index=False, encoding='utf-8-sig')
+
+    print(f"\n📊 歷史重播：{picks['日期'].nunique()} 個交易日，{len(picks)} 筆入選")
+    print(tabulate(summarize_picks(picks), headers='keys', tablefmt='fancy_grid', showindex=False))
+    print(f"\n💾 每日入選清單已寫入 {args.out}")
@@ -0,0 +1,145 @@
+import io
+import re
+import csv
+import html
+from string import Template
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+from email.mime.application import MIMEApplication
+
+# ==========================================
+# ⚙️ 版面 (import 時預先編譯，每次寄信只做代換)
+# ==========================================
+STYLE = """
+    <style>
+        body { font-family: sans-serif; line-height: 1.6; color: #333; }
+        .title { background: #2c3e50; color: white; padding: 12px; margin-top: 25px; font-weight: bold; border-radius: 5px; }
+        .ai-box { background: #fffcf0; border: 1px solid #f1c40f; border-left: 6px solid #f1c40f; padding: 15px; margin: 15px 0; font-size: 14px; color: #7f8c8d; }
+        .table { border-collapse: collapse; width: 100%; font-size: 13px; margin-bottom: 20px; }
+        .table th, .table td { border: 1px solid #ddd; padding: 10px; text-align: left; }
+        .table th { background-color: #f8f9fa; }
+    </style>
+    """
+HEAD = Template("<html><head>$style</head><body><h2>$title</h2>")
+TITLE = Template("<div class='title'$attr>$title</div>")
+TITLE_COLOR = Template(" style='background:$color;'")
+PARAGRAPH = Template("<p>$text</p>")
+TABLE_HEAD = Template("<table class='table'><thead><tr>$cells</tr></thead><tbody>")
+TABLE_TAIL = "</tbody></table>"
+BOX_OPEN, BOX_CLOSE = "<div class='ai-box'>", "</div>"
+TAIL = "</body></html>"
+TEXT_RULE = "=" * 60
+
+_tags = re.compile(r"<[^>]+>")
+_breaks = re.compile(r"<br\s*/?>|<hr[^>]*>", re.I)
+
+# ==========================================
+# 共用表格 (list of dict 或 DataFrame，逐列輸出)
+# ==========================================
+def table_rows(data):
+    """回傳 (欄位, 逐列 tuple 的 iterator)；list of dict 的欄位依首次出現順序"""
+    if hasattr(data, 'itertuples'):
+        return list(data.columns), data.itertuples(index=False, name=None)
+    columns = list(dict.fromkeys(k for row in data for k in row))
+    return columns, (tuple(row.get(c, '') for c in columns) for row in data)
+
+
+def _cell(v):
+    return '' if v is None else str(v)
+
+
+def html_to_text(fragment):
+    return html.unescape(_tags.sub('', _breaks.sub('\n', fragment)))
+
+# ==========================================
+# 報告輸出器：區段一備妥就寫出，同時產生 HTML / 純文字 / CSV 附件
+# ==========================================
+class ReportWriter:
+    """
+    html / text 為可寫入的檔案物件 (預設 StringIO)；區段依呼叫順序寫出，不保留中間 DataFrame 或 HTML 片段
+    有 csv_name 的表格另存成 CSV 附件
+    title 為 None 時不寫檔頭，只作為可併入多份報告的共用片段 (見 extend)
+    """
+
+    def __init__(self, title=None, style=STYLE, html=None, text=None):
+        self.html = html if html is not None else io.StringIO()
+        self.text = text if text is not None else io.StringIO()
+        self.attachments = []   # [(檔名, bytes)]
+        if title is not None:
+            self.html.write(HEAD.substitute(style=style, title=_escape(title)))
+            self.text.write(f"{title}\n")
+
+    def title(self, text, color=None):
+        self.html.write(TITLE.substitute(title=_escape(text), attr=TITLE_COLOR.substitute(color=color) if color else ''))
+        self.text.write(f"\n{TEXT_RULE}\n{text}\n{TEXT_RULE}\n")
+
+    def paragraph(self, text):
+        self.html.write(PARAGRAPH.substitute(text=_escape(text)))
+        self.text.write(f"{text}\n")
+
+    def table(self, data, empty='', csv_name=None):
+        """data 為 list of dict 或 DataFrame；逐列同時寫出 HTML / 純文字 / CSV，沒有資料時輸出 empty"""
+        if data is None or len(data) == 0:
+            self.paragraph(empty)
+            return
+        columns, rows = table_rows(data)
+        self.html.write(TABLE_HEAD.substitute(cells=''.join(f"<th>{html.escape(str(c))}</th>" for c in columns)))
+        self.text.write(" | ".join(map(str, columns)) + "\n")
+        writer = None
+        if csv_name:
+            buf = io.StringIO()
+            writer = csv.writer(buf)
+            writer.writerow(columns)
+        fmt = "<tr>" + "<td>{}</td>" * len(columns) + "</tr>"   # 每列共用同一個格式字串
+        for row in rows:
+            cells = [_cell(v) for v in row]
+            self.html.write(fmt.format(*map(html.escape, cells)))
+            self.text.write(" | ".join(cells) + "\n")
+            if writer: writer.writerow(cells)
+        self.html.write(TABLE_TAIL)
+        if writer: self.attachments.append((csv_name, buf.getvalue().encode('utf-8-sig')))
+
+    def box(self, fragments, empty=''):
+        """醒目框：fragments 為逐段產生的 HTML (例如每檔診斷)，產生一段就寫一段"""
+        self.html.write(BOX_OPEN)
+        n = 0
+        for f in fragments:
+            self.html.write(f)
+            self.text.write(html_to_text(f) + "\n")
+            n += 1
+        if not n:
+            self.html.write(_escape(empty))
+            self.text.write(f"{empty}\n")
+        self.html.write(BOX_CLOSE)
+
+    def extend(self, fragment):
+        """併入已渲染好的共用片段 (例如多位收件人共用的市場掃描區段)"""
+        self.html.write(fragment.html.getvalue())
+        self.text.write(fragment.text.getvalue())
+        self.attachments.extend(fragment.attachments)
+
+    def close(self):
+        self.html.write(TAIL)
+        return self
+
+    def getvalue(self):
+        return self.html.getvalue()
+
+    def message(self, subject, sender, receiver):
+        """HTML + 純文字 (multipart/alternative)，CSV 以附件寄出"""
+        msg = MIMEMultipart('mixed')
+        msg['Subject'], msg['From'], msg['To'] = subject, sender, receiver
+        body = MIMEMultipart('alternative')
+        body.attach(MIMEText(self.text.getvalue(), 'plain', 'utf-8'))
+        body.attach(MIMEText(self.html.getvalue(), 'html', 'utf-8'))
+        msg.attach(body)
+        for name, data in self.attachments:
+            part = MIMEApplication(data, 'csv', Name=name)
+            part['Content-Disposition'] = f'attachment; filename="{name}"'
+            msg.attach(part)
+        return msg
+
+
+def _escape(text):
+    return html.escape(str(text), quote=False)
+
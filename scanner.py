@@ -0,0 +1,177 @@
+import importlib
+from tqdm import tqdm
+from fetch import get_universe
+from store import PriceStore
+from market import get_benchmark
+from indicators import build_panel, compute_indicators, ROC_PERIODS
+from prices import PriceBars
+from universe import UniverseIndex
+from incremental import StateBook
+from metrics import METRICS
+from funnel import Funnel, gate_table, skip_pairs, GATES
+from ranking import RankHistory, RANK_PERIODS, rs_score, latest_ranks
+
+# ==========================================
+# ⚙️ 掃描設定
+# ==========================================
+PERIOD = '13mo'         # 每檔讀取一次的資料長度 (各策略共用，確保 250 日窗口完整)
+PLUGIN_MODULES = ('main', 'chose', 'drive', 'health')
+PARALLEL_MIN_TICKERS = 1000     # 少於此數就在本行程分派：策略每檔約 0.1 ms，開行程池的成本更高
+
+# ==========================================
+# 策略註冊表
+# ==========================================
+class Strategy:
+    def __init__(self, name, fn, min_bars=0, prefilter=None, portfolio_only=False, gates=None):
+        self.name = name
+        self.fn = fn
+        self.min_bars = min_bars
+        self.prefilter = prefilter              # universe.Prefilter：可在下載前先剔除的基本門檻
+        self.portfolio_only = portfolio_only    # 只處理庫存標的
+        self.gates = gates                      # gates(ind, ctx) -> funnel.Gates：向量化的關卡判斷
+
+
+STRATEGIES = {}
+
+def register(name, min_bars=0, prefilter=None, portfolio_only=False, gates=None):
+    """
+    註冊策略外掛：fn(item, df, ctx) -> dict 或 None
+    item 為 {'ticker', 'name', 'industry'}，df 為單檔 PriceBars (OHLCV 陣列)，ctx 為 ScanContext
+    prefilter / portfolio_only 宣告策略需要哪些標的；所有策略都有宣告時才會預篩
+    gates 宣告與 fn 相同的向量化關卡，掃描時記錄漏斗並略過在型態以前就被剔除的標的
+    """
+    def decorator(fn):
+        STRATEGIES[name] = Strategy(name, fn, min_bars, prefilter, portfolio_only, gates)
+        return fn
+    return decorator
+
+
+def load_plugins(names=None):
+    """載入內建策略模組 (import 時自行註冊)；指定的策略都已註冊時不再 import"""
+    if names and all(n in STRATEGIES for n in names): return
+    for m in PLUGIN_MODULES:
+        importlib.import_module(m)
+
+
+class ScanContext:
+    """掃描期間各策略共用的資料：價格庫、大盤、庫存、全市場指標"""
+
+    def __init__(self, store, bench, portfolio, indicators, options):
+        self.store = store
+        self.bench = bench
+        self.portfolio = portfolio
+        self.indicators = indicators
+        self.options = options
+        self.cache = {}   # 策略自用的共用物件 (例如 StockSystem)
+
+    def bench_roc(self, period):
+        return self.bench.roc(period)
+
+    def snapshot(self, ticker):
+        return self.indicators.snapshot(ticker)
+
+# ==========================================
+# 單次全市場掃描
+# ==========================================
+def run_scan(names=None, universe=None, store=None, portfolio=None, period=PERIOD, roc_periods=ROC_PERIODS, workers=1, prefilter=False, incremental=False, funnel=False, rank=False, **options):
+    """
+    每檔只讀一次資料、只算一次指標，分派給所有策略；回傳 {策略名稱: [結果]}
+    workers > 1 且標的至少 PARALLEL_MIN_TICKERS 檔時依標的切片交給多個行程 (共享記憶體讀指標)，結果順序與單行程相同
+    prefilter=True 時先用全市場索引剔除不可能通過價格 / 均量 / Stage 2 的標的，只下載其餘標的
+    incremental=True 時指標由價格庫目錄下的滾動狀態逐日更新，結果與整段重算相同 (均線只差浮點捨入)
+    funnel=True 時有宣告 gates 的策略先整批判斷關卡並存入價格庫目錄下的每日漏斗，只把通過 RS 的標的交給外掛
+    rank=True 時以全市場加權 ROC 排出 1 ~ 99 的 RS 排名 (指標 rs_rank，ctx.snapshot 可取用) 並存入每日排名歷史；
+    有預篩時未下載的標的以預篩索引內的分數一起排名
+    """
+    load_plugins(names)
+    strategies = [STRATEGIES[n] for n in (names or STRATEGIES)]
+    store = store or PriceStore()
+    portfolio = portfolio or {}
+    if rank: roc_periods = tuple(dict.fromkeys(tuple(roc_periods) + RANK_PERIODS))
+
+    items = {s['ticker']: s for s in (universe if universe is not None else get_universe())}
+    for t in portfolio:
+        items.setdefault(t, {'ticker': t, 'name': t, 'industry': ''})
+
+    METRICS.count('universe', len(items))
+    index = None
+    if prefilter and strategies and all(s.prefilter or s.portfolio_only for s in strategies):
+        index = UniverseIndex(store)
+        index.refresh()
+        keep = set(index.candidates(items, [s.prefilter for s in strategies if s.prefilter])) | set(portfolio)
+        print(f"🧹 預篩：{len(items)} 檔中保留 {len(keep)} 檔")
+        METRICS.count('prefiltered', len(items) - len(keep & set(items)))
+        items = {t: it for t, it in items.items() if t in keep}
+
+    print(f"🚀 單次掃描 {len(items)} 檔標的，策略：{', '.join(s.name for s in strategies)}")
+    METRICS.count('scanned', len(items))
+    min_bars = min(s.min_bars for s in strategies) if strategies else 0
+    # 讀進來就轉成陣列容器，掃描期間不保留 DataFrame (等待下載 / 讀檔記在 fetch，轉換記在 parse)
+    frames = {}
+    for t, df in METRICS.iterate('fetch', tqdm(store.get(list(items), period), total=len(items))):
+        if len(df) < max(min_bars, 1): continue
+        with METRICS.stage('parse'): frames[t] = PriceBars.from_frame(df)
+    frames = {t: frames[t] for t in items if t in frames}
+    print(store.report.summary())
+    METRICS.count('loaded', len(frames))
+    METRICS.count('fetch_failed', len(store.report.failed))
+    METRICS.count('fetch_retries', store.report.retries)
+
+    with METRICS.stage('parse'):
+        panel = build_panel(frames)
+    with METRICS.stage('indicator'):
+        if incremental:
+            book = StateBook(store, roc_periods)
+            ind = book.indicators(panel, frames)
+            book.save()
+            print(f"📐 指標增量更新 {len(frames)} 檔，重建 {book.rebuilt} 檔")
+        else:
+            ind = compute_indicators(panel, roc_periods)
+        if rank: ind.values['rs_score'] = rs_score(ind)
+        if index is not None:
+            index.update(ind)
+            index.save()
+        if rank and frames:
+            # 每天一次排序：全市場 (預篩索引) 的分數一起排名
+            ranks, ind.values['rs_rank'] = latest_ranks(ind, index.table['rs_score'].dropna() if index is not None else None)
+            RankHistory(store).update(ranks, panel.dates[ind.last.max()])
+            print(f"🏅 RS 排名：{len(ranks)} 檔")
+    bench = get_benchmark(store)
+    ctx = ScanContext(store, bench, portfolio, ind, options)
+    skip = set()
+    if funnel and any(s.gates for s in strategies):
+        with METRICS.stage('strategy'):
+            table = gate_table(ind, {s.name: s.gates(ind, ctx) for s in strategies if s.gates})
+            Funnel(store).save(table)
+            skip = skip_pairs(table)
+        # 被略過的標的不會進外掛，剔除統計由漏斗補上
+        early = table[table['failed'].isin(GATES[:-1])]
+        for (name, gate), n in early.groupby(['strategy', 'failed'], observed=True).size().items(): METRICS.reject(name, gate, n)
+        print(f"🪜 漏斗：{len(skip)} 組 (策略, 標的) 在型態判斷前剔除")
+    with METRICS.stage('strategy'):
+        if workers and workers > 1 and len(frames) >= max(PARALLEL_MIN_TICKERS, 2):
+            from parallel import dispatch_parallel
+            hits, errors = dispatch_parallel(ind, items, [s.name for s in strategies], portfolio, options, bench.close, workers, skip)
+        else:
+            hits, errors = dispatch(frames.items(), strategies, items, ctx, skip)
+
+    results = {s.name: [] for s in strategies}
+    for name, r in hits: results[name].append(r)
+    for name, rows in results.items(): METRICS.count(f'hits:{name}', len(rows))
+    METRICS.count('errors', len(errors))
+    if errors: print(f"⚠️ 分析失敗 {len(errors)} 筆: {', '.join(list(errors)[:10])}")
+    return results
+
+
+def dispatch(frames, strategies, items, ctx, skip=()):
+    """依標的順序把每檔資料交給各策略 (略過 skip 內的 (策略, 代號))，回傳 ([(策略名稱, 結果)], {策略:代號: 錯誤})"""
+    hits, errors = [], {}
+    for t, df in frames:
+        for s in strategies:
+            if len(df) < s.min_bars or (s.name, t) in skip: continue
+            try:
+                r = s.fn(items[t], df, ctx)
+                if r: hits.append((s.name, r))
+            except Exception as e:
+                errors[f"{s.name}:{t}"] = e
+    return hits, errors
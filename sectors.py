@@ -0,0 +1,235 @@
+import os
+import argparse
+import numpy as np
+import pandas as pd
+from tabulate import tabulate
+from indicators import build_panel, compute_indicators, shift
+from prices import PriceBars
+from store import last_settled
+from universe import UniverseIndex
+
+# ==========================================
+# ⚙️ 產業輪動設定
+# ==========================================
+SECTOR_FILE = '_sectors.parquet'    # 存在價格庫目錄下，逐日累積
+PERIOD = '13mo'         # MA200 + 動能回看所需的資料長度
+RS_PERIOD = 20          # 產業 RS：成分股 RS 的等權平均 (同 CHOSE 的 20 日)
+MOMENTUM_PERIOD = 20    # 產業動能：等權產業指數的 20 日報酬
+RS_CHANGE = 5           # RS 變化：與 5 個交易日前相比 (輪動方向)
+MAX_AGE_DAYS = 7        # 快取超過 7 天沒更新就不拿來寫報告
+TOP = 10
+
+# ==========================================
+# 全部產業一次聚合 (日期 × 標的 -> 日期 × 產業)
+# ==========================================
+def membership(tickers, industries):
+    """回傳 (產業名稱, 標的 × 產業的 0/1 矩陣)；沒有產業別的標的不屬於任何產業"""
+    codes, sectors = pd.factorize(pd.Series([industries.get(t) or None for t in tickers], dtype=object), sort=True)
+    m = np.zeros((len(tickers), len(sectors)))
+    j = np.flatnonzero(codes >= 0)
+    m[j, codes[j]] = 1.0
+    return list(sectors), m
+
+
+def group_mean(x, m):
+    """x 為日期 × 標的 (NaN 不計)，一次矩陣乘法得到各產業的平均與有效檔數"""
+    valid = ~np.isnan(x)
+    n = valid.astype(float) @ m
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(valid, x, 0.0) @ m / n, n
+
+
+def aggregate(m, close, ma50, ma200, roc, prev_close, bench_roc):
+    """
+    各檔 (日期 × 標的) 的收盤 / 均線 / ROC 聚合成日期 × 產業：回傳 (members, rs, breadth50, breadth200, ret)
+    均線與 ROC 是各檔依自己的 K 棒算出，廣度只計當天有收盤且均線已成形的成分股
+    """
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rs = (roc - np.asarray(bench_roc).reshape(-1, 1)) * 100
+        above50 = np.where(np.isnan(ma50) | np.isnan(close), np.nan, close > ma50)
+        above200 = np.where(np.isnan(ma200) | np.isnan(close), np.nan, close > ma200)
+        daily = close / prev_close - 1
+    members = (~np.isnan(close)).astype(float) @ m
+    return (members,) + tuple(group_mean(x, m)[0] for x in (rs, above50, above200, daily))
+
+
+def sector_table(ind, industries, bench_roc, rs_period=RS_PERIOD, momentum_period=MOMENTUM_PERIOD, since=None):
+    """
+    ind 為全市場指標，industries 為 {代號: 產業}，bench_roc 為對齊日期的 rs_period 日大盤 ROC
+    回傳每個 (日期, 產業) 一列：members / rs / rs_change / breadth50 / breadth200 / momentum / ret (百分比；ret 為等權產業指數當日報酬)
+    since 有值時只輸出之後的日期，聚合也只算這些日期加上變化 / 動能的回看天數
+    """
+    p = ind.panel
+    sectors, m = membership(p.tickers, industries)
+    start = 0 if since is None else int(p.dates.searchsorted(pd.Timestamp(since), side='right'))
+    lo = max(start - max(RS_CHANGE, momentum_period), 0)
+    members, sector_rs, breadth50, breadth200, ret = aggregate(
+        m, p.close[lo:], ind['ma50'][lo:], ind['ma200'][lo:], ind[f'roc{rs_period}'][lo:], ind['prev_close'][lo:],
+        np.asarray(bench_roc).reshape(-1, 1)[lo:])
+    # 等權產業指數：成分股當日報酬平均後連乘
+    index = np.cumprod(1 + np.nan_to_num(ret), axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        momentum = index / shift(index, momentum_period) - 1
+
+    out = members > 0
+    out[:start - lo] = False    # 回看用的日期不輸出
+    d, k = np.nonzero(out)
+    return pd.DataFrame({
+        'date': p.dates[lo:][d],
+        'sector': np.array(sectors, dtype=object)[k],
+        'members': members[d, k].astype(np.int32),
+        'rs': sector_rs[d, k].astype(np.float32),
+        'rs_change': (sector_rs - shift(sector_rs, RS_CHANGE))[d, k].astype(np.float32),
+        'breadth50': (breadth50[d, k] * 100).astype(np.float32),
+        'breadth200': (breadth200[d, k] * 100).astype(np.float32),
+        'momentum': (momentum[d, k] * 100).astype(np.float32),
+        'ret': (ret[d, k] * 100).astype(np.float32),
+    })
+
+
+def index_table(table, history, industries, bench_roc, day, rs_period=RS_PERIOD, momentum_period=MOMENTUM_PERIOD):
+    """
+    由預篩索引 (universe.UniverseIndex.table) 算出 day 當天各產業一列，格式同 sector_table；不必載入全市場價格
+    只計當天有收盤的標的：掃描時完整計算 (asof == day)，或併入當天行情快照 (refreshed == day，均線 / ROC 沿用最後一次完整計算)
+    rs_change / momentum 由 history 前幾日的 rs / ret 接續；history 缺 ret 紀錄時回傳 None (需整段計算)
+    """
+    cols = ['close', 'ma50', 'ma200', f'roc{rs_period}', 'prev_close']
+    if history.empty or 'ret' not in history or any(k not in table for k in cols): return None
+    t = table[((table['asof'] == day) | (table['refreshed'] == day)) & table.index.isin(list(industries))]
+    if t.empty: return None
+    rs_hist = history.pivot(index='date', columns='sector', values='rs')
+    ret_hist = history.pivot(index='date', columns='sector', values='ret')
+    back = ret_hist.iloc[-(momentum_period - 1):]
+    if back.isna().all(axis=1).any(): return None
+
+    sectors, m = membership(list(t.index), industries)
+    members, rs, breadth50, breadth200, ret = (x[0] for x in aggregate(m, *[t[k].to_numpy(dtype=float).reshape(1, -1) for k in cols], [bench_roc]))
+    rs_back = rs_hist.iloc[-RS_CHANGE].reindex(sectors).to_numpy(dtype=float) if len(rs_hist) >= RS_CHANGE else np.nan
+    with np.errstate(invalid='ignore'):
+        # 等權產業指數 momentum_period 日報酬 = 前幾日與今日的 (1 + 當日報酬) 連乘
+        prior = np.prod(1 + back.reindex(columns=sectors).fillna(0).to_numpy(dtype=float) / 100, axis=0)
+        momentum = prior * (1 + np.nan_to_num(ret)) - 1 if len(ret_hist) >= momentum_period else np.full(len(sectors), np.nan)
+    k = np.flatnonzero(members > 0)
+    return pd.DataFrame({
+        'date': pd.DatetimeIndex([day] * len(k)),
+        'sector': np.array(sectors, dtype=object)[k],
+        'members': members[k].astype(np.int32),
+        'rs': rs[k].astype(np.float32),
+        'rs_change': (rs - rs_back)[k].astype(np.float32),
+        'breadth50': (breadth50[k] * 100).astype(np.float32),
+        'breadth200': (breadth200[k] * 100).astype(np.float32),
+        'momentum': (momentum[k] * 100).astype(np.float32),
+        'ret': (ret[k] * 100).astype(np.float32),
+    })
+
+# ==========================================
+# 逐日累積的產業歷史 (價格庫目錄下)
+# ==========================================
+class SectorHistory:
+    """產業指標的每日紀錄；update 時新算的日期覆蓋舊紀錄，更早的歷史保留"""
+
+    def __init__(self, store, path=None):
+        self.path = path or os.path.join(store.root, SECTOR_FILE)
+
+    def load(self):
+        if os.path.exists(self.path):
+            try: return pd.read_parquet(self.path)
+            except Exception as e: print(f"⚠️ 產業歷史無法讀取，重新建立: {e}")
+        return pd.DataFrame()
+
+    def last_date(self):
+        table = self.load()
+        return table['date'].max() if not table.empty else None
+
+    def update(self, table):
+        old = self.load()
+        if not old.empty: table = pd.concat([old[~old['date'].isin(table['date'])], table], ignore_index=True)
+        table = table.sort_values(['date', 'sector'], kind='stable').reset_index(drop=True)
+        tmp = f"{self.path}.tmp"
+        table.to_parquet(tmp, index=False)
+        os.replace(tmp, self.path)
+        return table
+
+    def latest(self, max_age_days=MAX_AGE_DAYS, now=None):
+        """最近一日各產業 (依 RS 由強到弱)；沒有紀錄或已過時回傳空表"""
+        table = self.load()
+        if table.empty: return table
+        day = table['date'].max()
+        now = pd.Timestamp(now) if now is not None else pd.Timestamp.now()
+        if day < now.normalize() - pd.Timedelta(days=max_age_days): return table.iloc[:0]
+        return table[table['date'] == day].sort_values('rs', ascending=False, kind='stable').reset_index(drop=True)
+
+
+def update_sectors(store, universe=None, bench=None, force=False):
+    """
+    以全市場 (不經預篩) 計算產業指標，只把歷史還沒有的日期接上；最近一個收盤日已算過就直接讀快取
+    歷史只差一個交易日且預篩索引已有當天收盤時直接由索引接上 (不載入全市場價格)，否則載入全市場計算
+    force=True 時整段重算並覆蓋
+    universe 為 get_universe() 格式，bench 為 market.BenchmarkSeries
+    """
+    history = SectorHistory(store)
+    last = history.last_date()
+    if not force and last is not None and last >= pd.Timestamp(last_settled().date()):
+        return history.load()
+    if universe is None:
+        from fetch import get_universe
+        universe = get_universe()
+    if bench is None:
+        from market import get_benchmark
+        bench = get_benchmark(store)
+    industries = {s['ticker']: s['industry'] for s in universe}
+    pending = bench.close.index[bench.close.index > last] if not force and last is not None else []
+    if len(pending) == 1:
+        day = pending[0]
+        table = index_table(UniverseIndex(store).table, history.load(), industries, float(np.nan_to_num(bench.roc_series(RS_PERIOD, [day])[0])), day)
+        if table is not None:
+            print(f"🧭 產業輪動：由預篩索引接上 {day:%Y-%m-%d} ({int(table['members'].sum())} 檔)")
+            return history.update(table)
+    print(f"🧭 產業輪動：載入全市場 {len(industries)} 檔...")
+    frames = {t: PriceBars.from_frame(df) for t, df in store.get(list(industries), PERIOD)}
+    ind = compute_indicators(build_panel(frames), (RS_PERIOD,))
+    bench_roc = np.nan_to_num(bench.roc_series(RS_PERIOD, ind.panel.dates))
+    table = sector_table(ind, industries, bench_roc, since=None if force else last)
+    if table.empty: return history.load()
+    print(f"🧭 產業輪動：新增 {table['date'].nunique()} 個交易日")
+    return history.update(table)
+
+# ==========================================
+# 報告用表格
+# ==========================================
+def report_table(latest, n=TOP):
+    """latest 為 SectorHistory.latest()，取 RS 前 n 名並換成報告欄名"""
+    df = latest.head(n)
+    return pd.DataFrame({
+        "產業": df['sector'],
+        "檔數": df['members'],
+        "RS": df['rs'].astype(float).round(1),
+        "RS 5日變化": df['rs_change'].astype(float).round(1),
+        "站上MA50(%)": df['breadth50'].astype(float).round(1),
+        "站上MA200(%)": df['breadth200'].astype(float).round(1),
+        "20日動能(%)": df['momentum'].astype(float).round(2),
+    })
+
+
+def leaders(latest, n=3):
+    return latest['sector'].head(n).tolist()
+
+# ==========================================
+# 主程式執行
+# ==========================================
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="全市場產業輪動 (RS / 廣度 / 動能)")
+    parser.add_argument('--force', action='store_true', help="今天已算過也重算")
+    parser.add_argument('--sector', help="印出單一產業的歷史")
+    parser.add_argument('--top', type=int, default=TOP)
+    args = parser.parse_args()
+
+    from store import PriceStore
+    store = PriceStore()
+    table = update_sectors(store, force=args.force)
+    if args.sector:
+        hist = table[table['sector'] == args.sector].tail(args.top)
+        print(tabulate(hist, headers='keys', tablefmt='fancy_grid', showindex=False))
+    else:
+        print(f"\n📊 產業輪動 (RS 前 {args.top} 名)")
+        print(tabulate(report_table(SectorHistory(store).latest(), args.top), headers='keys', tablefmt='fancy_grid', showindex=False))
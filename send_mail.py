@@ -1,62 +1,60 @@
 import os
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-import io
-from contextlib import redirect_stdout
-
-# 導入你的三個腳本功能 (假設你已將原檔放在同層目錄)
-# 注意：需將原檔中的執行部分 (if __name__ == "__main__":) 稍微修改或確保能被 import
+
+# 導入三個腳本的進入點 (import 時不會執行掃描，每個掃描只在下方呼叫時跑一次)
 import health
 import chose
 import drive
-
-def run_and_capture(func, *args):
-    f = io.StringIO()
-    with redirect_stdout(f):
-        func(*args)
-    return f.getvalue()
-
-def send_email(content):
+from scanner import run_scan
+from metrics import METRICS
+from report import ReportWriter
+from mailer import Mailer, load_subscribers
+
+def build_report(results):
+    """三份報告共用同一個表格輸出器：HTML 表格 + 純文字 + CSV 附件"""
+    rep = ReportWriter("📊 台股自動化分析報告")
+
+    rep.title("🏥 庫存健檢報告")
+    rep.table(results['health'], "無資料", 'health.csv')
+    if results['health']:
+        for tip in health.TIPS: rep.paragraph(tip)
+
+    rep.title("🚀 黃金買點掃描")
+    if results['chose']:
+        rep.table(chose.report_table(results['chose']), csv_name='chose.csv')
+        for tip in chose.TIPS: rep.paragraph(tip)
+    else:
+        rep.paragraph(chose.EMPTY)
+
+    rep.title("👑 DRIVE 終極模型")
+    if results['drive']:
+        df_res, top_industries = drive.report_table(results['drive'])
+        rep.paragraph(f"🔥 資金流向最強的三大板塊：{', '.join(top_industries)}")
+        rep.table(df_res, csv_name='drive.csv')
+        for tip in drive.TIPS: rep.paragraph(tip)
+    else:
+        rep.paragraph(drive.EMPTY)
+    return rep.close()
+
+def send_email(rep):
     sender = os.environ['GMAIL_USER']
     password = os.environ['GMAIL_APP_PASSWORD']
-    receiver = os.environ['RECEIVER_EMAIL']
-
-    msg = MIMEMultipart()
-    msg['Subject'] = "📈 每日台股策略與健檢報告"
-    msg['From'] = sender
-    msg['To'] = receiver
-
-    # 將內容包裝在 <pre> 標籤中保持表格格式
-    html_content = f"""
-    <html>
-      <body style="font-family: monospace;">
-        <h2>📊 台股自動化分析報告</h2>
-        <pre>{content}</pre>
-      </body>
-    </html>
-    """
-    msg.attach(MIMEText(html_content, 'html'))
-
-    with smtplib.SMTP_SSL('smtp.gmail.com', 465) as server:
-        server.login(sender, password)
-        server.send_message(msg)
+    # RECEIVER_EMAIL 可用逗號分隔多位收件人，同一份報告經同一個連線寄出
+    receivers = [s['email'] for s in load_subscribers(path=None, receivers=os.environ['RECEIVER_EMAIL'])]
+
+    messages = [rep.message("📈 每日台股策略與健檢報告", sender, r) for r in receivers]
+
+    with METRICS.stage('smtp'), Mailer(user=sender, password=password) as mailer:
+        mailer.deliver(messages)
 
 if __name__ == "__main__":
-    report = ""
-    
-    print("Executing Health Check...")
-    report += "=== 🏥 庫存健檢報告 ===\n"
-    # 傳入你在 health.py 定義的 portfolio
-    report += run_and_capture(health.health_check, health.MY_PORTFOLIO) 
-    
-    print("Executing Chose Scan...")
-    report += "\n=== 🚀 黃金買點掃描 ===\n"
-    report += run_and_capture(chose.run_screening)
-    
-    print("Executing DRIVE Scan...")
-    report += "\n=== 👑 DRIVE 終極模型 ===\n"
-    report += run_and_capture(drive.run_drive_full_scan)
+    # 健檢 / CHOSE / DRIVE 共用同一次全市場下載
+    print("Executing Unified Scan...")
+    results = run_scan(['health', 'chose', 'drive'], portfolio=health.MY_PORTFOLIO, prefilter=True)
+
+    print("Rendering Report...")
+    with METRICS.stage('render'):
+        rep = build_report(results)
 
     print("Sending Email...")
-    send_email(report)
\ No newline at end of file
+    send_email(rep)
+    print(METRICS.summary())
\ No newline at end of file
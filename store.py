@@ -0,0 +1,115 @@
+import os
+import pandas as pd
+from fetch import YahooProvider, FetchReport, iter_fetch, make_jobs, period_offset, CHUNK_SIZE
+
+# ==========================================
+# ⚙️ 價格庫設定
+# ==========================================
+STORE_DIR = os.environ.get('PRICE_STORE', os.path.join('data', 'prices'))
+HISTORY = '4y'          # 首次建檔抓取長度 (回測需要 4 年)
+OVERLAP = 2             # 增量更新時重抓最後幾根 K 棒 (核對除權息調整 + 覆蓋盤中未收盤的 K 棒)
+SETTLE_TIME = '14:30'   # 台北時間收盤後資料定案，之後寫入的檔案當天不再重抓
+
+# ==========================================
+# 本機 OHLCV 價格庫
+# ==========================================
+class PriceStore:
+    """每檔一個 parquet 的本機價格庫，只補抓最後一根 K 棒之後的資料"""
+
+    def __init__(self, root=STORE_DIR, provider=None, history=HISTORY, chunk_size=CHUNK_SIZE):
+        self.root = root
+        self.provider = provider or YahooProvider()
+        self.history = history
+        self.chunk_size = chunk_size
+        self._fresh = set()   # 本次執行已更新過的標的
+        self.report = FetchReport()
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, ticker):
+        return os.path.join(self.root, f"{ticker}.parquet")
+
+    def load(self, ticker, period=None):
+        """讀取本機資料；period 例如 '1y' 只回傳最近一段"""
+        path = self.path(ticker)
+        if not os.path.exists(path): return None
+        return tail(pd.read_parquet(path), period)
+
+    def save(self, ticker, df):
+        df.to_parquet(self.path(ticker))
+
+    def is_current(self, ticker, settled=None):
+        """檔案在最近一次收盤定案之後寫入 → 今天不必再抓"""
+        path = self.path(ticker)
+        settled = settled if settled is not None else last_settled()
+        return os.path.exists(path) and os.path.getmtime(path) >= settled.timestamp()
+
+    def refresh(self, tickers):
+        """
+        補齊資料並逐檔產出完整歷史 (下載完成一檔就交出一檔)
+        沒建檔的抓完整歷史，已建檔的依最後日期分組只抓新 K 棒
+        """
+        missing, groups, cached = [], {}, {}
+        settled = last_settled()
+        for t in tickers:
+            df = self.load(t)
+            if t in self._fresh or self.is_current(t, settled):
+                if df is not None: yield t, df
+                continue
+            if df is None or len(df) < OVERLAP:
+                missing.append(t)
+                continue
+            cached[t] = df
+            groups.setdefault(df.index[-OVERLAP], []).append(t)
+
+        jobs = [job for start, group in groups.items() for job in make_jobs(group, self.chunk_size, start=start.strftime('%Y-%m-%d'))]
+        jobs += make_jobs(missing, self.chunk_size, period=self.history)
+        refetch = {}
+        for t, new in iter_fetch(jobs, self.provider, self.report):
+            if t in cached:
+                old = cached.pop(t)
+                start = old.index[-OVERLAP]
+                # 重疊的已收盤 K 棒若價格不同 (除權息後還原價變動)，整段重抓
+                if start not in new.index or abs(float(new['Close'].loc[start]) / float(old['Close'].loc[start]) - 1) > 1e-6:
+                    refetch[t] = old
+                    continue
+                new = pd.concat([old[old.index < start], new])
+            self.save(t, new)
+            self._fresh.add(t)
+            yield t, new
+
+        for t, df in iter_fetch(make_jobs(list(refetch), self.chunk_size, period=self.history), self.provider, self.report):
+            self.save(t, df)
+            self._fresh.add(t)
+            yield t, df
+
+        # 下載失敗的標的沿用本機舊資料，並標記避免同一次執行反覆重試
+        for t, df in list(cached.items()) + list(refetch.items()):
+            if t not in self._fresh: yield t, df
+        self._fresh.update(tickers)
+
+    def get(self, tickers, period=None):
+        """逐檔產出 (ticker, df)，順序依下載完成先後"""
+        for t, df in self.refresh(list(tickers)):
+            if not df.empty: yield t, tail(df, period)
+
+    def frame(self, ticker, period=None):
+        """單檔讀取 (必要時先更新)，找不到回傳空 DataFrame"""
+        for _, df in self.get([ticker], period):
+            return df
+        return pd.DataFrame()
+
+
+def last_settled(now=None):
+    """最近一個交易日 (週一至週五) 收盤定案的時間點"""
+    now = now or pd.Timestamp.now(tz='Asia/Taipei')
+    t = pd.Timestamp(f"{now.strftime('%Y-%m-%d')} {SETTLE_TIME}", tz='Asia/Taipei')
+    if now < t: t -= pd.Timedelta(days=1)
+    while t.weekday() >= 5: t -= pd.Timedelta(days=1)
+    return t
+
+
+def tail(df, period):
+    """只保留最近 period ('6mo', '1y', '4y') 的資料"""
+    if period and not df.empty:
+        df = df[df.index > df.index[-1] - period_offset(period)]
+    return df
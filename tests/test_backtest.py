@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+from perf import synthetic_market
+from backtest import backtest_frame, backtest_reference, BACKTEST_BARS, MIN_BARS
+
+# ==========================================
+# 向量化回測必須與逐根原始版本完全一致
+# ==========================================
+N_TICKERS = 12
+
+
+def _market(days, seed):
+    frames, bench = synthetic_market(N_TICKERS, days, seed=seed)
+    return list(frames.values()), bench.pct_change(20)
+
+
+@pytest.mark.parametrize('days', [BACKTEST_BARS + 300, BACKTEST_BARS - 100, MIN_BARS - 1, MIN_BARS, MIN_BARS + 1, MIN_BARS + 20])
+def test_matches_reference(days):
+    frames, bench_roc = _market(days, seed=days)
+    for df in frames:
+        assert backtest_frame(df, bench_roc) == backtest_reference(df, bench_roc)
+
+
+def test_matches_reference_with_nan_gaps():
+    frames, bench_roc = _market(BACKTEST_BARS + 300, seed=7)
+    rng = np.random.default_rng(7)
+    for df in frames:
+        # 停牌：整列 OHLCV 為 NaN
+        gaps = rng.choice(len(df), 15, replace=False)
+        df.iloc[gaps] = np.nan
+        assert backtest_frame(df, bench_roc) == backtest_reference(df, bench_roc)
+
+
+def test_bench_missing_dates_default_to_zero():
+    frames, bench_roc = _market(BACKTEST_BARS + 300, seed=11)
+    bench_roc = bench_roc.iloc[::2]     # 大盤缺一半日期，兩邊都補 0
+    for df in frames:
+        assert backtest_frame(df, bench_roc) == backtest_reference(df, bench_roc)
+
+
+def test_bench_as_dict():
+    """perf.py / send_email 以 dict 傳入大盤 ROC"""
+    frames, bench_roc = _market(BACKTEST_BARS + 300, seed=13)
+    bench_roc = bench_roc.to_dict()
+    for df in frames:
+        assert backtest_frame(df, bench_roc) == backtest_reference(df, bench_roc)
@@ -0,0 +1,55 @@
+import time
+import threading
+import pandas as pd
+from fetch import FetchReport, iter_fetch, make_jobs
+
+# ==========================================
+# 下載管線：併發上限與逾時都交給 provider
+# ==========================================
+class SlowProvider:
+    """記錄同時進行的呼叫數；timeout 內沒完成就丟出逾時 (如同 HTTP 請求逾時)"""
+
+    def __init__(self, concurrency=None, delay=0.02, hang=()):
+        if concurrency is not None: self.concurrency = concurrency
+        self.delay, self.hang = delay, set(hang)
+        self.active = self.peak = 0
+        self.timeouts = []
+        self._lock = threading.Lock()
+
+    def download(self, tickers, timeout=None, **kwargs):
+        with self._lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        try:
+            self.timeouts.append(timeout)
+            if self.hang & set(tickers): raise TimeoutError('read timed out')
+            time.sleep(self.delay)
+            return {t: pd.DataFrame({'Close': [1.0]}) for t in tickers}
+        finally:
+            with self._lock: self.active -= 1
+
+
+def _fetch(provider, tickers, **kwargs):
+    report = FetchReport()
+    got = dict(iter_fetch(make_jobs(tickers, 2), provider, report, **kwargs))
+    return got, report
+
+
+def test_provider_concurrency_caps_batches():
+    tickers = [f"{i}.TW" for i in range(16)]
+    serial = SlowProvider(concurrency=1)
+    got, _ = _fetch(serial, tickers)
+    assert sorted(got) == sorted(tickers) and serial.peak == 1
+
+    parallel = SlowProvider(delay=0.1)
+    _fetch(parallel, tickers, concurrency=4)
+    assert 1 < parallel.peak <= 4
+
+
+def test_timeout_is_passed_to_provider_and_retried():
+    provider = SlowProvider(concurrency=1, hang={'1.TW'})
+    got, report = _fetch(provider, ['0.TW', '1.TW', '2.TW'], timeout=5, retries=1, backoff=0)
+    assert set(got) == {'0.TW', '2.TW'}
+    assert set(provider.timeouts) == {5}
+    assert 'timed out' in report.failed['1.TW']
+    assert provider.active == 0     # 逾時的呼叫已結束，沒有留在背景執行緒
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+from perf import synthetic_market
+from store import PriceStore
+from fetch import FixtureProvider
+from scanner import run_scan
+from metrics import METRICS
+from funnel import Funnel
+
+# ==========================================
+# 漏斗先剔除的標的不影響掃描結果 (含缺 K 棒的標的)
+# ==========================================
+NAMES = ['main.chose', 'main.drive']     # 有宣告 gates 的策略
+
+
+@pytest.fixture
+def market(tmp_path):
+    frames, bench = synthetic_market(200, 300, seed=9)
+    rng = np.random.default_rng(9)
+    store = PriceStore(root=str(tmp_path), provider=FixtureProvider(str(tmp_path / 'none')))
+    for k, (t, df) in enumerate(frames.items()):
+        if k % 4 == 0: df = df.drop(df.index[rng.choice(len(df) - 1, 3, replace=False)])
+        store.save(t, df)
+    store.save('0050.TW', bench.to_frame('Close').assign(Open=bench, High=bench, Low=bench, Volume=1e6))
+    universe = [{'ticker': t, 'name': t, 'industry': ''} for t in frames]
+    return store, universe
+
+
+def _scan(market, funnel):
+    store, universe = market
+    METRICS.reset()
+    hits = run_scan(NAMES, universe=universe, store=store, funnel=funnel)
+    return hits, METRICS.snapshot()['gates']
+
+
+def test_funnel_matches_full_scan(market):
+    full, full_gates = _scan(market, False)
+    hits, gates = _scan(market, True)
+    assert all(full.values())
+    assert hits == full
+    # 漏斗補上的剔除統計與外掛逐檔判斷相同
+    assert gates == full_gates
+
+    table = Funnel(market[0]).load()
+    assert len(table) == len(NAMES) * len(market[1])
+    assert (table['failed'] != '').sum() == sum(sum(g.values()) for g in full_gates.values())
@@ -0,0 +1,67 @@
+import json
+import numpy as np
+import pandas as pd
+from perf import synthetic_market
+from store import PriceStore
+from fetch import FixtureProvider
+from indicators import compute_frame
+from health import check_position, health_check_all, load_portfolios, positions_frame
+
+# ==========================================
+# 多帳戶健檢與逐檔 check_position 一致
+# ==========================================
+FACTORS = (0.5, 0.75, 0.9, 0.97, 1.0, 1.03, 1.2)    # 成本 = 最新收盤 × 係數：涵蓋停損 / 保本 / 3R / 均線各種情況
+PCTS = (0.05, 0.07, 0.10)
+
+
+def _market(tmp_path):
+    frames, _ = synthetic_market(6, 300, seed=31)
+    # 持股缺一根別檔有的 K 棒 (倒數第 10 根)，均線仍要照常算出
+    t = list(frames)[0]
+    frames[t] = frames[t].drop(frames[t].index[-10])
+    store = PriceStore(root=str(tmp_path), provider=FixtureProvider(str(tmp_path / 'none')))
+    for k, df in frames.items(): store.save(k, df)
+    return frames, store
+
+
+def _positions(frames):
+    rows = []
+    for n, (t, df) in enumerate(frames.items()):
+        close = float(df['Close'].iloc[-1])
+        for k, (f, pct) in enumerate((f, p) for f in FACTORS for p in PCTS):
+            rows.append({'account': f"acct{(n + k) % 3}", 'ticker': t, 'cost': round(close * f, 2), 'stop_loss_pct': pct})
+    return pd.DataFrame(rows)
+
+
+def test_kotter_matches_check_position(tmp_path):
+    frames, store = _market(tmp_path)
+    positions = _positions(frames)
+    universe = [{'ticker': t, 'name': t, 'industry': ''} for t in frames]
+    got = health_check_all(positions, store, universe)
+
+    snaps = {t: compute_frame(df) for t, df in frames.items()}
+    expected = pd.DataFrame([check_position(r.ticker, {'cost': r.cost, 'stop_loss_pct': r.stop_loss_pct}, snaps[r.ticker])
+                             for r in positions.itertuples()])
+    assert not np.isnan(snaps[list(frames)[0]]['ma50'])
+    assert got['帳戶'].tolist() == positions['account'].tolist()
+    pd.testing.assert_frame_equal(got.drop(columns='帳戶'), expected, check_dtype=False)
+    assert got['建議動作'].nunique() >= 3
+
+
+def test_load_portfolios(tmp_path):
+    with open(tmp_path / 'alice.json', 'w', encoding='utf-8') as f:
+        json.dump({'2317.TW': {'cost': 100, 'stop_loss_pct': 0.07}, '2330.TW': {'cost': 500.5, 'stop_loss_pct': 0.05}}, f)
+    (tmp_path / 'bob.csv').write_text("ticker,cost,stop_loss_pct\n0050,120,0.07\n", encoding='utf-8')
+    (tmp_path / 'family.csv').write_text("account,ticker,cost,stop_loss_pct\nmom,2317.TW,90,0.07\ndad,2317.TW,95,0.06\n", encoding='utf-8')
+    (tmp_path / 'notes.txt').write_text("略過", encoding='utf-8')
+
+    df = load_portfolios(sorted(str(p) for p in tmp_path.iterdir()))
+    assert df.columns.tolist() == ['account', 'ticker', 'cost', 'stop_loss_pct']
+    assert df['account'].tolist() == ['alice', 'alice', 'bob', 'mom', 'dad']
+    assert df['ticker'].tolist() == ['2317.TW', '2330.TW', '0050', '2317.TW', '2317.TW']     # 代號保留前導 0
+    assert df['cost'].tolist() == [100.0, 500.5, 120.0, 90.0, 95.0]
+
+
+def test_load_portfolios_default():
+    default = {'2317.TW': {'cost': 227.2, 'stop_loss_pct': 0.07}}
+    pd.testing.assert_frame_equal(load_portfolios([], default), positions_frame(default))
@@ -0,0 +1,71 @@
+import os
+import numpy as np
+import pytest
+from perf import synthetic_market
+from store import PriceStore
+from fetch import FixtureProvider
+from prices import PriceBars
+from indicators import compute_frame, ROC_PERIODS
+from incremental import IndicatorState, StateBook
+
+# ==========================================
+# 增量狀態的最新一根指標必須與整段重算一致
+# ==========================================
+TICKER = '1000.TW'
+ROC = ROC_PERIODS + (252,)
+PRICES = ['Open', 'High', 'Low', 'Close']
+
+
+def _frame(days, seed=3, gaps=0):
+    frames, _ = synthetic_market(1, days, seed=seed)
+    df = frames[TICKER]
+    if gaps:
+        rows = np.random.default_rng(seed).choice(len(df), gaps, replace=False)
+        df.iloc[rows] = np.nan   # 停牌
+    return df
+
+
+def _assert_snap(snap, df):
+    """均線 / 均量在增量路徑為精確加總，整段重算為一般前綴和，只允許捨入誤差"""
+    ref = compute_frame(df, ROC)
+    assert snap.keys() == ref.keys()
+    for k in ref:
+        np.testing.assert_allclose(snap[k], ref[k], rtol=1e-9, equal_nan=True, err_msg=k)
+
+
+@pytest.mark.parametrize('gaps', [0, 12])
+def test_snap_matches_compute_frame_after_appends(gaps):
+    df = _frame(700, gaps=gaps)
+    state = IndicatorState(ROC).extend(PriceBars.from_frame(df.iloc[:400]))
+    _assert_snap(state.snap, df.iloc[:400])
+    # 每天加入一根 K 棒
+    for end in range(401, len(df) + 1):
+        state.extend(PriceBars.from_frame(df.iloc[:end]), end - 1)
+        if end % 50 == 0 or end == len(df): _assert_snap(state.snap, df.iloc[:end])
+
+
+def test_snap_matches_compute_frame_after_dividend_rewrite(tmp_path):
+    df = _frame(700)
+    fixtures = tmp_path / 'fixtures'
+    fixtures.mkdir()
+    store = PriceStore(root=str(tmp_path / 'store'), provider=FixtureProvider(str(fixtures)))
+    old = df.iloc[:-1]
+    store.save(TICKER, old)
+    os.utime(store.path(TICKER), (0, 0))    # 昨天收盤前寫入：今天需要更新
+
+    book = StateBook(store, ROC)
+    book.sync(TICKER, old)
+    _assert_snap(book.states[TICKER].snap, old)
+
+    # 今天除息：來源把今天以前的價格全部往下還原，store.refresh 核對重疊 K 棒後整段重抓
+    adjusted = df.copy()
+    adjusted.loc[adjusted.index < adjusted.index[-1], PRICES] *= 0.97
+    adjusted.to_csv(fixtures / f'{TICKER}.csv')
+    new = store.frame(TICKER)
+    assert len(new) == len(df)
+    assert new['Close'].iloc[0] == pytest.approx(df['Close'].iloc[0] * 0.97)
+
+    state = book.sync(TICKER, new)
+    assert book.rebuilt == 2
+    assert state.asof == new.index[-1]
+    _assert_snap(state.snap, new)
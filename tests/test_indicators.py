@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+from perf import synthetic_market
+from indicators import build_panel, compute_indicators, compute_frame
+from backtest import chose_features, align_bench, RS_PERIOD
+
+# ==========================================
+# 全市場面板與逐檔計算一致 (缺日、停牌、歷史長短不一)
+# ==========================================
+ROC = (20, 60)
+
+
+def _ragged_market(seed=21):
+    """各檔歷史長短不一、缺幾根別檔有的 K 棒，另有整列 NaN 的停牌日"""
+    frames, bench = synthetic_market(8, 400, seed=seed)
+    rng = np.random.default_rng(seed)
+    out = {}
+    for k, (t, df) in enumerate(frames.items()):
+        df = df.iloc[rng.integers(0, 120):len(df) - rng.integers(0, 3)]
+        if k % 2: df = df.drop(df.index[rng.choice(len(df) - 1, 3, replace=False)])     # 缺 K 棒
+        if k % 3 == 0: df.iloc[rng.choice(len(df), 2, replace=False)] = np.nan           # 停牌
+        out[t] = df
+    # 倒數 30 根缺一根：均線與 ROC 仍要接續
+    t = list(out)[0]
+    out[t] = out[t].drop(out[t].index[-30])
+    return out, bench
+
+
+def test_snapshot_matches_compute_frame():
+    frames, _ = _ragged_market()
+    ind = compute_indicators(build_panel(frames), ROC)
+    assert ind.panel.present is not None
+    for t, df in frames.items():
+        snap, ref = ind.snapshot(t), compute_frame(df, ROC)
+        assert snap.keys() == ref.keys()
+        for k in ref:
+            np.testing.assert_array_equal(snap[k], ref[k], err_msg=f"{t} {k}")
+
+
+def test_every_bar_matches_single_ticker():
+    frames, _ = _ragged_market(seed=22)
+    panel = build_panel(frames)
+    ind = compute_indicators(panel, ROC)
+    for t, df in frames.items():
+        one = compute_indicators(build_panel({t: df}), ROC)
+        rows = panel.dates.get_indexer(df.index)
+        j = panel.col[t]
+        for k, v in one.values.items():
+            np.testing.assert_array_equal(ind[k][rows, j], v[:, 0], err_msg=f"{t} {k}")
+        # 別檔才有的日期不是這檔的 K 棒
+        others = np.setdiff1d(np.arange(len(panel.dates)), rows)
+        assert np.isnan(ind['ma20'][others, j]).all()
+
+
+@pytest.mark.parametrize('seed', [23, 24])
+def test_chose_features_match_single_ticker(seed):
+    frames, bench = _ragged_market(seed)
+    panel = build_panel(frames)
+    ind = compute_indicators(panel, (RS_PERIOD,))
+    f = chose_features(ind, align_bench(bench.pct_change(RS_PERIOD), panel.dates))
+    for t, df in frames.items():
+        one = compute_indicators(build_panel({t: df}), (RS_PERIOD,))
+        g = chose_features(one, align_bench(bench.pct_change(RS_PERIOD), one.panel.dates))
+        rows, j = panel.dates.get_indexer(df.index), panel.col[t]
+        for k in ('gate', 'is_break', 'rally', 'dist', 'gap'):
+            np.testing.assert_array_equal(f[k][rows, j], g[k][:, 0], err_msg=f"{t} {k}")
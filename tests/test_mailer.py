@@ -0,0 +1,88 @@
+import os
+import time
+import smtplib
+import mailer
+from email.message import EmailMessage
+from mailer import Mailer, Outbox, ATTEMPT_HEADER, MAX_ATTEMPTS
+
+# ==========================================
+# 重寄佇列：過期以排入時間計算，部分失敗只重寄失敗的那幾封
+# ==========================================
+HOUR = 3600
+
+
+class FakeSMTP:
+    """替身伺服器：errors 為 {收件人: SMTP 代碼}，其餘照收"""
+
+    def __init__(self, errors):
+        self.errors, self.received = errors, []
+
+    def send_message(self, msg):
+        code = self.errors.get(msg['To'])
+        if code: raise smtplib.SMTPRecipientsRefused({msg['To']: (code, b'try again' if code < 500 else b'no such user')})
+        self.received.append(msg['To'])
+
+    def quit(self):
+        pass
+
+
+def _mail(to):
+    msg = EmailMessage()
+    msg['To'], msg['Subject'] = to, '每日掃描'
+    msg.set_content('報告')
+    return msg
+
+
+def _mailer(tmp_path, monkeypatch, errors):
+    server = FakeSMTP(errors)
+    m = Mailer(host='localhost', port=25, user='', password='', security='none', outbox=Outbox(str(tmp_path)))
+    monkeypatch.setattr(m, 'connect', lambda: setattr(m, 'server', server))
+    return m, server
+
+
+def test_expired_mail_is_dropped(tmp_path):
+    box = Outbox(str(tmp_path), max_age_hours=24)
+    old = box.put(_mail('a@x'), os.path.join(str(tmp_path), f"{time.time_ns() - 25 * HOUR * 10 ** 9}.eml"))
+    fresh = box.put(_mail('b@x'))
+    assert [p for p, _ in box.items()] == [fresh]
+    assert not os.path.exists(old)
+
+
+def test_requeue_keeps_original_age(tmp_path, monkeypatch):
+    box = Outbox(str(tmp_path), max_age_hours=24)
+    box.put(_mail('a@x'), os.path.join(str(tmp_path), f"{time.time_ns() - 23 * HOUR * 10 ** 9}.eml"))
+    m, _ = _mailer(tmp_path, monkeypatch, {'a@x': 451})
+    assert m.deliver([], retries=0) == (0, 1, 0)
+    (path, msg), = box.items()
+    assert msg[ATTEMPT_HEADER] == '1'
+
+    # 重新排入改寫了檔案，但兩小時後仍以最初排入時間算過期
+    now = time.time() + 2 * HOUR
+    monkeypatch.setattr(mailer.time, 'time', lambda: now)
+    assert box.items() == []
+    assert not os.path.exists(path)
+
+
+def test_partial_failure_requeues_only_transient(tmp_path, monkeypatch):
+    m, server = _mailer(tmp_path, monkeypatch, {'busy@x': 451, 'gone@x': 550})
+    assert m.deliver([_mail(t) for t in ('ok@x', 'busy@x', 'gone@x')], retries=0) == (1, 1, 1)
+    assert server.received == ['ok@x']
+    assert list(m.failed) == ['gone@x']
+    (path, msg), = m.outbox.items()
+    assert (msg['To'], msg[ATTEMPT_HEADER]) == ('busy@x', '1')
+
+    # 下次執行先寄佇列內的舊郵件，寄出後移出佇列
+    m2, server2 = _mailer(tmp_path, monkeypatch, {})
+    assert m2.deliver([_mail('new@x')], retries=0) == (2, 0, 0)
+    assert server2.received == ['busy@x', 'new@x']
+    assert len(m2.outbox) == 0
+
+
+def test_gives_up_after_max_attempts(tmp_path, monkeypatch):
+    m, _ = _mailer(tmp_path, monkeypatch, {'busy@x': 451})
+    m.deliver([_mail('busy@x')], retries=0)
+    for _ in range(MAX_ATTEMPTS - 1):
+        m, _ = _mailer(tmp_path, monkeypatch, {'busy@x': 451})
+        m.deliver([], retries=0)
+    assert list(m.failed) == ['busy@x']
+    assert len(m.outbox) == 0
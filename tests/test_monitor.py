@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+from perf import synthetic_market
+from store import PriceStore
+from fetch import FixtureProvider
+from monitor import build_monitors, monitor, holding_peak
+
+# ==========================================
+# 盤中監控：持有以來最高價與換日寫入的日線
+# ==========================================
+TICKER = '1000.TW'
+
+
+def _store(tmp_path, days=300):
+    frames, _ = synthetic_market(1, days, seed=5)
+    df = frames[TICKER]
+    df.index = pd.bdate_range(end=pd.Timestamp.now().normalize() - pd.Timedelta(days=7), periods=days)
+    store = PriceStore(root=str(tmp_path), provider=FixtureProvider(str(tmp_path / 'none')))
+    store.save(TICKER, df)
+    return store, df
+
+
+def test_peak_seeded_from_history_since_entry(tmp_path):
+    store, df = _store(tmp_path)
+    # 進場後最高價至少到 2R (成本 +14%) 的第一個進場日
+    highs = df['High'][::-1].cummax()[::-1]
+    entry = next(d for d in df.index[:-20] if highs.loc[d:].iloc[1:].max() > df.loc[d, 'Close'] * 1.15)
+    data = {'cost': float(df.loc[entry, 'Close']), 'stop_loss_pct': 0.07, 'entry': str(entry.date())}
+
+    m = build_monitors({TICKER: data}, store)[TICKER]
+    assert m.peak == df.loc[entry:, 'High'].max()
+    assert '保本' in m.levels(data['cost'])[0]
+    # 沒有進場日只能從成本起算
+    assert holding_peak(df, {'cost': 10.0, 'stop_loss_pct': 0.07}) == 10.0
+
+
+def test_close_session_writes_session_volume(tmp_path):
+    store, df = _store(tmp_path)
+    data = {'cost': float(df['Close'].iloc[-1]), 'stop_loss_pct': 0.07}
+    monitors = build_monitors({TICKER: data}, store)
+    day = df.index[-1] + pd.offsets.BDay()
+    price = float(df['Close'].iloc[-1])
+    feed = [(day + pd.Timedelta(hours=9, minutes=k), TICKER, price * (1 + k / 1000), 1000.0 * (k + 1)) for k in range(5)]
+    feed.append((day + pd.offsets.BDay() + pd.Timedelta(hours=9), TICKER, price, 500.0))
+    monitor(iter(feed), monitors, on_alert=lambda a: None)
+
+    snap = monitors[TICKER].state.snap
+    assert snap['volume'] == 5000.0
+    expected = (df['Volume'].iloc[-19:].sum() + 5000.0) / 20
+    np.testing.assert_allclose(snap['vol20'], expected, rtol=1e-12)
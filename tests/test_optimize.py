@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+import optimize
+from perf import synthetic_market
+from store import PriceStore
+from fetch import FixtureProvider
+from indicators import build_panel, compute_indicators
+from backtest import align_bench, MIN_PRICE, DRIVE_MIN_VOLUME, DRIVE_RS_PERIOD
+from parallel import SharedArrays
+from optimize import drive_features, drive_entry, prepare
+from main import StockSystem
+
+# ==========================================
+# 參數掃描的 DRIVE 進場與 StockSystem.analyze_drive 一致
+# ==========================================
+def test_drive_entry_matches_stock_system(tmp_path):
+    frames, bench = synthetic_market(200, 400, seed=17)
+    store = PriceStore(root=str(tmp_path), provider=FixtureProvider(str(tmp_path / 'none')))
+    store.save('0050.TW', bench.to_frame('Close').assign(Open=bench, High=bench, Low=bench, Volume=1e6))
+    system = StockSystem(store=store)
+    assert (system.min_price, system.min_volume_drive, system.rs_period_drive) == (MIN_PRICE, DRIVE_MIN_VOLUME, DRIVE_RS_PERIOD)
+
+    ind = compute_indicators(build_panel(frames), (system.rs_period_chose, DRIVE_RS_PERIOD))
+    bench_roc = bench.pct_change(DRIVE_RS_PERIOD)
+    entry = drive_entry(drive_features(ind, align_bench(bench_roc, ind.panel.dates)))[-1]
+    hits = [bool(system.analyze_drive({'ticker': t, 'name': t, 'industry': ''}, df, float(bench_roc.iloc[-1]), ind.snapshot(t)))
+            for t, df in frames.items()]
+    assert any(hits)
+    assert hits == entry.tolist()
+
+
+def test_chunk_closes_handles_after_error():
+    frames, bench = synthetic_market(20, 300, seed=18)
+    shared = SharedArrays(prepare(frames, bench, 'chose'))
+    try:
+        # 錯誤的 traceback 仍留著特徵矩陣：close 不可蓋掉原本的錯誤
+        with pytest.raises(TypeError):
+            optimize._run_chunk(shared.spec, 'chose', [{'no_such_param': 1}])
+    finally:
+        shared.close()
+
+
+def test_chunk_releases_every_handle(monkeypatch):
+    closed = []
+
+    class Handle:
+        def close(self):
+            closed.append(self)
+            if len(closed) == 1: raise BufferError("cannot close exported pointers exist")
+    monkeypatch.setattr(optimize, 'attach', lambda spec: ({}, [Handle(), Handle()]))
+    # 特徵缺欄位：evaluate 的 KeyError 要原樣丟出，第一個 handle 關閉失敗也要繼續關下一個
+    with pytest.raises(KeyError):
+        optimize._run_chunk({}, 'chose', [{}])
+    assert len(closed) == 2
@@ -0,0 +1,60 @@
+import pandas as pd
+import pytest
+import parallel
+import scanner
+from perf import synthetic_market
+from store import PriceStore
+from fetch import FixtureProvider
+from scanner import run_scan
+from metrics import METRICS
+
+# ==========================================
+# 多行程分派與單行程結果一致；標的太少時不開行程池
+# ==========================================
+NAMES = ['chose', 'drive', 'health']
+
+
+@pytest.fixture
+def market(tmp_path):
+    frames, bench = synthetic_market(200, 300, seed=9)
+    store = PriceStore(root=str(tmp_path), provider=FixtureProvider(str(tmp_path / 'none')))
+    for t, df in frames.items(): store.save(t, df)
+    store.save('0050.TW', bench.to_frame('Close').assign(Open=bench, High=bench, Low=bench, Volume=1e6))
+    universe = [{'ticker': t, 'name': t, 'industry': ''} for t in frames]
+    portfolio = {t: {'cost': 50.0, 'stop_loss_pct': 0.07} for t in list(frames)[:3]}
+    return store, universe, portfolio
+
+
+def _scan(market, workers):
+    store, universe, portfolio = market
+    METRICS.reset()
+    return run_scan(NAMES, universe=universe, store=store, portfolio=portfolio, workers=workers)
+
+
+def test_parallel_matches_serial(market, monkeypatch):
+    serial = _scan(market, 1)
+    assert all(serial.values())
+    monkeypatch.setattr(scanner, 'PARALLEL_MIN_TICKERS', 0)
+    assert _scan(market, 2) == serial
+
+
+def test_small_universe_runs_in_process(market, monkeypatch):
+    serial = _scan(market, 1)
+
+    def refuse(*args, **kwargs):
+        raise AssertionError("標的太少不應開行程池")
+    monkeypatch.setattr(parallel, 'dispatch_parallel', refuse)
+    assert len(market[1]) < scanner.PARALLEL_MIN_TICKERS
+    assert _scan(market, 4) == serial
+
+
+def test_shard_closes_handles_after_error(monkeypatch):
+    closed = []
+
+    class Handle:
+        def close(self): closed.append(self)
+    monkeypatch.setattr(parallel, 'attach', lambda spec: ({}, [Handle(), Handle()]))
+    # 共享矩陣缺欄位：Panel 尚未建立就出錯，仍要關閉所有 handle 並丟出原本的錯誤
+    with pytest.raises(KeyError):
+        parallel._run_shard({}, pd.DatetimeIndex([]), [], [], {}, [], {}, {}, None, set())
+    assert len(closed) == 2
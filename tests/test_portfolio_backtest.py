@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+from perf import synthetic_market
+from backtest import backtest_frame, run_trades, signals, align_bench, summarize, BACKTEST_BARS, RS_PERIOD
+from indicators import build_panel, compute_indicators
+from portfolio_backtest import backtest_portfolio
+
+# ==========================================
+# 單一標的、一個持股位、無交易成本時，投組回測與單檔回測逐筆相同
+# ==========================================
+CAPITAL = 1000000
+
+
+@pytest.mark.parametrize('seed', [1, 2, 3])
+def test_single_ticker_matches_backtest_frame(seed):
+    frames, bench = synthetic_market(6, BACKTEST_BARS + 300, seed=seed)
+    bench_roc = bench.pct_change(RS_PERIOD)
+    rng = np.random.default_rng(seed)
+    n_trades = 0
+    for k, df in enumerate(frames.values()):
+        if k % 2: df.iloc[rng.choice(len(df), 10, replace=False)] = np.nan     # 停牌
+        res = backtest_portfolio({'1000.TW': df}, bench, capital=CAPITAL, max_positions=1, position_pct=1.0, fee=0, tax=0)
+        ind = compute_indicators(build_panel({'_': df}), (RS_PERIOD,))
+        entry, ma_exit = signals(ind, align_bench(bench_roc, ind.panel.dates))
+        close = ind.panel.close[:, 0]
+        returns = run_trades(close, entry[:, 0], ma_exit[:, 0], max(len(close) - BACKTEST_BARS, 0))
+
+        trades = res['trades']
+        np.testing.assert_allclose(trades['報酬'].to_numpy(dtype=float), returns, rtol=1e-12)
+        assert summarize(trades['報酬'].tolist()) == backtest_frame(df, bench_roc)
+        # 全部資金進出：每次出場後的淨值 = 之前各筆報酬連乘
+        np.testing.assert_allclose(res['equity'][trades['出場日']].to_numpy(), CAPITAL * np.cumprod(1 + np.asarray(returns)), rtol=1e-9)
+        n_trades += len(trades)
+    assert n_trades > 0
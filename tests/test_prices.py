@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+from perf import synthetic_market
+from prices import PriceBars, tail_mean, nanmean, pct_change
+from metrics import METRICS
+import chose
+
+# ==========================================
+# 陣列容器的缺值語意與原本 pandas 寫法一致
+# ==========================================
+def _frame(seed=3):
+    frames, _ = synthetic_market(1, 260, seed=seed)
+    return next(iter(frames.values())).copy()
+
+
+def test_nan_volume_is_kept():
+    df = _frame()
+    df.iloc[-5, df.columns.get_loc('Volume')] = np.nan
+    bars = PriceBars.from_frame(df)
+    assert np.isnan(bars.volume[-5])
+    assert np.isnan(tail_mean(bars.volume, 20)) and np.isnan(df['Volume'].rolling(20).mean().iloc[-1])
+    assert nanmean(bars.volume[-20:]) == df['Volume'].iloc[-20:].mean()
+    np.testing.assert_array_equal(bars.to_frame()['Volume'], df['Volume'])
+
+
+def test_nan_volume_does_not_fail_volume_gate():
+    # 原本 rolling(20).mean() 遇到缺量為 NaN，NaN < 門檻為 False：不會因缺量被剔除
+    df = _frame()
+    df['Volume'] = 1.0
+    df.iloc[-3, df.columns.get_loc('Volume')] = np.nan
+    METRICS.reset()
+    chose.analyze_stock('1000.TW', df, 0.0)
+    assert ('chose', 'volume') not in METRICS.gates
+
+
+def test_pct_change_matches_pandas_without_fill():
+    df = _frame()
+    close = df['Close'].copy()
+    for gap in (None, -1, -21, -10):        # 無缺值 / 今天停牌 / n 天前停牌 / 中間停牌
+        s = close.copy()
+        if gap is not None: s.iloc[gap] = np.nan
+        expected = s.pct_change(20, fill_method=None).iloc[-1]
+        got = pct_change(s.to_numpy(), 20)
+        assert got == expected or (np.isnan(got) and np.isnan(expected)), gap
@@ -0,0 +1,30 @@
+import numpy as np
+import pandas as pd
+from ranking import percentile_rank
+
+# ==========================================
+# 橫斷面百分位排名 (1 ~ 99，NaN 沒有排名)
+# ==========================================
+def test_percentile_rank_by_hand():
+    np.testing.assert_array_equal(percentile_rank([10, 30, 20, np.nan, 40]), [1, 66, 33, np.nan, 99])
+    np.testing.assert_array_equal(percentile_rank([5.0]), [99])                 # 只有一檔視為最強
+    np.testing.assert_array_equal(percentile_rank([np.nan, 3.0]), [np.nan, 99])
+    assert np.isnan(percentile_rank([np.nan, np.nan])).all()
+
+
+def test_percentile_rank_matches_pandas_per_row():
+    rng = np.random.default_rng(5)
+    score = rng.normal(size=(30, 50))
+    score[rng.random(score.shape) < 0.2] = np.nan
+    score[3] = np.nan                                                           # 整天沒有分數
+    score[4, :10] = 1.0                                                         # 同分依原順序排
+    got = percentile_rank(score)
+    assert got.shape == score.shape
+    for row, r in zip(score, got):
+        s = pd.Series(row)
+        pos = s.rank(method='first') - 1
+        n = s.notna().sum()
+        expected = np.floor(pos * 98 / (n - 1)) + 1 if n > 1 else pos * 0 + 99
+        np.testing.assert_array_equal(r, expected.to_numpy())
+        np.testing.assert_array_equal(percentile_rank(row), r)                  # 一維 = 單列
+    assert np.nanmin(got) == 1 and np.nanmax(got) == 99
@@ -0,0 +1,127 @@
+import os
+import numpy as np
+import pandas as pd
+from perf import synthetic_market
+from store import PriceStore
+from fetch import FixtureProvider
+from prices import PriceBars
+from indicators import build_panel, compute_indicators, compute_frame
+from universe import UniverseIndex
+from market import BenchmarkSeries
+from sectors import SectorHistory, update_sectors, MOMENTUM_PERIOD
+
+# ==========================================
+# 產業歷史逐日接上：既有日期不重算，結果與整段計算一致
+# ==========================================
+NEW_DAYS = 5
+NUMERIC = ['rs', 'rs_change', 'breadth50', 'breadth200', 'momentum']
+
+
+def _save(store, frames, bench, end):
+    for t, df in frames.items(): store.save(t, df.iloc[:end])
+    b = bench.iloc[:end]
+    store.save('0050.TW', b.to_frame('Close').assign(Open=b, High=b, Low=b, Volume=1e6))
+
+
+def test_update_appends_only_new_dates(tmp_path, monkeypatch):
+    frames, bench = synthetic_market(45, 320, seed=13)
+    universe = [{'ticker': t, 'name': t, 'industry': ['電子', '金融', '航運'][i % 3]} for i, t in enumerate(frames)]
+    store = PriceStore(root=str(tmp_path), provider=FixtureProvider(str(tmp_path / 'none')))
+
+    _save(store, frames, bench, -NEW_DAYS)
+    before = update_sectors(store, universe)
+    _save(store, frames, bench, None)
+    written = []
+    update = SectorHistory.update
+    monkeypatch.setattr(SectorHistory, 'update', lambda self, table: written.append(table) or update(self, table))
+    after = update_sectors(store, universe)
+
+    # 只寫入歷史沒有的日期，舊的紀錄原封不動
+    assert sorted(written[0]['date'].unique()) == list(bench.index[-NEW_DAYS:])
+    pd.testing.assert_frame_equal(after[after['date'] < bench.index[-NEW_DAYS]].reset_index(drop=True), before)
+
+    # 接上的日期與整段重算相同
+    full = update_sectors(store, universe, force=True)
+    new, ref = (t[t['date'] >= bench.index[-NEW_DAYS]].reset_index(drop=True) for t in (after, full))
+    pd.testing.assert_frame_equal(new[['date', 'sector', 'members']], ref[['date', 'sector', 'members']])
+    for k in NUMERIC:
+        np.testing.assert_allclose(new[k], ref[k], rtol=1e-5, err_msg=k)
+
+    # 沒有新的日期時不改寫歷史
+    written.clear()
+    assert len(update_sectors(store, universe)) == len(after)
+    assert not written
+
+
+# ==========================================
+# 只差一天時由預篩索引接上，不載入全市場價格
+# ==========================================
+def _market(tmp_path):
+    frames, bench = synthetic_market(45, 320, seed=14)
+    rng = np.random.default_rng(14)
+    for k, t in enumerate(list(frames)):
+        if k % 3 == 0: frames[t] = frames[t].drop(frames[t].index[rng.choice(np.arange(200, 318), 3, replace=False)])   # 缺 K 棒
+    universe = [{'ticker': t, 'name': t, 'industry': ['電子', '金融', '航運'][i % 3]} for i, t in enumerate(frames)]
+    store = PriceStore(root=str(tmp_path), provider=FixtureProvider(str(tmp_path / 'none')))
+    _save(store, frames, bench, None)
+    # 歷史算到前一天
+    full = update_sectors(store, universe, BenchmarkSeries(close=bench), force=True)
+    os.remove(SectorHistory(store).path)
+    SectorHistory(store).update(full[full['date'] < bench.index[-1]])
+    return frames, bench, universe, store, full
+
+
+def _index(store, frames, tickers, end=None):
+    index = UniverseIndex(store)
+    index.update(compute_indicators(build_panel({t: PriceBars.from_frame(frames[t].iloc[:end]) for t in tickers})))
+    return index
+
+
+def _append(store, universe, bench, monkeypatch):
+    def refuse(*args, **kwargs):
+        raise AssertionError("由索引接上時不應載入全市場價格")
+    monkeypatch.setattr(store, 'get', refuse)
+    after = update_sectors(store, universe, BenchmarkSeries(close=bench))
+    return after[after['date'] == bench.index[-1]].reset_index(drop=True)
+
+
+def test_append_from_index_matches_full(tmp_path, monkeypatch):
+    frames, bench, universe, store, full = _market(tmp_path)
+    _index(store, frames, list(frames)).save()
+    new = _append(store, universe, bench, monkeypatch)
+    ref = full[full['date'] == bench.index[-1]].reset_index(drop=True)
+    pd.testing.assert_frame_equal(new[['date', 'sector', 'members']], ref[['date', 'sector', 'members']])
+    for k in NUMERIC + ['ret']:
+        np.testing.assert_allclose(new[k], ref[k], rtol=1e-5, atol=1e-4, err_msg=k)
+
+
+def test_append_from_refreshed_index(tmp_path, monkeypatch):
+    # 一半標的當天完整掃描，另一半只併入當天快照：檔數與當日報酬 / 動能仍精確 (均線 / ROC 沿用前一次完整計算)
+    frames, bench, universe, store, full = _market(tmp_path)
+    day = bench.index[-1]
+    scanned = list(frames)[::2]
+    snapped = [t for t in list(frames)[1::2] if frames[t].index[-1] == day]
+    index = _index(store, frames, scanned)
+    index.table = pd.concat([index.table, _index(store, frames, snapped, -1).table])
+    index.refresh({t: (frames[t]['Close'].iloc[-1], frames[t]['Volume'].iloc[-1]) for t in snapped}, now=day)
+    index.save()
+    new = _append(store, universe, bench, monkeypatch).set_index('sector')
+
+    industries = {s['ticker']: s['industry'] for s in universe}
+    daily = {t: frames[t]['Close'].iloc[-1] / frames[t]['Close'].iloc[-2] - 1 for t in scanned + snapped if frames[t].index[-1] == day}
+    ret = pd.Series(daily).groupby(pd.Series(industries)).mean()
+    prior = full[full['date'] < day].pivot(index='date', columns='sector', values='ret').iloc[-(MOMENTUM_PERIOD - 1):]
+    momentum = (1 + prior.fillna(0) / 100).prod() * (1 + ret) - 1
+    assert new['members'].to_dict() == pd.Series(daily).groupby(pd.Series(industries)).size().to_dict()
+    np.testing.assert_allclose(new['ret'], ret[new.index] * 100, rtol=1e-5)
+    np.testing.assert_allclose(new['momentum'], momentum[new.index] * 100, rtol=1e-5, atol=1e-4)
+
+
+def test_breadth_uses_each_tickers_own_bars(tmp_path):
+    frames, bench, universe, store, full = _market(tmp_path)
+    day = bench.index[-1]
+    industries = pd.Series({s['ticker']: s['industry'] for s in universe})
+    above = {t: compute_frame(df)['close'] > compute_frame(df)['ma50'] for t, df in frames.items() if df.index[-1] == day}
+    expected = pd.Series(above, dtype=float).groupby(industries).mean() * 100
+    ref = full[full['date'] == day].set_index('sector')
+    np.testing.assert_allclose(ref['breadth50'], expected[ref.index], rtol=1e-5)
@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+import universe
+from perf import synthetic_market
+from store import PriceStore
+from fetch import FixtureProvider
+from prices import tail_mean
+from scanner import register, run_scan
+from universe import Prefilter, UniverseIndex
+
+# ==========================================
+# 預篩與不預篩的掃描結果必須一致 (包含爆量當天)
+# ==========================================
+MIN_VOLUME = 1_000_000
+N_TICKERS = 60
+N_DAYS = 260
+
+
+@register('test.liquid', prefilter=Prefilter(min_volume=MIN_VOLUME))
+def _liquid(info, df, ctx):
+    vol20 = tail_mean(df['Volume'], 20)
+    return {'代號': info['ticker'], '均量': vol20} if vol20 >= MIN_VOLUME else None
+
+
+def _market():
+    """日期平移到最近，預篩索引才不會因為太舊而全部保留"""
+    frames, bench = synthetic_market(N_TICKERS, N_DAYS, seed=11)
+    dates = pd.bdate_range(end=pd.Timestamp.now().normalize(), periods=N_DAYS)
+    for df in frames.values(): df.index = dates
+    bench.index = dates
+    return frames, bench
+
+
+def _save(store, frames, bench, end):
+    for t, df in frames.items(): store.save(t, df.iloc[:end])
+    b = bench.iloc[:end]
+    store.save('0050.TW', b.to_frame('Close').assign(Open=b, High=b, Low=b, Volume=1e6))
+
+
+def _scan(store, items, prefilter):
+    return sorted(r['代號'] for r in run_scan(['test.liquid'], universe=items, store=store, prefilter=prefilter)['test.liquid'])
+
+
+def test_prefilter_keeps_volume_breakout(tmp_path, monkeypatch):
+    frames, bench = _market()
+    items = [{'ticker': t, 'name': t, 'industry': ''} for t in frames]
+    # 前一天均量在放寬門檻之下 (會被預篩剔除) 的標的，今天爆量
+    prev = {t: df['Volume'].iloc[-21:-1].mean() for t, df in frames.items()}
+    quiet = [t for t, v in prev.items() if MIN_VOLUME * 0.5 < v < MIN_VOLUME * (1 - universe.SLACK)]
+    assert quiet
+    for t in quiet: frames[t].iloc[-1, frames[t].columns.get_loc('Volume')] = MIN_VOLUME * 20
+
+    store = PriceStore(root=str(tmp_path / 'store'), provider=FixtureProvider(str(tmp_path / 'none')))
+    monkeypatch.setattr(universe, 'get_snapshot', lambda: {})
+    _save(store, frames, bench, -1)
+    _scan(store, items, prefilter=True)     # 建立前一天的索引
+    assert set(quiet).isdisjoint(UniverseIndex(store).candidates(frames, [Prefilter(min_volume=MIN_VOLUME)]))
+
+    # 收盤後：價格庫有了今天的 K 棒，預篩索引只看得到行情快照
+    _save(store, frames, bench, None)
+    snapshot = {t: (df['Close'].iloc[-1], df['Volume'].iloc[-1]) for t, df in frames.items()}
+    monkeypatch.setattr(universe, 'get_snapshot', lambda: snapshot)
+    expected = _scan(store, items, prefilter=False)
+    assert set(quiet) <= set(expected)
+    assert _scan(store, items, prefilter=True) == expected
+
+
+def test_refresh_adds_snapshot_volume_once(tmp_path):
+    store = PriceStore(root=str(tmp_path))
+    index = UniverseIndex(store)
+    index.table = pd.DataFrame({'close': [10.0, 10.0], 'vol20': [100.0, 100.0], 'ma50': np.nan, 'ma200': np.nan, 'rs_score': np.nan,
+                                'asof': pd.to_datetime(['2024-12-30', '2024-12-31']), 'refreshed': pd.NaT}, index=['A.TW', 'B.TW'])
+    snap = {'A.TW': (11.0, 400.0), 'B.TW': (12.0, 400.0)}
+    now = pd.Timestamp('2024-12-31 15:00')
+    for _ in range(2): index.refresh(snap, now=now)
+    # A 的快照成交量只併入一次；B 的 asof 已是今天 (成交量已在精確均量裡)
+    assert index.table['vol20'].tolist() == [120.0, 100.0]
+    assert index.table['close'].tolist() == [11.0, 12.0]
@@ -0,0 +1,101 @@
+import os
+import numpy as np
+import pandas as pd
+from fetch import get_snapshot
+
+# ==========================================
+# ⚙️ 預篩參數
+# ==========================================
+INDEX_FILE = '_universe.parquet'    # 存在價格庫目錄下
+SLACK = 0.10            # 門檻放寬 10%：均線幾天沒重算也不會誤刪 (均量另以快照成交量抬高上界)
+MAX_AGE_DAYS = 7        # 超過 7 天沒完整計算的標的視為未知，一律完整掃描
+VALUES = ['close', 'vol20', 'ma50', 'ma200', 'rs_score', 'prev_close', 'roc20']   # rs_score 為 RS 排名用的加權 ROC；prev_close / roc20 給產業輪動
+COLUMNS = VALUES + ['asof', 'refreshed']    # asof：最後完整計算的 K 棒日；refreshed：最後併入快照成交量的日期
+
+# ==========================================
+# 策略的基本門檻
+# ==========================================
+class Prefilter:
+    """價格 / 均量 / Stage 2 (close > MA50 > MA200) 門檻；資料缺值時一律保留"""
+
+    def __init__(self, min_price=0, min_volume=0, stage2=False):
+        self.min_price = min_price
+        self.min_volume = min_volume
+        self.stage2 = stage2
+
+    def passes(self, table, slack=SLACK):
+        """table 為 UniverseIndex.table 格式，回傳布林 Series"""
+        keep = 1 - slack
+        with np.errstate(invalid='ignore'):
+            ok = ~(table['close'] < self.min_price * keep) & ~(table['vol20'] < self.min_volume * keep)
+            if self.stage2:
+                ok &= ~(table['close'] < table['ma50'] * keep) & ~(table['ma50'] < table['ma200'] * keep)
+        return ok
+
+# ==========================================
+# 全市場輕量索引 (每檔一列)
+# ==========================================
+class UniverseIndex:
+    """
+    每檔保存最新收盤、前一日收盤、20 日均量、MA50 / MA200 與 20 日 ROC (有算 RS 排名時另存加權 ROC)
+    完整掃描後以精確指標更新；平日用行情快照更新收盤價 (原收盤移到前一日收盤)，並把當日成交量併入均量上界
+    """
+
+    def __init__(self, store, path=None):
+        self.store = store
+        self.path = path or os.path.join(store.root, INDEX_FILE)
+        self.table = self.load()
+
+    def load(self):
+        dtypes = {c: float for c in VALUES}
+        dtypes.update(asof='datetime64[ns]', refreshed='datetime64[ns]')
+        if os.path.exists(self.path):
+            try: return pd.read_parquet(self.path).reindex(columns=COLUMNS).astype(dtypes)
+            except Exception as e: print(f"⚠️ 預篩索引無法讀取，重新建立: {e}")
+        return pd.DataFrame(columns=COLUMNS).astype(dtypes)
+
+    def save(self):
+        self.table.to_parquet(self.path)
+
+    def refresh(self, snapshot=None, now=None):
+        """
+        以當日行情快照更新收盤價；索引是空的就不必抓
+        快照成交量 v 併入均量：新的 20 日均量 = vol20 + (v - 移出視窗的量) / 20 <= vol20 + v / 20，
+        取這個上界預篩，爆量當天就不會把剛放量的標的剔除；同一天的快照只併入一次
+        """
+        if self.table.empty: return 0
+        snap = snapshot if snapshot is not None else get_snapshot()
+        close = pd.Series({t: c for t, (c, v) in snap.items()}, dtype=float)
+        volume = pd.Series({t: v for t, (c, v) in snap.items()}, dtype=float)
+        common = self.table.index.intersection(close.index)
+        day = (pd.Timestamp(now) if now is not None else pd.Timestamp.now()).normalize()
+        t = self.table.loc[common]
+        v = volume[common]
+        fresh = common[((t['asof'] < day) & ~(t['refreshed'] >= day) & (v > 0)).to_numpy()]
+        self.table.loc[fresh, 'prev_close'] = self.table.loc[fresh, 'close']
+        self.table.loc[common, 'close'] = close[common]
+        self.table.loc[fresh, 'vol20'] += v[fresh] / 20
+        self.table.loc[fresh, 'refreshed'] = day
+        return len(common)
+
+    def update(self, ind):
+        """以掃描算好的指標 (indicators.Indicators) 更新各檔的精確值"""
+        p = ind.panel
+        j = np.flatnonzero(ind.last >= 0)
+        i = ind.last[j]
+        index = [p.tickers[x] for x in j]
+        # 這次沒算的欄位 (例如沒做 RS 排名) 沿用舊值
+        rows = pd.DataFrame({k: ind[k][i, j] if k in ind.values else self.table[k].reindex(index).to_numpy() for k in VALUES}, index=index)
+        rows['asof'] = p.dates[i]
+        rows['refreshed'] = pd.NaT
+        self.table = pd.concat([self.table.drop(rows.index, errors='ignore'), rows]) if not self.table.empty else rows
+
+    def candidates(self, tickers, prefilters, now=None):
+        """回傳可能通過任一門檻的代號 (保持原順序)；沒有索引或太舊的標的一律保留"""
+        tickers = list(tickers)
+        table = self.table.reindex(tickers)
+        now = pd.Timestamp(now) if now is not None else pd.Timestamp.now()
+        ok = ~(table['asof'] >= now.normalize() - pd.Timedelta(days=MAX_AGE_DAYS))
+        for p in prefilters:
+            ok |= p.passes(table)
+        return [t for t, k in zip(tickers, ok.to_numpy()) if k]